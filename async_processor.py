@@ -0,0 +1,338 @@
+"""
+asyncio 新聞處理器
+在單一事件迴圈上並發抓取所有來源與文章 HTML，並在每篇文章完成時即時產出結果
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import aiohttp
+
+from clients.article_client import detect_encoding
+from clients.circuit_breaker import CircuitOpenError
+from clients.metrics import metrics
+from clients.matcher import get_matcher
+from clients.rss_client import DEFAULT_USER_AGENT, FEED_CHUNK_SIZE
+from clients.nvidia_client import HEADERS as NVIDIA_HEADERS
+from processors import (
+    NewsProcessor, DEFAULT_KEYWORDS, GLOBAL_DEADLINE, matching_articles, remaining_time
+)
+
+# 常量定義
+PER_HOST_LIMIT = 4  # 未列在來源設定中的主機同時進行的請求數
+TOTAL_CONNECTION_LIMIT = 20
+
+
+class AsyncNewsProcessor(NewsProcessor):
+    """以 asyncio 取代兩層 ThreadPoolExecutor 的新聞處理器，介面與 NewsProcessor 相同"""
+
+    def __init__(self, amd_client, nvidia_client, rss_client, article_client, news_pool=None,
+                 search_index=None, sources=None, per_host_limit=PER_HOST_LIMIT,
+                 deadline=GLOBAL_DEADLINE):
+        super().__init__(amd_client, nvidia_client, rss_client, article_client,
+                         news_pool=news_pool, search_index=search_index, sources=sources,
+                         deadline=deadline)
+        self.per_host_limit = per_host_limit
+
+    def _fetch_intel_news(self, keywords, filter_at_source, deadline_at=None, on_item=None):
+        """同步介面，供 webhook worker 與預取排程器經由 get_intel_news 呼叫"""
+        return asyncio.run(self.aget_intel_news(
+            keywords, filter_at_source, remaining_time(deadline_at), on_item
+        ))
+
+    async def aget_intel_news(self, keywords=None, filter_at_source=True, deadline=None,
+                              on_item=None):
+        """收集期限內產出的新聞，每則產出時呼叫 on_item
+
+        on_item（例如 LINE 推播）會阻塞，交給專用的單一執行緒依產出順序執行，不佔用事件迴圈；
+        期限到時不再等待尚未完成的推播，它們在背景執行緒中繼續執行
+        """
+        if deadline is None:
+            deadline = self.deadline
+        news_list = []
+        if on_item is None:
+            async for news_item in self.stream_intel_news(keywords, filter_at_source, deadline):
+                news_list.append(news_item)
+            return news_list
+
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + deadline
+        on_item = metrics.bind(on_item)
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='on-item')
+        callbacks = []
+        try:
+            async for news_item in self.stream_intel_news(keywords, filter_at_source, deadline):
+                news_list.append(news_item)
+                callbacks.append(loop.run_in_executor(executor, on_item, news_item))
+            if callbacks:
+                done, not_done = await asyncio.wait(
+                    callbacks, timeout=max(deadline_at - loop.time(), 0)
+                )
+                if not_done:
+                    print(f"超過 {deadline:.1f} 秒期限，{len(not_done)} 則推播在背景繼續執行")
+                for callback in done:
+                    callback.result()
+        finally:
+            executor.shutdown(wait=False)
+        return news_list
+
+    async def stream_intel_news(self, keywords=None, filter_at_source=True, deadline=None):
+        """每篇文章處理完成時立即產出；超過延遲預算（deadline 秒，預設 self.deadline）時取消未完成的工作，
+        尚未完成摘要的文章只產出標題和連結
+        """
+        if not keywords:
+            keywords = DEFAULT_KEYWORDS
+        if deadline is None:
+            deadline = self.deadline
+
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + deadline
+        host_limits = {}
+        breakers = self.article_client.breakers
+
+        # 每主機的並發數由來源設定的 host_limit 以 semaphore 控制，連線器只限制總連線數
+        connector = aiohttp.TCPConnector(limit=TOTAL_CONNECTION_LIMIT, limit_per_host=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+
+            async def request(method, url, timeout, stream=None, **kwargs):
+                """在主機並發限制與熔斷器下送出請求，回傳 (最終網址, 狀態碼, 標頭, 內容位元組)
+
+                超時依該主機最近的 p95 延遲調整，並以 timeout 為上限；主機熔斷時拋出 CircuitOpenError。
+                stream 為 FeedStream 時 200 回應邊讀邊解析，找到足夠的項目就關閉連線，內容位元組為空
+                """
+                host = urlparse(url).netloc
+                if host not in host_limits:
+                    limit = self.sources.host_limit(url, default=self.per_host_limit)
+                    host_limits[host] = asyncio.Semaphore(limit)
+                semaphore = host_limits[host]
+                async with semaphore:
+                    if not breakers.allow(url):
+                        raise CircuitOpenError(f"circuit open: {host}")
+                    timeout = aiohttp.ClientTimeout(total=breakers.timeout(url, timeout))
+                    started = loop.time()
+                    try:
+                        response_context = session.request(method, url, timeout=timeout, **kwargs)
+                        async with response_context as response:
+                            if stream is not None and response.status == 200:
+                                body = b''
+                                async for chunk in response.content.iter_chunked(FEED_CHUNK_SIZE):
+                                    if stream.feed(chunk):
+                                        response.close()
+                                        break
+                                else:
+                                    stream.close()
+                            else:
+                                body = await response.read()
+                    except Exception:
+                        breakers.record_failure(url, loop.time() - started)
+                        raise
+                    breakers.record(url, response.status, loop.time() - started)
+                    response.raise_for_status()
+                    return str(response.url), response.status, response.headers, body
+
+            async def conditional_get(client, key, url, parse, headers, timeout, params=None):
+                """條件式 GET，驗證資訊與解析結果和同步客戶端共用；主機熔斷時使用上次成功的結果"""
+                try:
+                    _, status, response_headers, content = await request(
+                        'GET', url, timeout, headers=client.conditional_headers(key, headers),
+                        params=params
+                    )
+                except CircuitOpenError:
+                    return client.circuit_fallback(key, url) or []
+                result = client.resolve_conditional(key, status, response_headers, content, parse)
+                return result or []
+
+            async def fetch_rss(source):
+                client = self.rss_client
+                matcher = get_matcher(keywords)
+                # 與同步引擎相同：有搜尋索引時讀完整個 feed
+                limit = source.max_entries if self.search_index is None else None
+                stream = client.open_stream(matcher, limit)
+                try:
+                    _, status, response_headers, content = await request(
+                        'GET', source.url, source.timeout, stream=stream,
+                        headers=client.feed_headers(source.url, matcher, limit)
+                    )
+                except CircuitOpenError:
+                    entries = client.circuit_fallback(source.url, source.url)
+                else:
+                    if status == 200:
+                        entries = client.finish_stream(source.url, response_headers, stream)
+                    else:
+                        entries = client.resolve_conditional(
+                            source.url, status, response_headers, content, client.parse_entries
+                        )
+                return client.select_entries(entries or [], source, keywords, filter_at_source=True)
+
+            async def fetch_coveo(source):
+                client = self.amd_client
+                key, since = client.search_state(source, keywords)
+                found = []
+                for page in range(client.max_pages(source)):
+                    api_url, headers, data = client.build_search_request(
+                        source, keywords, page, since
+                    )
+                    try:
+                        _, _, _, content = await request(
+                            'POST', api_url, source.timeout, headers=headers, json=data
+                        )
+                    except (CircuitOpenError, aiohttp.ClientResponseError):
+                        # 與同步客戶端相同：停止翻頁，沒有結果時使用上次的結果
+                        break
+                    result = json.loads(content)
+                    matches = client.parse_search_results(result, source)
+                    found = client.take_matches(matches, keywords, source.max_entries, found)
+                    if len(found) >= source.max_entries or not client.has_more(result, data):
+                        break
+                return client.finish_search(key, source, found, incremental=since is not None)
+
+            async def fetch_wordpress_page(source, keyword, page, after):
+                client = self.nvidia_client
+                params = client.build_search_params(keyword, source, page, after)
+                key = client.conditional_key(source, keyword, page, after)
+                if key is not None:
+                    return await conditional_get(
+                        client, key, source.url, json.loads, NVIDIA_HEADERS, source.timeout,
+                        params=params
+                    )
+                try:
+                    _, _, _, content = await request(
+                        'GET', source.url, source.timeout, headers=NVIDIA_HEADERS, params=params
+                    )
+                except (CircuitOpenError, aiohttp.ClientResponseError):
+                    # 超過最後一頁時 WordPress 回應 400，停止翻頁
+                    return []
+                return json.loads(content)
+
+            async def fetch_wordpress_keyword(source, keyword, after):
+                posts = []
+                for page in range(1, self.nvidia_client.max_pages(source, after) + 1):
+                    page_posts = await fetch_wordpress_page(source, keyword, page, after)
+                    posts.extend(page_posts)
+                    if len(page_posts) < source.max_entries:
+                        break
+                return posts
+
+            async def fetch_wordpress(source):
+                client = self.nvidia_client
+                key, after = client.search_state(source, keywords)
+                search_keywords = client.search_keywords(source, keywords)
+                results = await asyncio.gather(
+                    *(fetch_wordpress_keyword(source, keyword, after)
+                      for keyword in search_keywords),
+                    return_exceptions=True
+                )
+                for keyword, posts in zip(search_keywords, results):
+                    if isinstance(posts, Exception):
+                        print(f"Error searching {source.name} with keyword '{keyword}': {posts}")
+                found = client.merge_results(
+                    [posts for posts in results if not isinstance(posts, Exception)], source,
+                    keep_all=after is not None
+                )
+                return client.finish_search(key, source, found, incremental=after is not None)
+
+            fetchers = {'rss': fetch_rss, 'coveo': fetch_coveo, 'wordpress': fetch_wordpress}
+
+            async def source_task(source):
+                try:
+                    with metrics.span('source_fetch', source=source.name):
+                        articles = await fetchers[source.type](source)
+                except Exception as e:
+                    print(f"Error fetching from {source.name}: {e}")
+                    return 'source', source.name, []
+                self.index_source(source.name, articles, keywords)
+                return 'source', source.name, articles
+
+            async def article_task(article):
+                url = article.url
+                cached = self.article_client.get_cached(url)
+                if cached is not None:
+                    return 'article', article, cached
+                request_timeout, _ = self.article_client.get_timeouts(url)
+                try:
+                    started = loop.time()
+                    with metrics.span('article_download'):
+                        real_url, _, response_headers, content = await request(
+                            'GET', url, request_timeout, headers={'User-Agent': DEFAULT_USER_AGENT}
+                        )
+                    # 解析與摘要屬於 CPU 工作，交給專用執行緒池（設定 parse_pool 時再轉交 worker 行程），
+                    # HTML 直接傳入不再重新下載
+                    news_item = await loop.run_in_executor(
+                        parse_executor, metrics.bind(self.article_client.process_html), article,
+                        real_url, content, detect_encoding(response_headers, content),
+                        loop.time() - started
+                    )
+                except Exception as e:
+                    print(f"處理文章最終失敗，返回標題和連結: {url} ({e})")
+                    news_item = self.article_client.basic_info(article, url)
+                return 'article', article, news_item
+
+            # 不使用預設執行緒池：asyncio.run 結束時會等待預設執行緒池中所有工作完成，
+            # 期限到時仍在解析的文章會讓呼叫端超過期限；專用執行緒池關閉時不等待
+            parse_executor = ThreadPoolExecutor(thread_name_prefix='article-parse')
+            pending = set()
+            candidates = self.news_pool.select(keywords) if self.pool_covers(keywords) else []
+            if not candidates:
+                # 搜尋索引涵蓋的來源直接成為候選，只有過期的來源才即時抓取
+                candidates, stale_sources = self.candidates_from_index(keywords)
+                for source in self.sources:
+                    if source.name in stale_sources:
+                        pending.add(asyncio.ensure_future(source_task(source)))
+
+            try:
+                # 第一階段：等所有來源回應（或期限到）後再排序，只下載排序後會送出的文章
+                while pending:
+                    remaining = deadline_at - loop.time()
+                    if remaining <= 0:
+                        print(f"超過 {deadline:.1f} 秒期限，放棄 {len(pending)} 個未回應的來源")
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        _, subject, value = task.result()
+                        matches = matching_articles(value, keywords)
+                        if matches:
+                            print(f"{subject}: 找到 {len(matches)} 則符合關鍵字的新聞")
+                            candidates.extend(matches)
+                for task in pending:
+                    task.cancel()
+
+                # 第二階段：新聞池已有摘要的直接產出，其餘文章並發下載並在完成時產出
+                pending = set()
+                task_articles = {}
+                for article in self.rank_candidates(candidates, keywords):
+                    cached = None
+                    if self.news_pool is not None:
+                        cached = self.news_pool.get_summary(article.url)
+                    if cached is not None:
+                        yield cached
+                    else:
+                        task = asyncio.ensure_future(article_task(article))
+                        task_articles[task] = article
+                        pending.add(task)
+                while pending:
+                    remaining = deadline_at - loop.time()
+                    if remaining <= 0:
+                        print(f"超過 {deadline:.1f} 秒期限，{len(pending)} 篇文章尚未完成摘要，只回傳標題和連結")
+                        for task in pending:
+                            task.cancel()
+                        for task, article in task_articles.items():
+                            if task in pending:
+                                yield article.with_summary(None)
+                        pending = set()
+                        break
+                    done, pending = await asyncio.wait(
+                        pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        _, _, value = task.result()
+                        if value is not None:
+                            self.store_summary(value)
+                            yield value
+            finally:
+                for task in pending:
+                    task.cancel()
+                parse_executor.shutdown(wait=False, cancel_futures=True)
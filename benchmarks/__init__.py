@@ -0,0 +1 @@
+# News Bot 效能基準測試
\ No newline at end of file
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+關鍵字比對基準測試
+比較原本逐關鍵字 lower() 比對的迴圈與編譯後的 KeywordMatcher
+
+使用方式: python -m benchmarks.bench_matcher --titles 2000 --extra-keywords 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clients.matcher import get_matcher, normalize_text
+from processors import DEFAULT_KEYWORDS
+
+TITLE_WORDS = [
+    "NVIDIA", "Intel", "AMD", "Ryzen", "Radeon", "GeForce", "laptop", "driver", "update",
+    "maintain", "launch", "processor", "GPU", "GPUs", "AI", "workstation", "server", "rendering",
+    "benchmark", "memory",
+    "新一代", "筆記型電腦", "顯卡", "晶片", "伺服器", "發表", "效能", "ＧＰＵ", "ＡＩ", "資料中心",
+]
+REPEATS = 5
+
+
+def make_titles(count, seed=42):
+    """產生中英文混合、含全形字的測試標題"""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(TITLE_WORDS) for _ in range(rng.randint(6, 14)))
+        for _ in range(count)
+    ]
+
+
+def legacy_filter(titles, keywords):
+    """原本的寫法：每個關鍵字都重新把標題轉小寫"""
+    return [
+        title for title in titles
+        if any(keyword.lower() in title.lower() for keyword in keywords)
+    ]
+
+
+def matcher_filter(titles, keywords):
+    matcher = get_matcher(keywords)
+    return [title for title in titles if matcher.matches(title)]
+
+
+def matcher_find(titles, keywords):
+    """找出每則標題命中的所有關鍵字（計分用）"""
+    matcher = get_matcher(keywords)
+    return [matcher.find(title) for title in titles]
+
+
+def timed(fn, *args, cold=False):
+    """重複執行並回傳最佳耗時（毫秒）與結果，cold=True 時每次都清空標題正規化緩存"""
+    durations = []
+    result = None
+    for _ in range(REPEATS):
+        if cold:
+            normalize_text.cache_clear()
+        started = time.perf_counter()
+        result = fn(*args)
+        durations.append((time.perf_counter() - started) * 1000)
+    return min(durations), statistics.mean(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="關鍵字比對基準測試")
+    parser.add_argument('--titles', type=int, default=2000, help="測試標題數量")
+    parser.add_argument('--extra-keywords', type=int, default=50, help="大型關鍵字組額外加入的關鍵字數量")
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles)
+    keyword_sets = {
+        'default': DEFAULT_KEYWORDS,
+        'large': DEFAULT_KEYWORDS + [f"keyword{i}" for i in range(args.extra_keywords)],
+    }
+
+    methods = (
+        ('legacy loop', legacy_filter, False),
+        ('matcher cold', matcher_filter, True),
+        ('matcher warm', matcher_filter, False),
+        ('find warm', matcher_find, False),
+    )
+    print(f"{'keywords':<10}{'method':<16}{'best ms':>10}{'mean ms':>10}{'matched':>9}")
+    for name, keywords in keyword_sets.items():
+        get_matcher(keywords)  # 編譯一次，之後的呼叫都命中快取
+        for method, fn, cold in methods:
+            best, mean, result = timed(fn, titles, keywords, cold=cold)
+            matched = sum(1 for hits in result if hits) if fn is matcher_find else len(result)
+            print(f"{name:<10}{method:<16}{best:>10.2f}{mean:>10.2f}{matched:>9}")
+
+    # 原本的寫法會把 maintain 當成 ai、也抓不到全形的 ＧＰＵ
+    legacy = set(legacy_filter(titles, DEFAULT_KEYWORDS))
+    compiled = set(matcher_filter(titles, DEFAULT_KEYWORDS))
+    print(f"\n只有原本寫法命中: {len(legacy - compiled)} 則，只有 matcher 命中: {len(compiled - legacy)} 則")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+新聞查詢端對端基準測試
+以本地上游模擬伺服器回放錄製的來源資料，模擬 N 位 LINE 使用者同時查詢，
+回報 get_intel_news 的 p50/p95/p99 延遲、第一則新聞送達時間、各階段耗時、峰值 RSS 與吞吐量
+
+使用方式: python -m benchmarks.bench_news --users 10 --rounds 5 --latency 80 --failure-rate 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.upstream import UpstreamStub
+from clients import create_cache
+from clients.circuit_breaker import percentile
+from clients.metrics import metrics
+from delivery import LineDelivery
+from processors import DEFAULT_KEYWORDS, GLOBAL_DEADLINE, get_memory_usage
+
+# 常量定義
+USER_QUERIES = [None, None, 'gpu', 'ai', '顯卡', 'intel', 'amd', 'nvidia']  # None 代表 "news" 指令
+RSS_SAMPLE_INTERVAL = 0.02
+STAGES = (
+    'news_request', 'source_fetch', 'feed_parse', 'article_download', 'article_parse', 'summarize',
+    'line_push',
+)
+
+
+class FakeLineApi:
+    """模擬 LINE Messaging API，每次呼叫固定延遲"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def push_message(self, to, messages, retry_key=None):
+        self._call()
+
+    def multicast(self, to, messages, retry_key=None):
+        self._call()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class PeakRSS:
+    """背景取樣行程 RSS，記錄峰值（MB）"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = get_memory_usage()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop_event.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, get_memory_usage())
+
+
+def ms(value):
+    return f"{value * 1000:.0f}" if value is not None else '-'
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+    }
+
+
+def stage_timings(trace_path):
+    """從追蹤日誌彙總各階段耗時；每個 span 只屬於一筆追蹤，news_request 本身記錄在外層的 line_user 追蹤中"""
+    durations = {}
+    with open(trace_path, encoding='utf-8') as f:
+        for line in f:
+            for span in json.loads(line)['spans']:
+                durations.setdefault(span['stage'], []).append(span['duration'])
+    return {stage: summarize(values) for stage, values in durations.items()}
+
+
+def simulate_user(processor, delivery, query, user_id):
+    """與 news_bot 的 run_news_job 相同：逐則推播，回傳 (耗時, 第一則耗時, 新聞數)"""
+    keywords = DEFAULT_KEYWORDS if query is None else [query]
+    sender = delivery.progressive(user_id)
+    started = time.perf_counter()
+    first = []
+
+    def on_item(news_item):
+        if not first:
+            first.append(time.perf_counter() - started)
+        sender.add(news_item)
+
+    with metrics.trace('line_user', query=query or 'news'):
+        news_list = processor.get_intel_news(keywords=keywords, filter_at_source=True,
+                                             on_item=on_item)
+        sender.flush()
+    return time.perf_counter() - started, first[0] if first else None, len(news_list)
+
+
+def run_engine(engine, args):
+    """啟動模擬上游與容器，執行 warmup 與所有回合，回傳結果"""
+    stub = UpstreamStub(args.latency / 1000, args.jitter / 1000, args.failure_rate,
+                        seed=args.seed).start()
+    rng = random.Random(args.seed)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            os.environ['SOURCES_PATH'] = stub.write_sources(os.path.join(directory, 'sources.json'))
+            os.environ['NEWS_DEADLINE'] = str(args.deadline)
+            from container import NewsBotContainer
+            container = NewsBotContainer()
+            trace_path = os.path.join(directory, 'trace.jsonl')
+            processor = container.create_news_processor(engine=engine)
+            if not args.index:
+                # 預設每次都走即時抓取路徑，--index 時允許搜尋索引回應重複的查詢
+                processor.search_index = None
+            line_api = FakeLineApi(args.line_latency / 1000)
+            delivery = LineDelivery(line_api, use_flex=args.flex)
+
+            # warmup：匯入 newspaper、NLTK 與建立連線，不計入結果
+            simulate_user(processor, delivery, None, 'warmup')
+            metrics.configure(enabled=True, trace_path=trace_path)
+
+            latencies, first_items, news_counts, errors = [], [], [], 0
+            lock = threading.Lock()
+            with PeakRSS() as rss:
+                started = time.perf_counter()
+                for _ in range(args.rounds):
+                    if not args.warm:
+                        container.article_client.cache = create_cache('memory')
+                    queries = [rng.choice(USER_QUERIES) for _ in range(args.users)]
+                    barrier = threading.Barrier(args.users)
+
+                    def user(index):
+                        nonlocal errors
+                        barrier.wait()
+                        try:
+                            elapsed, first, count = simulate_user(
+                                processor, delivery, queries[index], f"U{index}"
+                            )
+                        except Exception as e:
+                            print(f"模擬使用者 U{index} 查詢失敗: {e}")
+                            with lock:
+                                errors += 1
+                            return
+                        with lock:
+                            latencies.append(elapsed)
+                            news_counts.append(count)
+                            if first is not None:
+                                first_items.append(first)
+
+                    threads = [
+                        threading.Thread(target=user, args=(index,)) for index in range(args.users)
+                    ]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                wall = time.perf_counter() - started
+            metrics.configure(enabled=False)
+
+            return {
+                'engine': engine,
+                'requests': len(latencies),
+                'errors': errors,
+                'latency': summarize(latencies),
+                'first_item': summarize(first_items),
+                'mean_news': sum(news_counts) / len(news_counts) if news_counts else 0,
+                'throughput': len(latencies) / wall if wall else 0.0,
+                'peak_rss_mb': rss.peak,
+                'line_api_calls': line_api.calls,
+                'stages': stage_timings(trace_path),
+                'upstream': stub.get_stats(),
+            }
+    finally:
+        stub.stop()
+
+
+def print_report(results):
+    print(f"\n{'engine':<10}{'reqs':>6}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'first p50':>11}{'news':>6}{'req/s':>8}{'peak RSS MB':>13}")
+    for result in results:
+        latency, first = result['latency'], result['first_item']
+        print(f"{result['engine']:<10}{result['requests']:>6}{result['errors']:>8}"
+              f"{ms(latency['p50']):>9}{ms(latency['p95']):>9}{ms(latency['p99']):>9}"
+              f"{ms(first['p50']):>11}{result['mean_news']:>6.1f}"
+              f"{result['throughput']:>8.2f}{result['peak_rss_mb']:>13.1f}")
+
+    for result in results:
+        print(f"\n[{result['engine']}] 各階段耗時")
+        print(f"{'stage':<18}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for stage in STAGES:
+            timing = result['stages'].get(stage)
+            if timing:
+                print(f"{stage:<18}{timing['count']:>7}{ms(timing['p50']):>9}"
+                      f"{ms(timing['p95']):>9}{ms(timing['p99']):>9}")
+        print(f"{'upstream':<18}{'requests':>9}{'503':>6}{'304':>6}{'KB':>8}")
+        for name, stats in result['upstream'].items():
+            print(f"{name:<18}{stats['requests']:>9}{stats['failures']:>6}"
+                  f"{stats['not_modified']:>6}{stats['bytes'] / 1024:>8.1f}")
+
+
+def run_in_subprocess(engine, args):
+    """以相同參數在新行程中執行單一引擎，回傳其結果"""
+    argv = ['--engine', engine]
+    for name, value in vars(args).items():
+        if name in ('engine', 'output', 'max_p95') or value is None or value is False:
+            continue
+        flag = '--' + name.replace('_', '-')
+        argv += [flag] if value is True else [flag, str(value)]
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'result.json')
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_news', *argv, '--output', output],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True,
+            stdout=None if args.verbose else subprocess.DEVNULL
+        )
+        with open(output, encoding='utf-8') as f:
+            return json.load(f)['results'][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="新聞查詢端對端基準測試")
+    parser.add_argument('--engine', choices=['threaded', 'async', 'both'], default='both',
+                        help="處理引擎")
+    parser.add_argument('--users', type=int, default=10, help="每回合同時查詢的模擬使用者數")
+    parser.add_argument('--rounds', type=int, default=5, help="回合數")
+    parser.add_argument('--latency', type=float, default=50, help="上游回應平均延遲（毫秒）")
+    parser.add_argument('--jitter', type=float, default=20, help="上游延遲標準差（毫秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="上游回應 503 的機率")
+    parser.add_argument('--line-latency', type=float, default=30, help="模擬 LINE API 每次呼叫的延遲（毫秒）")
+    parser.add_argument('--deadline', type=float, default=GLOBAL_DEADLINE, help="每次查詢的延遲預算（秒）")
+    parser.add_argument('--warm', action='store_true', help="回合之間保留文章摘要緩存")
+    parser.add_argument('--index', action='store_true', help="啟用搜尋索引")
+    parser.add_argument('--flex', action='store_true', help="以 Flex carousel 推播")
+    parser.add_argument('--seed', type=int, default=42, help="查詢組合與注入失敗的亂數種子")
+    parser.add_argument('--verbose', action='store_true', help="顯示處理過程的日誌")
+    parser.add_argument('--output', help="把結果寫成 JSON 檔案，方便比較不同版本")
+    parser.add_argument('--max-p95', type=float, help="端對端 p95 超過此毫秒數時以結束碼 1 離開")
+    args = parser.parse_args()
+
+    if args.engine == 'both':
+        # 來源設定、熔斷器與峰值 RSS 都是行程層級，每個引擎在各自的行程中執行
+        results = [run_in_subprocess(engine, args) for engine in ('threaded', 'async')]
+    elif args.verbose:
+        results = [run_engine(args.engine, args)]
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = [run_engine(args.engine, args)]
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.output}")
+
+    if args.max_p95 is not None:
+        slow = [r['engine'] for r in results if (r['latency']['p95'] or 0) * 1000 > args.max_p95]
+        if slow:
+            print(f"\n✗ p95 超過 {args.max_p95:.0f} ms: {', '.join(slow)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+摘要引擎基準測試
+比較各引擎的單篇延遲、批次延遲與輸出長度
+
+使用方式: python -m benchmarks.bench_summarizers --articles 50
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clients.summarizers import SUMMARIZERS, get_summarizer
+
+EN_SENTENCES = [
+    "The new graphics card doubles ray tracing throughput compared with the previous generation.",
+    "Analysts expect data center revenue to keep growing as AI training clusters expand.",
+    "The company said the workstation line will ship with up to 96 GB of memory.",
+    "Benchmarks show a 35 percent uplift in rendering workloads at the same power.",
+    "Partners will offer desktop systems built around the processor later this quarter.",
+    "Pricing has not been announced, but retailers list the card at around 1,999 dollars.",
+    "Developers can access the new software stack through an early access program.",
+    "The launch event also introduced an updated driver with lower input latency.",
+]
+
+ZH_SENTENCES = [
+    "新一代顯卡的光線追蹤效能較上一代提升一倍。",
+    "分析師預期資料中心營收將隨 AI 訓練叢集擴張而持續成長。",
+    "公司表示工作站產品線最高可搭載 96 GB 記憶體。",
+    "基準測試顯示在相同功耗下渲染效能提升百分之三十五。",
+    "合作夥伴將於本季稍晚推出搭載該處理器的桌上型電腦。",
+    "官方尚未公布售價，但通路報價約為新台幣六萬元。",
+    "開發者可透過搶先體驗計畫取得新的軟體工具。",
+    "發表會上也同步推出降低輸入延遲的新版驅動程式。",
+]
+
+
+def make_articles(count, seed=42):
+    """產生中英文混合的測試文章"""
+    rng = random.Random(seed)
+    articles = []
+    for i in range(count):
+        pool = ZH_SENTENCES if i % 2 else EN_SENTENCES
+        sentences = [rng.choice(pool) for _ in range(rng.randint(20, 60))]
+        joiner = "" if pool is ZH_SENTENCES else " "
+        articles.append(joiner.join(sentences))
+    return articles
+
+
+def bench(articles):
+    """回傳每個引擎的延遲與輸出長度統計"""
+    results = []
+    for name in SUMMARIZERS:
+        engine = get_summarizer(name)
+        engine.summarize(articles[0])  # 暖機，避免把匯入時間算進去
+
+        latencies = []
+        outputs = []
+        for text in articles:
+            started = time.perf_counter()
+            outputs.append(engine.summarize(text))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        engine.summarize_batch(articles)
+        batch_ms = (time.perf_counter() - started) * 1000
+
+        results.append({
+            'engine': name,
+            'mean_ms': statistics.mean(latencies),
+            'p95_ms': sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+            'batch_ms': batch_ms,
+            'avg_chars': statistics.mean(len(o) for o in outputs),
+            'empty': sum(1 for o in outputs if not o.strip()),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="摘要引擎基準測試")
+    parser.add_argument('--articles', type=int, default=50, help="測試文章數量")
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles)
+    print(f"{'engine':<10}{'mean ms':>10}{'p95 ms':>10}{'batch ms':>11}{'avg chars':>11}"
+          f"{'empty':>7}")
+    for row in bench(articles):
+        print(
+            f"{row['engine']:<10}{row['mean_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+            f"{row['batch_ms']:>11.1f}{row['avg_chars']:>11.1f}{row['empty']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
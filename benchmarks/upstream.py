@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+本地上游模擬伺服器
+以 fixtures/ 中錄製的 feed XML、Coveo/WordPress JSON 與文章 HTML 模擬 Intel、Tom's Hardware、AMD 與 NVIDIA，
+可注入延遲與失敗率；每個來源使用各自的連接埠，熔斷器與主機限流會像正式環境一樣分開計算
+
+使用方式: python -m benchmarks.upstream --latency 80 --failure-rate 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# 常量定義
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FEED_PATH = '/feed'
+COVEO_PATH = '/rest/search/v2'
+WORDPRESS_PATH = '/wp-json/wp/v2/posts'
+NVIDIA_KEYWORDS = ['GPU', 'AI', '顯卡']
+UPSTREAMS = {
+    'Intel': {'type': 'rss', 'fixture': 'intel_feed.xml', 'article': 'zh.html'},
+    "Tom's Hardware": {'type': 'rss', 'fixture': 'tomshardware_feed.xml', 'article': 'en.html'},
+    'AMD': {'type': 'coveo', 'fixture': 'amd_coveo.json', 'article': 'zh.html'},
+    'NVIDIA': {'type': 'wordpress', 'fixture': 'nvidia_posts.json', 'article': 'zh.html'},
+}
+SOURCE_PATHS = {'rss': FEED_PATH, 'coveo': COVEO_PATH, 'wordpress': WORDPRESS_PATH}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def fixture_titles(upstream):
+    """回傳 {文章路徑: 標題}，文章頁面依此填入標題"""
+    text = read_fixture(upstream['fixture'])
+    if upstream['type'] == 'rss':
+        entries = [
+            (item.findtext('link'), item.findtext('title'))
+            for item in ET.fromstring(text).iter('item')
+        ]
+    elif upstream['type'] == 'coveo':
+        entries = [(item['clickUri'], item['title']) for item in json.loads(text)['results']]
+    else:
+        entries = [(post['link'], post['title']['rendered']) for post in json.loads(text)]
+    return {urlparse(link.replace('{base}', 'http://stub')).path: title for link, title in entries}
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.upstream.handle(self, 'GET')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.upstream.handle(self, 'POST', body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Upstream:
+    """單一來源的模擬主機"""
+
+    def __init__(self, stub, name, config):
+        self.stub = stub
+        self.name = name
+        self.config = config
+        self.fixture = read_fixture(config['fixture'])
+        self.article = read_fixture(os.path.join('articles', config['article']))
+        self.titles = fixture_titles(config)
+        self.server = _StubServer(('127.0.0.1', 0), _StubHandler)
+        self.server.upstream = self
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.stats = {
+            'requests': 0, 'failures': 0, 'not_modified': 0, 'bytes': 0, 'peak_concurrency': 0
+        }
+        self._in_flight = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"stub-{self.name}",
+                                        daemon=True)
+        self._thread.start()
+
+    def handle(self, handler, method, payload=b''):
+        with self.stub.lock:
+            self.stats['requests'] += 1
+            self._in_flight += 1
+            self.stats['peak_concurrency'] = max(self.stats['peak_concurrency'], self._in_flight)
+        try:
+            self.respond(handler, method, payload)
+        finally:
+            with self.stub.lock:
+                self._in_flight -= 1
+
+    def respond(self, handler, method, payload=b''):
+        delay, fail = self.stub.sample()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self.stub.lock:
+                self.stats['failures'] += 1
+            self.send(handler, 503, b'Service Unavailable', 'text/plain')
+            return
+
+        url = urlparse(handler.path)
+        is_listing = url.path == SOURCE_PATHS[self.config['type']]
+        if is_listing and (method == 'POST') == (self.config['type'] == 'coveo'):
+            body, content_type = self.listing(parse_qs(url.query), payload)
+            if body is None:
+                self.send(handler, 400, b'{"code":"rest_post_invalid_page_number"}',
+                          'application/json')
+                return
+        elif url.path in self.titles:
+            body = self.article.replace('{title}', self.titles[url.path])
+            content_type = 'text/html; charset=utf-8'
+        else:
+            self.send(handler, 404, b'Not Found', 'text/plain')
+            return
+
+        body = body.replace('{base}', self.base).encode('utf-8')
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        if handler.headers.get('If-None-Match') == etag:
+            with self.stub.lock:
+                self.stats['not_modified'] += 1
+            self.send(handler, 304, b'', content_type, etag)
+            return
+        self.send(handler, 200, body, content_type, etag)
+
+    def listing(self, query, payload=b''):
+        if self.config['type'] == 'rss':
+            return self.fixture, 'application/rss+xml; charset=utf-8'
+        if self.config['type'] == 'coveo':
+            return self.coveo_search(json.loads(payload or b'{}')), 'application/json'
+        # WordPress 搜尋：標題包含關鍵字、晚於 after 的文章，依 page / per_page 分頁並只回傳 _fields 指定的欄位；
+        # 與 WordPress 相同，超過最後一頁時回應 400
+        keyword = query.get('search', [''])[0].lower()
+        per_page = int(query.get('per_page', ['10'])[0])
+        page = int(query.get('page', ['1'])[0])
+        after = query.get('after', [''])[0].rstrip('Z')
+        fields = query.get('_fields', [''])[0].split(',')
+        posts = [
+            post for post in json.loads(self.fixture)
+            if keyword in post['title']['rendered'].lower() and post['date_gmt'] > after
+        ]
+        if page > 1 and (page - 1) * per_page >= len(posts):
+            return None, 'application/json'
+        posts = posts[(page - 1) * per_page:page * per_page]
+        if fields != ['']:
+            posts = [{name: post[name] for name in fields if name in post} for post in posts]
+        return json.dumps(posts, ensure_ascii=False), 'application/json'
+
+    def coveo_search(self, request):
+        """Coveo 搜尋：標題包含 q 中任一片語、晚於 aq 日期的結果，依 firstResult / numberOfResults 分頁，
+        raw 只保留 fieldsToInclude 指定的欄位
+        """
+        fixture = json.loads(self.fixture)
+        terms = [
+            term.strip().strip('"').lower() for term in request.get('q', '').split(' OR ')
+            if term.strip()
+        ]
+        since = None
+        if request.get('aq', '').startswith('@amd_release_date>'):
+            since = datetime.strptime(request['aq'].split('>', 1)[1], '%Y/%m/%d@%H:%M:%S')
+            since = since.replace(tzinfo=timezone.utc)
+            since = since.timestamp() * 1000
+        results = [
+            result for result in fixture['results']
+            if (not terms or any(term in result['title'].lower() for term in terms))
+            and (since is None or result['raw']['amd_release_date'] > since)
+        ]
+        first = request.get('firstResult', 0)
+        page = results[first:first + request.get('numberOfResults', 10)]
+        if 'fieldsToInclude' in request:
+            fields = request['fieldsToInclude']
+            page = [
+                dict(result, raw={
+                    name: result['raw'][name] for name in fields if name in result['raw']
+                })
+                for result in page
+            ]
+        return json.dumps(dict(fixture, totalCount=len(results), results=page), ensure_ascii=False)
+
+    def send(self, handler, status, body, content_type, etag=None):
+        with self.stub.lock:
+            self.stats['bytes'] += len(body)
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        if etag:
+            handler.send_header('ETag', etag)
+        handler.end_headers()
+        if body:
+            handler.wfile.write(body)
+
+
+class UpstreamStub:
+    """所有來源的模擬主機，latency / jitter 為秒數，failure_rate 為回應 503 的機率"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self.upstreams = {name: _Upstream(self, name, config) for name, config in UPSTREAMS.items()}
+
+    def start(self):
+        for upstream in self.upstreams.values():
+            upstream.start()
+        return self
+
+    def stop(self):
+        for upstream in self.upstreams.values():
+            upstream.server.shutdown()
+            upstream.server.server_close()
+
+    def sample(self):
+        """回傳 (延遲秒數, 是否失敗)"""
+        with self.lock:
+            delay = 0.0
+            if self.latency or self.jitter:
+                delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            return delay, self._random.random() < self.failure_rate
+
+    def sources_config(self):
+        """與 sources.json 相同格式的來源設定，指向本地模擬主機"""
+        sources = []
+        for name, upstream in self.upstreams.items():
+            source = {
+                'name': name,
+                'type': upstream.config['type'],
+                'url': upstream.base + SOURCE_PATHS[upstream.config['type']],
+            }
+            if source['type'] == 'wordpress':
+                source['options'] = {'keywords': NVIDIA_KEYWORDS}
+            sources.append(source)
+        return {'sources': sources}
+
+    def write_sources(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.sources_config(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def get_stats(self):
+        with self.lock:
+            return {name: dict(upstream.stats) for name, upstream in self.upstreams.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地上游模擬伺服器")
+    parser.add_argument('--latency', type=float, default=50, help="每個回應的平均延遲（毫秒）")
+    parser.add_argument('--jitter', type=float, default=20, help="延遲的標準差（毫秒）")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="回應 503 的機率")
+    parser.add_argument('--sources', default='sources.bench.json',
+                        help="寫出的來源設定檔，可用 SOURCES_PATH 指定給 news bot")
+    args = parser.parse_args()
+
+    stub = UpstreamStub(args.latency / 1000, args.jitter / 1000, args.failure_rate).start()
+    stub.write_sources(args.sources)
+    for name, upstream in stub.upstreams.items():
+        print(f"{name:<16}{upstream.base}")
+    print(f"\n來源設定已寫入 {args.sources}，以 SOURCES_PATH={args.sources} 啟動 news bot，Ctrl+C 結束")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(json.dumps(stub.get_stats(), ensure_ascii=False, indent=2))
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
-from .base_client import BaseAPIClient
+from .base_client import BaseAPIClient, create_session
 from .amd_client import AMDAPIClient
 from .nvidia_client import NvidiaAPIClient
 from .rss_client import RSSClient
 from .article_client import ArticleClient
+from .cache import MemoryCache, SQLiteCache, RedisCache, create_cache
+from .summarizers import get_summarizer
+from .models import NewsItem
+from .sources import Source, SourceRegistry
+from .circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from .metrics import Metrics
 
 __all__ = [
     'BaseAPIClient',
     'AMDAPIClient',
     'NvidiaAPIClient',
     'RSSClient',
-    'ArticleClient'
+    'ArticleClient',
+    'create_session',
+    'MemoryCache',
+    'SQLiteCache',
+    'RedisCache',
+    'create_cache',
+    'get_summarizer',
+    'NewsItem',
+    'Source',
+    'SourceRegistry',
+    'CircuitBreakerRegistry',
+    'CircuitOpenError',
+    'Metrics'
 ]
\ No newline at end of file
@@ -1,126 +1,230 @@
-from newspaper import Article
-from summa import summarizer
 from .base_client import BaseAPIClient
+from .cache import MemoryCache, NEGATIVE_TTL, cache_key
+from .metrics import metrics
+from .models import NewsItem
+from .singleflight import SingleFlight
+from .sources import get_default_registry
+from .summarizers import get_summarizer
 from functools import lru_cache
+from collections import deque
+import codecs
+import re
 import time
 
 # 常量定義
 DEFAULT_USER_AGENT = 'Mozilla/5.0'
+MAX_ARTICLE_BYTES = 2 * 1024 * 1024  # 單篇文章最多讀取2MB
+RETRY_BACKOFF = 0.25  # 重試前等待 0.25、0.5… 秒；連線層的 429/5xx 重試已由 Session 處理
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+TIMING_WINDOW = 200  # 保留最近200篇文章的耗時
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+WARM_UP_HTML = (
+    "<html><head><title>warm up</title></head>"
+    "<body><article><p>Warm up the parser.</p></article></body></html>"
+)
+WARM_UP_HTML_ZH = (
+    '<html lang="zh-TW"><head><meta charset="utf-8"><title>預熱</title></head><body><article>'
+    + '<p>新一代顯卡在相同功耗下效能提升，合作夥伴將於本季推出搭載新處理器的電腦。</p>' * 8
+    + '</article></body></html>'
+)
+
+def detect_encoding(headers, raw):
+    """依 Content-Type 或 HTML meta 判斷編碼，預設 UTF-8"""
+    content_type = headers.get('Content-Type', '')
+    if 'charset=' in content_type.lower():
+        encoding = content_type.lower().split('charset=')[-1].split(';')[0].strip().strip('"\'')
+    else:
+        match = META_CHARSET_PATTERN.search(raw[:4096])
+        encoding = match.group(1).decode('ascii', errors='ignore') if match else 'utf-8'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return 'utf-8'
+    return encoding
+
+def extract_summary(url, html, summarizer):
+    """以 newspaper3k 解析 HTML 並生成摘要，回傳 (摘要, 解析耗時, 摘要耗時)"""
+    from newspaper import Article
+
+    started = time.time()
+    art = Article(url)
+    art.download(input_html=html)
+    art.parse()
+    text = art.text
+
+    # 清理不需要的數據以節省內存
+    if hasattr(art, 'html'):
+        art.html = None
+    parse_time = time.time() - started
+
+    started = time.time()
+    if text.strip() == "":
+        summary = "無法生成摘要"
+    else:
+        summary = summarizer.summarize(text)
+    return summary, parse_time, time.time() - started
+
+def warm_up(summarizer):
+    """解析中英文範例 HTML，讓 newspaper、lxml、jieba 詞典與摘要引擎的延遲初始化提前完成"""
+    for html in (WARM_UP_HTML, WARM_UP_HTML_ZH):
+        extract_summary('http://localhost/', html, summarizer)
 
 class ArticleClient(BaseAPIClient):
 
-    def __init__(self):
-        super().__init__()
-        self._cache = {}
-        self._cache_timeout = 3600  # 1小時緩存
-
-    def _get_cache_key(self, url):
-        """生成緩存鍵"""
-        return f"article_{hash(url)}"
-
-    def _is_cache_valid(self, cache_key):
-        """檢查緩存是否有效"""
-        if cache_key in self._cache:
-            timestamp, _ = self._cache[cache_key]
-            return time.time() - timestamp < self._cache_timeout
-        return False
-
-    def _cleanup_cache(self):
-        """清理過期的緩存項目"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, (timestamp, _) in self._cache.items()
-            if current_time - timestamp > self._cache_timeout
-        ]
-        for key in expired_keys:
-            del self._cache[key]
-        if expired_keys:
-            print(f"清理了 {len(expired_keys)} 個過期緩存項目")
+    def __init__(self, session=None, max_bytes=MAX_ARTICLE_BYTES, cache=None, summarizer=None,
+                 parse_pool=None, sources=None, breakers=None):
+        super().__init__(session=session, breakers=breakers)
+        self.sources = sources if sources is not None else get_default_registry()
+        self.cache = cache if cache is not None else MemoryCache()
+        self.summarizer = summarizer or get_summarizer('textrank')
+        self.parse_pool = parse_pool
+        self.max_bytes = max_bytes
+        self._timings = deque(maxlen=TIMING_WINDOW)
+        self._flight = SingleFlight()
+
+    def get_cached(self, url):
+        """回傳有效的緩存 NewsItem，不存在時回傳 None"""
+        cached_result = self.cache.get(cache_key(url))
+        if cached_result is None:
+            return None
+        print(f"使用緩存的文章: {url}")
+        return NewsItem.from_dict(cached_result)
+
+    def is_cached(self, url):
+        """文章已有緩存結果（含只有標題和連結的失敗結果）時回傳 True"""
+        return self.cache.get(cache_key(url)) is not None
+
+    def get_cache_stats(self):
+        """回傳緩存命中、未命中與淘汰統計"""
+        return self.cache.stats()
+
+    def get_timeouts(self, url):
+        """依來源設定的文章超時與重試次數，回傳 (請求超時, 重試次數)"""
+        return self.sources.article_policy(url)
+
+    def basic_info(self, article, url):
+        """無法生成摘要時只回傳標題和連結，並緩存避免重複處理"""
+        basic_info = article.with_summary(None, resolved_url=url)
+        # 失敗結果使用較短的 TTL，避免暫時性錯誤被緩存一小時
+        self.cache.set(cache_key(article.url), basic_info.to_dict(), ttl=NEGATIVE_TTL)
+        return basic_info
+
+    def _download_html(self, url, timeout):
+        """串流下載文章 HTML，超過 max_bytes 即停止讀取，回傳 (最終網址, 原始位元組, 編碼)
+
+        同一主機同時進行的下載數受來源設定的 host_limit 限制
+        """
+        with self.sources.limit(url), metrics.span('article_download'):
+            return self._download_limited(url, timeout)
+
+    def _download_limited(self, url, timeout):
+        response = self._make_request(url, headers={'User-Agent': DEFAULT_USER_AGENT},
+                                      allow_redirects=True, timeout=timeout, stream=True)
+        if response is None:
+            raise IOError(f"request failed: {url}")
+        try:
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= self.max_bytes:
+                    print(f"文章超過 {self.max_bytes} bytes，只解析前段內容: {url}")
+                    break
+            raw = b''.join(chunks)[:self.max_bytes]
+            return response.url, raw, detect_encoding(response.headers, raw)
+        finally:
+            response.close()
+
+    def _record_timings(self, url, timings):
+        """記錄單篇文章的下載/解析/摘要耗時"""
+        self._timings.append(timings)
+        print(
+            f"文章耗時 下載 {timings.get('download', 0):.2f}s / 解析 {timings.get('parse', 0):.2f}s / "
+            f"摘要 {timings.get('summarize', 0):.2f}s: {url}"
+        )
+
+    def get_timing_stats(self):
+        """回傳最近文章的平均下載/解析/摘要耗時"""
+        timings = list(self._timings)
+        stats = {'articles': len(timings)}
+        for stage in ('download', 'parse', 'summarize'):
+            values = [t[stage] for t in timings if stage in t]
+            stats[stage] = sum(values) / len(values) if values else 0.0
+        return stats
+
+    def _build_news_item(self, article, real_url, content, encoding, timings):
+        """解析 HTML、生成摘要並把帶摘要的 NewsItem 存入緩存，設定 parse_pool 時交給 worker 行程處理"""
+        if self.parse_pool is not None:
+            summary, timings['parse'], timings['summarize'] = self.parse_pool.parse_and_summarize(
+                real_url, content, encoding
+            )
+        else:
+            summary, timings['parse'], timings['summarize'] = extract_summary(
+                real_url, content.decode(encoding, errors='replace'), self.summarizer
+            )
+
+        self._record_timings(real_url, timings)
+        metrics.record('article_parse', timings['parse'])
+        metrics.record('summarize', timings['summarize'])
+        news_item = article.with_summary(summary, resolved_url=real_url, timings=timings)
+
+        # 存儲到緩存
+        self.cache.set(cache_key(article.url), news_item.to_dict())
+
+        return news_item
+
+    def process_html(self, article, real_url, content, encoding, download_time=None):
+        """使用已下載的 HTML 位元組解析文章並生成摘要，不再重新下載"""
+        timings = {} if download_time is None else {'download': download_time}
+        return self._build_news_item(article, real_url, content[:self.max_bytes], encoding, timings)
 
     def process_article(self, article):
-        """處理單篇文章"""
-        url = article['url']
-        cache_key = self._get_cache_key(url)
+        """處理單篇文章，相同網址的並發請求只會處理一次"""
+        return self._flight.do(cache_key(article.url), self._process_article, article)
+
+    def get_coalescing_stats(self):
+        """回傳被合併的文章處理次數"""
+        return self._flight.stats()
 
-        # 增加緩存大小，減少清理頻率
-        if len(self._cache) > 100:  # 增加到100個項目
-            self._cleanup_cache()
+    def _process_article(self, article):
+        url = article.url
 
         # 檢查緩存
-        if self._is_cache_valid(cache_key):
-            print(f"使用緩存的文章: {url}")
-            _, cached_result = self._cache[cache_key]
+        cached_result = self.get_cached(url)
+        if cached_result is not None:
             return cached_result
 
         try:
-            # 對不同網站使用不同的超時策略
-            if 'amd.com' in url:
-                request_timeout = 20  # AMD網站響應較慢，使用更長超時
-                newspaper_timeout = 15
-                max_retries = 1  # AMD網站重試1次
-            else:
-                request_timeout = 15
-                newspaper_timeout = 12
-                max_retries = 1
-
-            last_exception = None
+            request_timeout, max_retries = self.get_timeouts(url)
 
             # 實現重試機制
             for attempt in range(max_retries + 1):
                 try:
-                    response = self._make_request(url, headers={'User-Agent': DEFAULT_USER_AGENT}, allow_redirects=True, timeout=request_timeout)
-                    if response:
-                        real_url = response.url
-                        art = Article(real_url)
-
-                        # 設置對應的超時時間
-                        art.config.timeout = newspaper_timeout
-                        art.download()
-                        art.parse()
-
-                        # 清理不需要的數據以節省內存
-                        if hasattr(art, 'html'):
-                            art.html = None
-
-                        if art.text.strip() == "":
-                            summary = "無法生成摘要"
-                        else:
-                            # 優化摘要生成：減少文本長度和參數以提升速度
-                            text_to_summarize = art.text[:8000]  # 減少到8000字符
-                            summary = summarizer.summarize(text_to_summarize, ratio=0.15, words=25)  # 增加ratio，減少words以加快處理
-                            if len(summary) > 120:  # 減少摘要長度
-                                summary = summary[:120] + "..."
-
-                        news_item = f"📰 標題: {article['title']} (來源: {article['source']})\n🔗 連結: {real_url}\n📑 新聞摘要: {summary}\n"
-
-                        # 存儲到緩存
-                        self._cache[cache_key] = (time.time(), news_item)
-
-                        return news_item
+                    started = time.time()
+                    real_url, content, encoding = self._download_html(url, request_timeout)
+                    # 直接解析第一次請求取得的 HTML，不再讓 newspaper 重新下載
+                    timings = {'download': time.time() - started}
+                    return self._build_news_item(article, real_url, content, encoding, timings)
 
                 except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries:
+                    # 主機已熔斷時不再重試，直接回傳標題和連結
+                    if attempt < max_retries and not self.breakers.is_open(url):
                         print(f"處理文章失敗，重試 {attempt + 1}/{max_retries}: {url}")
-                        import time
-                        time.sleep(1)  # 重試前等待1秒
+                        time.sleep(RETRY_BACKOFF * 2 ** attempt)
                     else:
                         # 所有重試都失敗了，返回標題和連結
                         print(f"處理文章最終失敗，返回標題和連結: {url}")
-                        basic_info = f"📰 標題: {article['title']} (來源: {article['source']})\n🔗 連結: {url}\n\n"
-                        # 緩存基本信息，避免重複處理
-                        self._cache[cache_key] = (time.time(), basic_info)
-                        return basic_info
+                        return self.basic_info(article, url)
 
         except Exception as e:
             # 其他錯誤也返回標題和連結
             print(f"處理文章時發生未預期錯誤，返回標題和連結: {url}")
-            basic_info = f"📰 標題: {article['title']} (來源: {article['source']})\n🔗 連結: {url}\n\n"
-            # 緩存基本信息，避免重複處理
-            self._cache[cache_key] = (time.time(), basic_info)
-            return basic_info
+            return self.basic_info(article, url)
         finally:
-            # 確保清理資源
-            import gc
-            gc.collect()
-        return ""
\ No newline at end of file
+            # 確保清理資源；使用 parse_pool 時解析在 worker 行程中進行，不需要在這裡停下所有執行緒做 GC
+            if self.parse_pool is None:
+                import gc
+                gc.collect()
+        return None
\ No newline at end of file
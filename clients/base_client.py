@@ -1,21 +1,283 @@
+import hashlib
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from .circuit_breaker import circuit_breakers
 
 # 常量定義
 REQUEST_TIMEOUT = 15
+POOL_CONNECTIONS = 10  # 連線池管理器快取的主機數量
+POOL_MAXSIZE = 10  # 每個主機保留的 keep-alive 連線數
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 個別主機的連線池大小（未列出的主機使用 POOL_MAXSIZE）
+HOST_POOL_SIZES = {
+    'blogs.nvidia.com.tw': 6,  # 多個關鍵字搜尋同時進行
+    'www.tomshardware.com': 4,
+    'newsroom.intel.com': 4,
+}
+
+
+class ConnectionStats:
+    """統計各主機的請求數與新建連線數，用於確認連線重用效果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        return self._hosts.setdefault(host, {'requests': 0, 'new_connections': 0})
+
+    def record_request(self, host):
+        with self._lock:
+            self._host(host)['requests'] += 1
+
+    def record_new_connection(self, host):
+        with self._lock:
+            self._host(host)['new_connections'] += 1
+
+    def snapshot(self):
+        """回傳各主機與總計的請求數、新建連線數與重用連線數"""
+        with self._lock:
+            hosts = {host: dict(stats) for host, stats in self._hosts.items()}
+        total = {'requests': 0, 'new_connections': 0}
+        for stats in hosts.values():
+            stats['reused_connections'] = max(0, stats['requests'] - stats['new_connections'])
+            total['requests'] += stats['requests']
+            total['new_connections'] += stats['new_connections']
+        total['reused_connections'] = max(0, total['requests'] - total['new_connections'])
+        return {'hosts': hosts, 'total': total}
+
+
+connection_stats = ConnectionStats()
+
+
+class _ConnectionCountingMixin:
+    """在 urllib3 連線池建立連線與送出請求時記錄統計"""
+
+    def _new_conn(self):
+        connection_stats.record_new_connection(self.host)
+        return super()._new_conn()
+
+    def _make_request(self, *args, **kwargs):
+        connection_stats.record_request(self.host)
+        return super()._make_request(*args, **kwargs)
+
+
+class _CountingHTTPConnectionPool(_ConnectionCountingMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_ConnectionCountingMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """使用計數連線池的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                   max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, host_pool_sizes=None,
+                   host_retries=None):
+    """建立帶連線池、keep-alive 與重試退避的 requests Session，個別主機可設定連線池大小與重試次數"""
+    if host_pool_sizes is None:
+        host_pool_sizes = HOST_POOL_SIZES
+    host_retries = host_retries or {}
+
+    def make_adapter(maxsize, retries=max_retries):
+        # 只重試連線失敗與可重試的狀態碼：讀取超時不重試（否則一個卡住的上游會耗掉數倍超時，
+        # 熔斷器也只看到一次樣本），POST 搜尋不是冪等請求也不重試
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=False,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False
+        )
+        return PooledHTTPAdapter(pool_connections=pool_connections, pool_maxsize=maxsize,
+                                 max_retries=retry)
+
+    session = requests.Session()
+    session.headers['Connection'] = 'keep-alive'
+    default_adapter = make_adapter(pool_maxsize)
+    session.mount('http://', default_adapter)
+    session.mount('https://', default_adapter)
+    for host in set(host_pool_sizes) | set(host_retries):
+        session.mount(
+            f'https://{host}/',
+            make_adapter(host_pool_sizes.get(host, pool_maxsize),
+                         host_retries.get(host, max_retries))
+        )
+    return session
+
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def get_shared_session():
+    """取得所有客戶端共用的預設 Session"""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session()
+        return _shared_session
+
 
 class BaseAPIClient:
     """基礎 API 客戶端類別，提供通用請求方法"""
 
-    def _make_request(self, url, method='GET', headers=None, params=None, data=None, json_data=None, timeout=REQUEST_TIMEOUT, allow_redirects=True):
-        """通用 API 請求方法"""
+    def __init__(self, session=None, breakers=None):
+        self.session = session or get_shared_session()
+        self.breakers = breakers if breakers is not None else circuit_breakers
+        self._validators = {}  # 來源鍵 -> ETag、Last-Modified、內容雜湊與上次解析結果
+        self._last_results = {}  # 非條件式請求（例如 AMD 的 POST 搜尋）上次成功的結果
+        self._conditional_stats = {}
+        self._validator_lock = threading.Lock()
+
+    def _make_request(self, url, method='GET', headers=None, params=None, data=None,
+                      json_data=None, timeout=REQUEST_TIMEOUT, allow_redirects=True,
+                      stream=False):
+        """通用 API 請求方法
+
+        主機熔斷時不送出請求直接回傳 None；超時依該主機最近的 p95 延遲調整，並以 timeout 為上限
+        """
+        if not self.breakers.allow(url):
+            print(f"熔斷中，略過請求: {url}")
+            return None
+        timeout = self.breakers.timeout(url, timeout)
+        started = time.monotonic()
         try:
             if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, params=params, timeout=timeout, allow_redirects=allow_redirects)
+                response = self.session.get(url, headers=headers, params=params, timeout=timeout,
+                                            allow_redirects=allow_redirects, stream=stream)
             elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=json_data, data=data, timeout=timeout, allow_redirects=allow_redirects)
+                response = self.session.post(url, headers=headers, json=json_data, data=data,
+                                             timeout=timeout, allow_redirects=allow_redirects)
             else:
                 raise ValueError(f"Unsupported method: {method}")
+            self.breakers.record(url, response.status_code, time.monotonic() - started)
             return response
         except Exception as e:
             print(f"Request error for {url}: {e}")
-            return None
\ No newline at end of file
+            self.breakers.record_failure(url, time.monotonic() - started)
+            return None
+
+    def get_breaker_stats(self):
+        """回傳各主機的熔斷狀態與延遲統計"""
+        return self.breakers.snapshot()
+
+    def remember_result(self, key, result):
+        """保存非條件式請求上次成功的結果，熔斷時作為備援"""
+        with self._validator_lock:
+            self._last_results[key] = result
+
+    def circuit_fallback(self, key, url):
+        """主機熔斷時回傳上次成功的結果，否則回傳 None"""
+        if not self.breakers.is_open(url):
+            return None
+        result = self.last_result(key)
+        if result is not None:
+            print(f"熔斷中，使用上次成功的結果: {key}")
+        return result
+
+    def get_connection_stats(self):
+        """回傳連線重用統計"""
+        return connection_stats.snapshot()
+
+    def conditional_headers(self, key, headers=None):
+        """加上上次回應的 ETag / Last-Modified 驗證標頭"""
+        request_headers = dict(headers or {})
+        with self._validator_lock:
+            entry = self._validators.get(key)
+        if entry:
+            if entry['etag']:
+                request_headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request_headers['If-Modified-Since'] = entry['last_modified']
+        return request_headers
+
+    def resolve_conditional(self, key, status_code, response_headers, content, parse):
+        """304 或內容雜湊未變時重用上次解析結果，否則重新解析並保存驗證資訊；無法使用時回傳 None"""
+        with self._validator_lock:
+            entry = self._validators.get(key)
+        self.count_conditional(key, requests=1)
+
+        if status_code == 304 and entry:
+            self.count_conditional(key, not_modified=1, parses_avoided=1, bytes_saved=entry['size'])
+            return entry['result']
+        if status_code != 200:
+            return None
+
+        content_hash = hashlib.sha1(content).hexdigest()
+        if entry and entry['content_hash'] == content_hash:
+            result = entry['result']
+            self.count_conditional(key, unchanged=1, parses_avoided=1)
+        else:
+            result = parse(content)
+            self.count_conditional(key, parses=1)
+
+        self.count_conditional(key, bytes_downloaded=len(content))
+        self.store_conditional(key, response_headers, result, len(content), content_hash)
+        return result
+
+    def count_conditional(self, key, **counts):
+        """累加條件式請求的統計"""
+        with self._validator_lock:
+            stats = self._conditional_stats.setdefault(key, {
+                'requests': 0, 'not_modified': 0, 'unchanged': 0, 'parses': 0,
+                'parses_avoided': 0, 'bytes_downloaded': 0, 'bytes_saved': 0
+            })
+            for name, value in counts.items():
+                stats[name] = stats.get(name, 0) + value
+
+    def store_conditional(self, key, response_headers, result, size, content_hash=None,
+                          complete=True):
+        """保存驗證資訊與解析結果；complete 為 False 表示只讀取了回應的前半段（例如串流解析提早停止）"""
+        with self._validator_lock:
+            self._validators[key] = {
+                'etag': response_headers.get('ETag'),
+                'last_modified': response_headers.get('Last-Modified'),
+                'content_hash': content_hash,
+                'size': size,
+                'result': result,
+                'complete': complete,
+            }
+
+    def _conditional_get(self, key, url, parse, headers=None, params=None, timeout=REQUEST_TIMEOUT):
+        """條件式 GET：內容未變時不重新解析，parse 接收回應的原始位元組"""
+        response = self._make_request(url, headers=self.conditional_headers(key, headers),
+                                      params=params, timeout=timeout)
+        if response is None:
+            return self.circuit_fallback(key, url)
+        result = self.resolve_conditional(key, response.status_code, response.headers,
+                                          response.content, parse)
+        if result is None:
+            return self.circuit_fallback(key, url)
+        return result
+
+    def last_result(self, key):
+        """回傳上次條件式請求的解析結果，尚未請求過時回傳 None"""
+        with self._validator_lock:
+            entry = self._validators.get(key)
+            return entry['result'] if entry else self._last_results.get(key)
+
+    def get_conditional_stats(self):
+        """回傳各來源的 304 次數、省下的位元組與避免的解析次數"""
+        with self._validator_lock:
+            return {key: dict(stats) for key, stats in self._conditional_stats.items()}
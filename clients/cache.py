@@ -0,0 +1,259 @@
+"""
+文章摘要緩存
+提供記憶體 LRU、SQLite 與 Redis 三種後端，使用穩定的網址雜湊作為鍵
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# 常量定義
+DEFAULT_TTL = 3600  # 1小時緩存
+NEGATIVE_TTL = 120  # 失敗結果（只有標題和連結）只緩存2分鐘
+MAX_ENTRIES = 500
+MAX_BYTES = 16 * 1024 * 1024  # 記憶體緩存最多16MB
+CACHE_PATH = 'article_cache.db'
+REDIS_URL = 'redis://localhost:6379/0'
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+
+
+def normalize_url(url):
+    """正規化網址：小寫主機名稱、移除片段與追蹤參數、排序查詢參數"""
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+
+def cache_key(url):
+    """以正規化網址的 SHA-1 作為跨行程穩定的緩存鍵"""
+    return 'article:' + hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False)
+
+
+class CacheStats:
+    """命中、未命中與淘汰次數統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'sets': 0}
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class MemoryCache:
+    """帶 TTL 與位元組上限的記憶體 LRU 緩存"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # key -> (過期時間, 大小, 值)
+        self._bytes = 0
+        self._stats = CacheStats()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._stats.incr('misses')
+                return None
+            expires_at, size, value = item
+            if expires_at <= time.time():
+                del self._items[key]
+                self._bytes -= size
+                self._stats.incr('expirations')
+                self._stats.incr('misses')
+                return None
+            self._items.move_to_end(key)
+            self._stats.incr('hits')
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = len(_encode(value).encode('utf-8'))
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            ttl = ttl if ttl is not None else self.default_ttl
+            self._items[key] = (time.time() + ttl, size, value)
+            self._bytes += size
+            self._stats.incr('sets')
+            while self._items and (len(self._items) > self.max_entries
+                                   or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item:
+                self._bytes -= item[1]
+
+    def dump(self):
+        """回傳尚未過期的 (key, 過期時間, 值)，由最久未使用到最近使用排列，供寫入啟動快照"""
+        now = time.time()
+        with self._lock:
+            return [
+                (key, expires_at, value) for key, (expires_at, _, value) in self._items.items()
+                if expires_at > now
+            ]
+
+    def load(self, entries):
+        """載入快照中尚未過期的項目並保留原本的過期時間，回傳載入筆數"""
+        now = time.time()
+        loaded = 0
+        for key, expires_at, value in entries:
+            if expires_at > now:
+                self.set(key, value, ttl=expires_at - now)
+                loaded += 1
+        return loaded
+
+    def stats(self):
+        stats = self._stats.snapshot()
+        with self._lock:
+            stats.update(backend='memory', entries=len(self._items), bytes=self._bytes)
+        return stats
+
+
+class SQLiteCache:
+    """保存在本地 SQLite 檔案的緩存，服務重啟後仍可使用"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES * 4, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS article_cache "
+            "(key TEXT PRIMARY KEY, expires_at REAL, accessed_at REAL, value TEXT)"
+        )
+        self._conn.commit()
+        self._stats = CacheStats()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM article_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats.incr('misses')
+                return None
+            if row[0] <= now:
+                self._conn.execute("DELETE FROM article_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._stats.incr('expirations')
+                self._stats.incr('misses')
+                return None
+            self._conn.execute("UPDATE article_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        self._stats.incr('hits')
+        return json.loads(row[1])
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO article_cache (key, expires_at, accessed_at, value) "
+                "VALUES (?, ?, ?, ?)",
+                (key, now + (ttl if ttl is not None else self.default_ttl), now, _encode(value))
+            )
+            # 先清除過期項目，仍超過上限時淘汰最久未使用的項目
+            expired = self._conn.execute(
+                "DELETE FROM article_cache WHERE expires_at <= ?", (now,)
+            ).rowcount
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM article_cache").fetchone()
+            evicted = 0
+            if count > self.max_entries:
+                evicted = self._conn.execute(
+                    "DELETE FROM article_cache WHERE key IN "
+                    "(SELECT key FROM article_cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        self._stats.incr('sets')
+        self._stats.incr('expirations', expired)
+        self._stats.incr('evictions', evicted)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM article_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def stats(self):
+        stats = self._stats.snapshot()
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM article_cache").fetchone()
+        stats.update(backend='sqlite', entries=count)
+        return stats
+
+
+class RedisCache:
+    """Redis 相容的緩存後端，可供多個 gunicorn worker 與實例共用（需安裝 redis 套件）"""
+
+    def __init__(self, url=REDIS_URL, default_ttl=DEFAULT_TTL):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("RedisCache requires the 'redis' package: pip install redis")
+        self.default_ttl = default_ttl
+        self._client = redis.Redis.from_url(url)
+        self._stats = CacheStats()
+
+    def get(self, key):
+        raw = self._client.get(key)
+        if raw is None:
+            self._stats.incr('misses')
+            return None
+        self._stats.incr('hits')
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        # 淘汰交由 Redis 的 maxmemory-policy 處理；Redis 不接受 0 的過期時間，已過期的項目直接刪除
+        ttl = ttl if ttl is not None else self.default_ttl
+        if ttl <= 0:
+            self._client.delete(key)
+            return
+        self._client.set(key, _encode(value), px=max(1, int(ttl * 1000)))
+        self._stats.incr('sets')
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def stats(self):
+        stats = self._stats.snapshot()
+        stats['backend'] = 'redis'
+        return stats
+
+
+def create_cache(backend='memory', path=CACHE_PATH, redis_url=REDIS_URL, default_ttl=DEFAULT_TTL):
+    """依設定建立緩存後端"""
+    if backend == 'memory':
+        return MemoryCache(default_ttl=default_ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path=path, default_ttl=default_ttl)
+    if backend == 'redis':
+        return RedisCache(url=redis_url, default_ttl=default_ttl)
+    raise ValueError(f"Unsupported cache backend: {backend}")
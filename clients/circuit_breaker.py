@@ -0,0 +1,188 @@
+"""
+每主機熔斷器與自適應超時
+以滾動視窗統計各上游主機的延遲與錯誤率，連續失敗時開啟熔斷直接略過請求，並依觀察到的 p95 延遲決定超時
+"""
+
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# 常量定義
+WINDOW_SIZE = 50  # 每個主機保留最近50次請求的延遲與結果
+FAILURE_THRESHOLD = 3  # 連續失敗3次即開啟熔斷（NVIDIA 每次查詢有3個關鍵字搜尋）
+ERROR_RATE_THRESHOLD = 0.5  # 視窗內錯誤率達50%也開啟熔斷
+MIN_SAMPLES = 10  # 計算錯誤率前至少需要的請求數
+OPEN_SECONDS = 30  # 開啟後30秒進入半開狀態，放行一個探測請求
+MIN_TIMEOUT = 2.0
+TIMEOUT_MULTIPLIER = 2.0  # 超時 = p95 延遲 × 2，並以來源設定的超時為上限
+TIMEOUT_MIN_SAMPLES = 5  # 成功請求不足5次時使用設定的固定超時
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+FAILURE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """熔斷器開啟時拒絕請求"""
+
+
+def percentile(values, p):
+    """回傳已排序數列的第 p 百分位數，空數列回傳 None"""
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class HostBreaker:
+    """單一主機的熔斷器，記錄滾動延遲與錯誤統計"""
+
+    def __init__(self, host, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=WINDOW_SIZE)  # 成功請求的延遲
+        self._outcomes = deque(maxlen=WINDOW_SIZE)  # True 為成功
+        self._histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._state = CLOSED
+        self._opened_at = 0
+        self._probing = False
+        self._consecutive_failures = 0
+        self._stats = {'requests': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        """回傳是否放行請求；開啟期滿後只放行一個探測請求"""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self._state != CLOSED
+
+    def record_success(self, latency):
+        with self._lock:
+            self._record(True, latency)
+            self._consecutive_failures = 0
+            self._latencies.append(latency)
+            if self._state != CLOSED:
+                print(f"熔斷器關閉: {self.host}")
+            self._state = CLOSED
+            self._probing = False
+
+    def record_failure(self, latency=None):
+        with self._lock:
+            self._record(False, latency)
+            self._stats['failures'] += 1
+            self._consecutive_failures += 1
+            failures = self._outcomes.count(False)
+            error_rate_exceeded = (
+                len(self._outcomes) >= MIN_SAMPLES
+                and failures / len(self._outcomes) >= ERROR_RATE_THRESHOLD
+            )
+            if (self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold
+                    or error_rate_exceeded):
+                if self._state != OPEN:
+                    self._stats['opened'] += 1
+                    print(f"熔斷器開啟 {self.open_seconds} 秒: {self.host}"
+                          f"（連續失敗 {self._consecutive_failures} 次）")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def _record(self, success, latency):
+        """呼叫端需持有鎖"""
+        self._stats['requests'] += 1
+        self._outcomes.append(success)
+        if latency is not None:
+            bucket = next(
+                (i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+                len(LATENCY_BUCKETS)
+            )
+            self._histogram[bucket] += 1
+
+    def timeout(self, default):
+        """以最近成功請求的 p95 延遲推算超時，介於 MIN_TIMEOUT 與 default 之間"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < TIMEOUT_MIN_SAMPLES:
+            return default
+        return min(default, max(MIN_TIMEOUT, percentile(latencies, 95) * TIMEOUT_MULTIPLIER))
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._stats)
+            outcomes = len(self._outcomes)
+            stats.update(
+                state=self._state,
+                consecutive_failures=self._consecutive_failures,
+                error_rate=self._outcomes.count(False) / outcomes if outcomes else 0.0,
+                histogram={
+                    **{f"le_{bound}": count
+                       for bound, count in zip(LATENCY_BUCKETS, self._histogram)},
+                    'le_inf': self._histogram[-1],
+                },
+            )
+        stats.update(p50=percentile(latencies, 50), p95=percentile(latencies, 95),
+                     p99=percentile(latencies, 99))
+        return stats
+
+
+class CircuitBreakerRegistry:
+    """依網址主機取得對應的熔斷器"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, open_seconds=OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = HostBreaker(host, self.failure_threshold, self.open_seconds)
+                self._breakers[host] = breaker
+        return breaker
+
+    def allow(self, url):
+        return self.get(url).allow()
+
+    def is_open(self, url):
+        return self.get(url).is_open()
+
+    def record(self, url, status_code, latency):
+        """依狀態碼記錄結果：429 與 5xx 視為主機失敗，其他回應（含 404）都代表主機正常"""
+        if status_code in FAILURE_STATUS_CODES:
+            self.get(url).record_failure(latency)
+        else:
+            self.get(url).record_success(latency)
+
+    def record_failure(self, url, latency=None):
+        self.get(url).record_failure(latency)
+
+    def timeout(self, url, default):
+        return self.get(url).timeout(default)
+
+    def snapshot(self):
+        """回傳各主機的熔斷狀態、錯誤率、延遲百分位數與直方圖"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host: breaker.snapshot() for host, breaker in breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,127 @@
+"""
+多關鍵字比對
+每組關鍵字只編譯一次，以前綴樹合併的單一正規表示式掃描標題/摘要，支援全形半形與大小寫正規化及短英文詞的字界判斷
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+# 常量定義
+SHORT_TERM_MAX = 3  # 不超過3個字元的英數關鍵字（如 ai、gpu、pc）需符合字界
+MATCHER_CACHE_SIZE = 256
+NORMALIZE_CACHE_SIZE = 4096
+WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789')  # 只有英數字算字內字元，中文字與標點都視為字界
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_text(text):
+    """NFKC 正規化（全形轉半形）並轉為小寫；同一標題會在各來源篩選與新聞池選取時重複比對，因此緩存結果"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def _is_short_term(keyword):
+    return len(keyword) <= SHORT_TERM_MAX and keyword.isascii() and keyword.isalnum()
+
+
+def _trie_pattern(terms):
+    """把關鍵字合併成前綴樹形式的正規表示式，讓 re 以首字元集合快速跳過不可能命中的位置"""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}  # 詞尾標記
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if '' in node else group
+
+    return build(trie)
+
+
+def _at_boundary(text, start, end):
+    """短英文詞前後不能接英數字，允許複數 s（gpus）"""
+    if start > 0 and text[start - 1] in WORD_CHARS:
+        return False
+    if end < len(text) and text[end] == 's':
+        end += 1
+    return end >= len(text) or text[end] not in WORD_CHARS
+
+
+class KeywordMatcher:
+    """編譯後的關鍵字比對器，一次掃描即可找出所有命中的關鍵字"""
+
+    def __init__(self, keywords):
+        self._terms = {}  # 正規化關鍵字 -> 原始關鍵字
+        for keyword in keywords:
+            term = normalize_text(keyword.strip())
+            if term and term not in self._terms:
+                self._terms[term] = keyword
+        self.keywords = list(self._terms.values())
+        self._short_terms = {term for term in self._terms if _is_short_term(term)}
+        self._pattern = re.compile(_trie_pattern(self._terms)) if self._terms else None
+        # 前綴樹在同一位置只會回報最長的詞，因此預先記下較長關鍵字內含的較短關鍵字（例如「ai pc」內含「ai」）
+        self._implied = {
+            term: {other for other in self._terms if other != term and self._contains(term, other)}
+            for term in self._terms
+        }
+
+    def _contains(self, text, term):
+        start = text.find(term)
+        while start != -1:
+            if term not in self._short_terms or _at_boundary(text, start, start + len(term)):
+                return True
+            start = text.find(term, start + 1)
+        return False
+
+    def _scan(self, text):
+        """依序產出文字中命中的關鍵字，略過不符合字界的短英文詞"""
+        pos = 0
+        while True:
+            match = self._pattern.search(text, pos)
+            if match is None:
+                return
+            term = match.group()
+            if term in self._short_terms and not _at_boundary(text, match.start(), match.end()):
+                pos = match.start() + 1
+                continue
+            yield term
+            pos = match.end()
+
+    def matches(self, *texts):
+        """任一文字包含任一關鍵字即回傳 True，找到第一個命中就停止"""
+        if self._pattern is None:
+            return False
+        for text in texts:
+            if text:
+                for _ in self._scan(normalize_text(text)):
+                    return True
+        return False
+
+    def find(self, *texts):
+        """回傳命中的原始關鍵字，依關鍵字輸入順序排列，供排序計分使用"""
+        if self._pattern is None:
+            return []
+        hits = set()
+        for text in texts:
+            if text:
+                for term in self._scan(normalize_text(text)):
+                    hits.add(term)
+                    hits.update(self._implied[term])
+        return [keyword for term, keyword in self._terms.items() if term in hits]
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _compile(keywords):
+    return KeywordMatcher(keywords)
+
+
+def get_matcher(keywords):
+    """取得關鍵字組合對應的比對器，相同組合只編譯一次"""
+    return _compile(tuple(keywords or ()))
@@ -0,0 +1,287 @@
+"""
+熱路徑指標
+記錄各階段耗時（來源抓取、feed 解析、文章下載、newspaper 解析、摘要、LINE 推播）的直方圖與計數器，
+以 Prometheus 文字格式輸出，並可選擇把每次查詢的 span 寫入追蹤日誌；停用時 span 只是共用的空物件
+"""
+
+import bisect
+import contextvars
+import json
+import threading
+import time
+import uuid
+
+# 常量定義
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRIC_PREFIX = 'newsbot_'
+STAGE_METRIC = 'stage_seconds'
+HELP_TEXT = {
+    'stage_seconds': '各處理階段耗時（秒）',
+    'stage_errors_total': '各處理階段拋出例外的次數',
+    'executor_queued': '已提交但尚未開始執行的執行緒池工作數',
+}
+
+_current_trace = contextvars.ContextVar('newsbot_trace', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _NoopSpan:
+    """指標停用時共用的 span，不做任何事"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'labels', 'started')
+
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record(self.stage, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc('stage_errors_total', stage=self.stage)
+        return False
+
+
+class Trace:
+    """單次查詢的追蹤紀錄，收集所有執行緒中屬於這次查詢的 span"""
+
+    def __init__(self, name, attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = attributes
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def add(self, stage, seconds, labels):
+        offset = time.perf_counter() - self._started - seconds
+        with self._lock:
+            self.spans.append({
+                'stage': stage, 'start': round(offset, 4), 'duration': round(seconds, 4),
+                'thread': threading.current_thread().name, **labels,
+            })
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span['start'])
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration': round(time.perf_counter() - self._started, 4),
+            **self.attributes,
+            'spans': spans,
+        }
+
+
+class _TraceScope:
+    """開始一次查詢的追蹤，結束時記錄整體耗時並寫入追蹤日誌"""
+
+    def __init__(self, metrics, name, attributes):
+        self.metrics = metrics
+        self.trace = Trace(name, attributes) if metrics.trace_path else None
+        self.span = _Span(metrics, name, {})
+        self._token = None
+
+    def __enter__(self):
+        if self.trace is not None:
+            self._token = _current_trace.set(self.trace)
+        self.span.__enter__()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is not None:
+            _current_trace.reset(self._token)
+        self.span.__exit__(exc_type, exc, tb)
+        if self.trace is not None:
+            self.metrics.write_trace(self.trace)
+        return False
+
+
+class Metrics:
+    """執行緒安全的直方圖、計數器與採樣時計算的量測值"""
+
+    def __init__(self, enabled=True, trace_path=None):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._trace_lock = threading.Lock()
+        self._histograms = {}  # (階段, 標籤) -> [各 bucket 計數, 總和, 次數]
+        self._counters = {}  # (名稱, 標籤) -> 值
+        self._queued = {}  # 執行緒池名稱 -> 尚未開始的工作數
+        self._collectors = {}  # 名稱 -> 採樣函式
+
+    def configure(self, enabled=True, trace_path=None):
+        self.enabled = enabled
+        self.trace_path = trace_path if enabled else None
+
+    def span(self, stage, **labels):
+        """量測 with 區塊的耗時"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, labels)
+
+    def trace(self, name, **attributes):
+        """量測整次查詢，設定 trace_path 時把其中所有 span 寫成一行 JSON"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _TraceScope(self, name, attributes)
+
+    def record(self, stage, seconds, **labels):
+        """記錄已量測好的階段耗時（例如在解析行程中量測的時間）"""
+        if not self.enabled or seconds is None:
+            return
+        key = (stage, tuple(sorted(labels.items())))
+        bucket = bisect.bisect_left(STAGE_BUCKETS, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(STAGE_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds, labels)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def bind(self, fn):
+        """讓在其他執行緒執行的函式沿用目前查詢的追蹤"""
+        if not self.enabled or _current_trace.get() is None:
+            return fn
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def submit(self, executor, fn, *args, pool):
+        """提交工作到執行緒池，統計尚未開始執行的工作數（被取消的工作也會扣除）"""
+        if not self.enabled:
+            return executor.submit(fn, *args)
+        fn = self.bind(fn)
+        with self._lock:
+            self._queued[pool] = self._queued.get(pool, 0) + 1
+
+        def run():
+            with self._lock:
+                self._queued[pool] -= 1
+            return fn(*args)
+
+        def on_done(future):
+            if future.cancelled():
+                with self._lock:
+                    self._queued[pool] -= 1
+
+        future = executor.submit(run)
+        future.add_done_callback(on_done)
+        return future
+
+    def register_collector(self, name, collector):
+        """登記在輸出 /metrics 時才計算的量測值，collector 回傳 [(名稱, 標籤 dict, 值)]；同名登記會取代舊的"""
+        self._collectors[name] = collector
+
+    def write_trace(self, trace):
+        try:
+            line = json.dumps(trace.to_dict(), ensure_ascii=False)
+            with self._trace_lock:
+                with open(self.trace_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+        except (OSError, TypeError, ValueError) as e:
+            print(f"無法寫入追蹤日誌 {self.trace_path}: {e}")
+
+    def snapshot(self):
+        """回傳各階段的次數與平均耗時，供除錯使用"""
+        with self._lock:
+            histograms = {
+                key: (histogram[1], histogram[2]) for key, histogram in self._histograms.items()
+            }
+        return {
+            stage + _format_labels(labels): {
+                'count': count, 'mean': total / count if count else 0.0
+            }
+            for (stage, labels), (total, count) in histograms.items()
+        }
+
+    def render(self):
+        """以 Prometheus 文字格式輸出所有指標"""
+        lines = []
+        with self._lock:
+            histograms = {
+                key: ([*histogram[0]], histogram[1], histogram[2])
+                for key, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+            queued = dict(self._queued)
+
+        name = METRIC_PREFIX + STAGE_METRIC
+        lines.append(f"# HELP {name} {HELP_TEXT[STAGE_METRIC]}")
+        lines.append(f"# TYPE {name} histogram")
+        for (stage, labels), (buckets, total, count) in sorted(histograms.items()):
+            base = (('stage', stage),) + labels
+            cumulative = 0
+            for bound, bucket_count in zip(STAGE_BUCKETS + (float('inf'),), buckets):
+                cumulative += bucket_count
+                labels_text = _format_labels(base + (('le', _format_value(bound)),))
+                lines.append(f"{name}_bucket{labels_text} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(base)} {total!r}")
+            lines.append(f"{name}_count{_format_labels(base)} {count}")
+
+        samples = {}
+        for (metric, labels), value in counters.items():
+            samples.setdefault(metric, []).append((labels, value))
+        for pool, value in queued.items():
+            samples.setdefault('executor_queued', []).append(((('pool', pool),), value))
+        for collector in list(self._collectors.values()):
+            try:
+                for metric, labels, value in collector():
+                    samples.setdefault(metric, []).append((tuple(sorted(labels.items())), value))
+            except Exception as e:
+                print(f"指標收集失敗: {e}")
+
+        for metric in sorted(samples):
+            name = METRIC_PREFIX + metric
+            if metric in HELP_TEXT:
+                lines.append(f"# HELP {name} {HELP_TEXT[metric]}")
+            lines.append(f"# TYPE {name} {'counter' if metric.endswith('_total') else 'gauge'}")
+            for labels, value in sorted(samples[metric]):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
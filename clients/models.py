@@ -0,0 +1,70 @@
+"""
+新聞資料模型
+來源客戶端、處理器與緩存之間傳遞結構化紀錄，只在 news_bot.py 才轉成 LINE 文字
+"""
+
+import calendar
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value, default_tz=timezone.utc):
+    """把 RSS struct_time、毫秒時間戳或 ISO 8601 字串轉為 UTC epoch 秒數，無法解析時回傳 None
+
+    不含時區的 ISO 8601 字串以 default_tz 解讀
+    """
+    if value is None or value == '':
+        return None
+    try:
+        if hasattr(value, 'tm_year'):
+            return float(calendar.timegm(value))
+        if isinstance(value, (int, float)):
+            # Coveo 的 @amd_release_date 是毫秒
+            return value / 1000.0 if value > 1e11 else float(value)
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=default_tz)
+        return parsed.timestamp()
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class NewsItem:
+    """單則新聞紀錄，summary 為 None 表示尚未（或無法）生成摘要"""
+
+    __slots__ = ('title', 'url', 'source', 'published', 'summary', 'resolved_url', 'timings')
+
+    def __init__(self, title, url, source, published=None, summary=None, resolved_url=None,
+                 timings=None):
+        self.title = title
+        self.url = url
+        self.source = source
+        self.published = published  # UTC epoch 秒數
+        self.summary = summary
+        self.resolved_url = resolved_url  # 轉址後的實際網址
+        self.timings = timings  # 下載/解析/摘要耗時
+
+    @property
+    def link(self):
+        """顯示給使用者的連結"""
+        return self.resolved_url or self.url
+
+    def with_summary(self, summary, resolved_url=None, timings=None):
+        """回傳帶摘要的新紀錄，不修改來源客戶端持有的原始紀錄"""
+        return NewsItem(self.title, self.url, self.source, self.published, summary, resolved_url,
+                        timings)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def __eq__(self, other):
+        return isinstance(other, NewsItem) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash((self.url, self.source))
+
+    def __repr__(self):
+        return f"NewsItem(title={self.title!r}, url={self.url!r}, source={self.source!r})"
@@ -1,61 +1,229 @@
+import json
 import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from .base_client import BaseAPIClient
+from .metrics import metrics
+from .models import NewsItem, parse_timestamp
+from .sources import Source
 
 # 常量定義
 FULL_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
 REQUEST_TIMEOUT = 15
+API_URL = 'https://blogs.nvidia.com.tw/wp-json/wp/v2/posts'
+SEARCH_KEYWORDS = ['GPU', 'AI', '顯卡']
+MAX_SEARCH_KEYWORDS = 5
+MAX_SEARCH_WORKERS = 5
+MAX_PAGES = 1  # 一般查詢只需要最新的一頁
+INCREMENTAL_MAX_PAGES = 5
+FULL_REFRESH_INTERVAL = 3600  # 增量更新最多持續1小時，之後重新完整搜尋一次，讓已刪除的文章消失
+MAX_TRACKED_QUERIES = 64
+SITE_UTC_OFFSET = 8  # 沒有 date_gmt 時，date 以部落格所在時區（台灣）解讀
+POST_FIELDS = 'link,title,date,date_gmt'  # 只要求解析會用到的欄位
+HEADERS = {
+    'accept': 'application/json, text/plain, */*',
+    'accept-language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
+    'origin': 'https://www.nvidia.com',
+    'referer': 'https://www.nvidia.com/',
+    'user-agent': FULL_USER_AGENT
+}
+DEFAULT_SOURCE = Source('NVIDIA', 'wordpress', API_URL, timeout=REQUEST_TIMEOUT,
+                        options={'keywords': SEARCH_KEYWORDS})
 
 class NvidiaAPIClient(BaseAPIClient):
     """NVIDIA API 客戶端"""
 
-    def get_news(self):
-        """獲取 NVIDIA 新聞"""
+    def __init__(self, session=None, breakers=None):
+        super().__init__(session=session, breakers=breakers)
+        self._queries = OrderedDict()  # 查詢鍵 -> 最新發布時間、上次的結果與完整搜尋時間，依最近使用排序
+        self._queries_lock = threading.Lock()
+
+    def get_news(self, source=None, keywords=None, after=None):
+        """獲取 NVIDIA 新聞，source 為 WordPress 來源設定（預設 DEFAULT_SOURCE）
+
+        keywords 為呼叫端的查詢關鍵字（預設使用來源設定的關鍵字），各關鍵字並發搜尋後合併、去重並依日期排序；
+        同一組關鍵字再次呼叫時只搜尋上次最新發布時間之後的文章，並與上次的結果合併。
+        after 為 epoch 秒數時只取該時間之後發布的文章，並翻頁取回所有新文章
+        """
+        source = source or DEFAULT_SOURCE
         articles = []
-        keywords = ['GPU', 'AI', '顯卡']
-        all_posts = []
-        seen_urls = set()
 
         try:
-            api_url = 'https://blogs.nvidia.com.tw/wp-json/wp/v2/posts'
-            headers = {
-                'accept': 'application/json, text/plain, */*',
-                'accept-language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-                'origin': 'https://www.nvidia.com',
-                'referer': 'https://www.nvidia.com/',
-                'user-agent': FULL_USER_AGENT
-            }
-
-            for keyword in keywords:
-                try:
-                    params = {
-                        '_embed': 'true',
-                        'per_page': 5,
-                        'page': 1,
-                        'search': keyword
-                    }
-
-                    response = self._make_request(api_url, method='GET', headers=headers, params=params, timeout=REQUEST_TIMEOUT)
-
-                    if response and response.status_code == 200:
-                        posts = response.json()
-
-                        for post in posts:
-                            link = post.get('link', '')
-                            if link and link not in seen_urls:
-                                seen_urls.add(link)
-                                title = post.get('title', {}).get('rendered', '').strip()
-                                if title:
-                                    title = re.sub('<.*?>', '', title)
-                                    all_posts.append({'title': title, 'url': link, 'source': 'NVIDIA', 'date': post.get('date', '')})
-                except Exception as e:
-                    print(f"Error searching NVIDIA with keyword '{keyword}': {e}")
-                    continue
-
-            if all_posts:
-                all_posts.sort(key=lambda x: x.get('date', ''), reverse=True)
-                articles = [{'title': p['title'], 'url': p['url'], 'source': p['source']} for p in all_posts[:5]]
+            key = None
+            if after is None:
+                key, after = self.search_state(source, keywords)
+            search_keywords = self.search_keywords(source, keywords)
+            if len(search_keywords) <= 1:
+                results = [
+                    self._search_or_log(source, keyword, after) for keyword in search_keywords
+                ]
+            else:
+                from concurrent.futures import ThreadPoolExecutor
+                workers = min(MAX_SEARCH_WORKERS, source.host_limit, len(search_keywords))
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        metrics.submit(executor, self._search_or_log, source, keyword, after,
+                                       pool='searches')
+                        for keyword in search_keywords
+                    ]
+                    results = [future.result() for future in futures]
+            articles = self.merge_results(results, source, keep_all=after is not None)
+            if key is not None:
+                articles = self.finish_search(key, source, articles, incremental=after is not None)
+
+        except Exception as e:
+            print(f"Error fetching {source.name} news: {e}")
+
+        return articles
 
+    def _search_or_log(self, source, keyword, after):
+        try:
+            return self.search(source, keyword, after)
         except Exception as e:
-            print(f"Error fetching NVIDIA news: {e}")
+            print(f"Error searching {source.name} with keyword '{keyword}': {e}")
+            return []
+
+    def search(self, source, keyword, after=None):
+        """搜尋單一關鍵字，回傳原始文章列表；結果填滿一頁時繼續翻頁，最多 max_pages 頁"""
+        posts = []
+        for page in range(1, self.max_pages(source, after) + 1):
+            params = self.build_search_params(keyword, source, page, after)
+            key = self.conditional_key(source, keyword, page, after)
+            if key is not None:
+                # 條件式請求：搜尋結果未變時重用上次解析的 JSON
+                page_posts = self._conditional_get(key, source.url, json.loads, headers=HEADERS,
+                                                   params=params, timeout=source.timeout)
+            else:
+                # 超過最後一頁時 WordPress 回應 400，與其他錯誤一樣直接停止翻頁
+                response = self._make_request(source.url, headers=HEADERS, params=params,
+                                              timeout=source.timeout)
+                page_posts = None
+                if response is not None and response.status_code == 200:
+                    page_posts = response.json()
+            if not page_posts:
+                break
+            posts.extend(page_posts)
+            if len(page_posts) < source.max_entries:
+                break
+        return posts
+
+    def search_keywords(self, source=None, keywords=None):
+        """實際送出的搜尋關鍵字：呼叫端的關鍵字（忽略大小寫去重，最多 MAX_SEARCH_KEYWORDS 個），沒有時使用來源設定"""
+        if not keywords:
+            return (source or DEFAULT_SOURCE).options.get('keywords', SEARCH_KEYWORDS)
+        unique = {}
+        for keyword in keywords:
+            keyword = keyword.strip()
+            if keyword:
+                unique.setdefault(keyword.casefold(), keyword)
+        return list(unique.values())[:MAX_SEARCH_KEYWORDS]
+
+    def max_pages(self, source=None, after=None):
+        """單一關鍵字最多翻幾頁：增量更新時 INCREMENTAL_MAX_PAGES，否則來源設定的 max_pages"""
+        source = source or DEFAULT_SOURCE
+        if after is not None:
+            return source.options.get('incremental_max_pages', INCREMENTAL_MAX_PAGES)
+        return source.options.get('max_pages', MAX_PAGES)
+
+    def conditional_key(self, source, keyword, page=1, after=None):
+        """條件式請求的驗證資訊以來源與關鍵字區分；只保存來源設定關鍵字的第一頁，
+        使用者任意輸入的關鍵字、翻頁與增量請求回傳 None，避免驗證資訊無限增長
+        """
+        if page != 1 or after is not None:
+            return None
+        configured = self.search_keywords(source)
+        match = next((name for name in configured if name.casefold() == keyword.casefold()), None)
+        return f"{source.name}:{match}" if match is not None else None
+
+    def build_search_params(self, keyword, source=None, page=1, after=None):
+        """組合單一關鍵字的 WordPress 搜尋參數：只要求需要的欄位，不使用 _embed；
+        after 為 epoch 秒數時只搜尋之後發布的文章
+        """
+        params = {
+            '_fields': POST_FIELDS,
+            'per_page': (source or DEFAULT_SOURCE).max_entries,
+            'page': page,
+            'search': keyword,
+            'orderby': 'date',
+            'order': 'desc',
+        }
+        if after is not None:
+            params['after'] = datetime.fromtimestamp(after, timezone.utc).strftime(
+                '%Y-%m-%dT%H:%M:%SZ'
+            )
+        return params
+
+    def parse_posts(self, posts, seen_urls, source=None):
+        """解析 WordPress 文章列表，略過已出現過的連結"""
+        source = source or DEFAULT_SOURCE
+        site_timezone = timezone(timedelta(hours=source.options.get('utc_offset', SITE_UTC_OFFSET)))
+        parsed = []
+        for post in posts:
+            link = post.get('link', '')
+            if link and link not in seen_urls:
+                seen_urls.add(link)
+                title = post.get('title', {}).get('rendered', '').strip()
+                if title:
+                    title = re.sub('<.*?>', '', title)
+                    if post.get('date_gmt'):
+                        published = parse_timestamp(post['date_gmt'])
+                    else:
+                        # date 是部落格當地時間且不含時區，不能當成 UTC
+                        published = parse_timestamp(post.get('date'), default_tz=site_timezone)
+                    parsed.append(NewsItem(title, link, source.name, published=published))
+        return parsed
+
+    def merge_posts(self, all_posts, source=None, keep_all=False):
+        """依日期排序並取最新的 source.max_entries 則，keep_all 時回傳全部（增量更新）"""
+        all_posts = sorted(all_posts, key=lambda post: post.published or 0, reverse=True)
+        return all_posts if keep_all else all_posts[:(source or DEFAULT_SOURCE).max_entries]
+
+    def merge_results(self, results, source=None, keep_all=False):
+        """合併各關鍵字的原始搜尋結果：依連結去重後依日期排序"""
+        seen_urls = set()
+        all_posts = []
+        for posts in results:
+            all_posts.extend(self.parse_posts(posts or [], seen_urls, source))
+        return self.merge_posts(all_posts, source, keep_all)
+
+    def search_state(self, source, keywords=None):
+        """回傳 (查詢鍵, after)：同一組關鍵字在 FULL_REFRESH_INTERVAL 內只搜尋上次最新發布時間之後的文章"""
+        terms = sorted({keyword.casefold() for keyword in self.search_keywords(source, keywords)})
+        key = f"{source.name}:{'|'.join(terms)}"
+        with self._queries_lock:
+            state = self._queries.get(key)
+            if state is None or time.time() - state['full_at'] >= FULL_REFRESH_INTERVAL:
+                return key, None
+            self._queries.move_to_end(key)
+            return key, state['newest']
 
-        return articles
\ No newline at end of file
+    def finish_search(self, key, source, found, incremental):
+        """合併這次與上次的結果並記住最新的發布時間；請求失敗而沒有結果時使用上次的結果"""
+        with self._queries_lock:
+            state = self._queries.get(key)
+            previous = state['articles'] if state else []
+            articles = found + previous if incremental or not found else found
+            seen_urls = set()
+            merged = []
+            for article in self.merge_posts(articles, source, keep_all=True):
+                if article.url not in seen_urls:
+                    seen_urls.add(article.url)
+                    merged.append(article)
+            merged = merged[:source.max_entries]
+            if merged:
+                if found and not incremental:
+                    full_at = time.time()
+                else:
+                    full_at = state['full_at'] if state else 0
+                newest = max((article.published or 0 for article in merged), default=0)
+                self._queries[key] = {
+                    'articles': merged,
+                    'newest': newest or None,
+                    'full_at': full_at,
+                }
+                self._queries.move_to_end(key)
+                while len(self._queries) > MAX_TRACKED_QUERIES:
+                    self._queries.popitem(last=False)
+        return merged
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+解析/摘要行程池
+I/O 留在執行緒或事件迴圈，newspaper3k 解析與摘要交給 worker 行程，避免 GIL 競爭
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from .summarizers import get_summarizer
+
+# 常量定義
+PARSE_TIMEOUT = 20
+# 使用 fork 讓 worker 直接繼承已匯入的模組，也不會像 spawn 一樣重新匯入入口腳本（linebot_app.py 匯入時就會建立 app）
+START_METHOD = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_worker_summarizer = None
+
+
+def _init_worker(summarizer_name):
+    """worker 啟動時只匯入一次 newspaper/lxml/nltk 並建立摘要引擎"""
+    global _worker_summarizer
+    from .article_client import warm_up
+    _worker_summarizer = get_summarizer(summarizer_name)
+    # 先解析中英文範例 HTML，讓 lxml、newspaper 與 jieba 的延遲初始化在啟動時完成
+    warm_up(_worker_summarizer)
+
+
+def _parse_and_summarize(url, content, encoding):
+    """在 worker 行程中解析 HTML 位元組，回傳 (摘要, 解析耗時, 摘要耗時)"""
+    from .article_client import extract_summary
+    return extract_summary(url, content.decode(encoding, errors='replace'), _worker_summarizer)
+
+
+def _ping():
+    return os.getpid()
+
+
+class ParsePool:
+    """把 CPU 密集的解析與摘要交給 worker 行程執行"""
+
+    def __init__(self, workers=None, summarizer_name='textrank', timeout=PARSE_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.summarizer_name = summarizer_name
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(START_METHOD),
+            initializer=_init_worker,
+            initargs=(summarizer_name,)
+        )
+        # 建立時立即啟動所有 worker：容器在啟動背景執行緒之前建立行程池，fork 時只有主執行緒
+        self._warm_up_futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+
+    def warm_up(self, timeout=60):
+        """等待所有 worker 完成匯入與初始化，回傳耗時秒數"""
+        started = time.time()
+        wait(self._warm_up_futures, timeout=timeout)
+        elapsed = time.time() - started
+        print(f"解析行程池已預熱，{self.workers} 個 worker，耗時 {elapsed:.1f} 秒")
+        return elapsed
+
+    def parse_and_summarize(self, url, content, encoding):
+        """送出 HTML 位元組並等待摘要結果"""
+        future = self._executor.submit(_parse_and_summarize, url, content, encoding)
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
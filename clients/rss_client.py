@@ -1,38 +1,289 @@
-import feedparser
+import html
+import re
+import time
+from email.utils import parsedate_tz, mktime_tz
+from html.entities import name2codepoint
+from .metrics import metrics
 from .base_client import BaseAPIClient
+from .matcher import get_matcher
+from .models import NewsItem, parse_timestamp
 
 # 常量定義
 DEFAULT_USER_AGENT = 'Mozilla/5.0'
 RSS_TIMEOUT = 10
+FEED_CHUNK_SIZE = 16 * 1024
+ITEM_TAGS = ('item', 'entry')  # RSS 與 Atom 的項目元素（不含命名空間）
+PUBLISHED_TAGS = ('pubDate', 'published', 'date')  # date 為 dc:date
+UPDATED_TAGS = ('updated',)
+MAX_ENTITY_LENGTH = 34
+HTML_ENTITY_PATTERN = re.compile(rb'&([A-Za-z][A-Za-z0-9]{1,31});')
+XML_ENTITIES = frozenset(('amp', 'lt', 'gt', 'quot', 'apos'))
+
+
+def _numeric_entity(match):
+    """把 XML 未定義的 HTML 具名實體（例如 &nbsp;）換成數字參照，XML 解析器才能接受"""
+    name = match.group(1).decode('ascii')
+    if name in XML_ENTITIES or name not in name2codepoint:
+        return match.group(0)
+    return b'&#%d;' % name2codepoint[name]
+
+
+def parse_feed_date(value):
+    """把 RSS 的 RFC 822 日期或 Atom 的 ISO 8601 日期轉為 UTC epoch 秒數"""
+    if not value or not value.strip():
+        return None
+    parsed = parsedate_tz(value.strip())
+    if parsed is not None:
+        try:
+            return float(mktime_tz(parsed))
+        except (OverflowError, ValueError):
+            return None
+    return parse_timestamp(value.strip())
+
+
+class FeedStream:
+    """以 lxml XMLPullParser 增量解析 feed 位元組，每讀完一個 item / entry 就產生一個項目
+
+    matcher 符合的項目達到 limit 則時 feed() 回傳 True，呼叫端應停止讀取並關閉連線；
+    內容不是格式正確的 XML 時讀完整個回應，改用 fallback（feedparser）解析
+    """
+
+    def __init__(self, matcher=None, limit=None, fallback=None):
+        from lxml import etree
+
+        self.matcher = matcher
+        self.limit = limit
+        self.fallback = fallback
+        self.entries = []
+        self.matches = 0
+        self.bytes_read = 0
+        self.parse_seconds = 0.0
+        self.done = False
+        self.complete = False
+        self._syntax_error = etree.XMLSyntaxError
+        # 不使用 recover：lxml 修復錯誤後會丟掉之後所有的 &amp;，連結因此損壞
+        self._parser = etree.XMLPullParser(events=('end',), resolve_entities=False, no_network=True)
+        self._failed = False
+        self._root_closed = False
+        self._pending = b''  # 跨區塊邊界、尚未完整的實體參照
+        self._chunks = []  # 已讀取的原始位元組，供 fallback 使用
+
+    def feed(self, chunk):
+        """送入一段位元組，回傳是否已找到足夠的項目"""
+        self.bytes_read += len(chunk)
+        self._chunks.append(chunk)
+        data = self._pending + chunk
+        cut = data.rfind(b'&')
+        if cut != -1 and b';' not in data[cut:] and len(data) - cut <= MAX_ENTITY_LENGTH:
+            data, self._pending = data[:cut], data[cut:]
+        else:
+            self._pending = b''
+        self._parse(data)
+        if self._root_closed:
+            # 這一段已包含整份文件，不論是否找到足夠的項目都視為讀完
+            self.close()
+        return self.done
+
+    def close(self):
+        """讀完整個回應時呼叫，回傳所有項目"""
+        if self.complete:
+            return self.entries
+        self.complete = True
+        self._parse(self._pending, final=True)
+        if (self._failed or not self.entries) and self.fallback is not None:
+            started = time.perf_counter()
+            self.entries = self.fallback(b''.join(self._chunks))
+            self.parse_seconds += time.perf_counter() - started
+        self._chunks = []
+        return self.entries
+
+    def _parse(self, data, final=False):
+        if self._failed:
+            return
+        started = time.perf_counter()
+        try:
+            if data:
+                self._parser.feed(HTML_ENTITY_PATTERN.sub(_numeric_entity, data))
+            if final:
+                self._parser.close()
+            self._collect()
+        except self._syntax_error:
+            self._failed = True
+        self.parse_seconds += time.perf_counter() - started
+
+    def _collect(self):
+        for _, element in self._parser.read_events():
+            if element.getparent() is None:
+                self._root_closed = True
+            if not isinstance(element.tag, str) or element.tag.rsplit('}', 1)[-1] not in ITEM_TAGS:
+                continue
+            entry = self._entry(element)
+            # 釋放已處理的元素，記憶體用量不隨 feed 大小增長
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+            if entry is None:
+                continue
+            self.entries.append(entry)
+            if self.matcher is None or self.matcher.matches(entry['title']):
+                self.matches += 1
+                if self.limit is not None and self.matches >= self.limit:
+                    self.done = True
+
+    @staticmethod
+    def _entry(element):
+        """取出項目的標題、連結與發布時間，與 RSSClient.parse_entries 的格式相同"""
+        fields = {}
+        link = None
+        for child in element:
+            if not isinstance(child.tag, str):
+                continue
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'link' and link is None:
+                # Atom 以 href 屬性表示連結，RSS 以文字內容表示
+                if child.get('href') and child.get('rel', 'alternate') == 'alternate':
+                    link = child.get('href').strip()
+                elif child.text and child.text.strip():
+                    link = child.text.strip()
+            elif name not in fields:
+                fields[name] = ''.join(child.itertext()).strip()
+        # 標題可能是再次跳脫的 HTML，與 feedparser 一樣轉為對應字元
+        title = html.unescape(fields.get('title') or '').strip()
+        if not title or not link:
+            return None
+        dates = [fields[name] for name in PUBLISHED_TAGS + UPDATED_TAGS if fields.get(name)]
+        published = parse_feed_date(dates[0]) if dates else None
+        return {'title': title, 'link': link, 'published': published}
+
 
 class RSSClient(BaseAPIClient):
     """RSS Feed 客戶端"""
 
-    def get_news(self, sources, keywords=None, filter_at_source=True):
-        """獲取 RSS 新聞"""
+    def get_news(self, sources, keywords=None, filter_at_source=True, early_stop=True):
+        """獲取 RSS 新聞，sources 為 Source 設定列表
+
+        feed 以串流方式邊下載邊解析；early_stop 時找到 source.max_entries 則符合的項目就停止讀取並關閉連線
+        """
         articles = []
 
         for source in sources:
             try:
-                response = self._make_request(source['url'], headers={'User-Agent': DEFAULT_USER_AGENT}, timeout=RSS_TIMEOUT)
-                if response:
-                    feed = feedparser.parse(response.text)
-
-                    if filter_at_source and keywords:
-                        filtered_entries = [
-                            entry for entry in feed.entries
-                            if any(keyword.lower() in entry.title.lower() for keyword in keywords)
-                        ]
-                        entries_to_process = filtered_entries[:5]
-                    else:
-                        entries_to_process = feed.entries[:5]
-
-                    for entry in entries_to_process:
-                        title = entry.title
-                        link = entry.link
-                        articles.append({'title': title, 'url': link, 'source': source['name']})
+                matcher = get_matcher(keywords) if filter_at_source and keywords else None
+                limit = source.max_entries if early_stop else None
+                entries = self.fetch_entries(source, matcher, limit)
+                if entries is not None:
+                    articles.extend(
+                        self.select_entries(entries, source, keywords, filter_at_source)
+                    )
             except Exception as e:
-                print(f"Error fetching from {source['name']}: {e}")
+                print(f"Error fetching from {source.name}: {e}")
                 continue
 
-        return articles
\ No newline at end of file
+        return articles
+
+    def fetch_entries(self, source, matcher=None, limit=None):
+        """條件式串流請求：limit 為 None 時讀完整個 feed，否則 matcher 符合的項目滿 limit 則就停止
+
+        上次只讀了 feed 前半段且其中符合的項目不足時不送出驗證標頭，避免 304 時重用不完整的結果
+        """
+        key = source.url
+        headers = self.feed_headers(key, matcher, limit)
+        response = self._make_request(source.url, headers=headers,
+                                      timeout=source.timeout or RSS_TIMEOUT, stream=True)
+        if response is None:
+            return self.circuit_fallback(key, source.url)
+        with response:
+            if response.status_code != 200:
+                result = self.resolve_conditional(key, response.status_code, response.headers, b'',
+                                                  self.parse_entries)
+                return result if result is not None else self.circuit_fallback(key, source.url)
+            stream = self.open_stream(matcher, limit)
+            for chunk in response.iter_content(FEED_CHUNK_SIZE):
+                if stream.feed(chunk):
+                    break
+            else:
+                stream.close()
+        return self.finish_stream(key, response.headers, stream)
+
+    def open_stream(self, matcher=None, limit=None):
+        return FeedStream(matcher, limit, fallback=self.parse_entries)
+
+    def finish_stream(self, key, response_headers, stream):
+        """記錄解析耗時與統計並保存驗證資訊；同一版本 feed 上次讀得更多時保留較完整的結果"""
+        metrics.record('feed_parse', stream.parse_seconds)
+        self.count_conditional(key, requests=1, parses=1, bytes_downloaded=stream.bytes_read,
+                               early_stops=0 if stream.complete else 1)
+        with self._validator_lock:
+            previous = self._validators.get(key)
+        etag = response_headers.get('ETag')
+        if (not stream.complete and previous and etag and previous['etag'] == etag
+                and (previous['complete'] or len(previous['result']) > len(stream.entries))):
+            return stream.entries
+        self.store_conditional(key, response_headers, stream.entries, stream.bytes_read,
+                               complete=stream.complete)
+        return stream.entries
+
+    def feed_headers(self, key, matcher=None, limit=None):
+        headers = {'User-Agent': DEFAULT_USER_AGENT}
+        if self.can_revalidate(key, matcher, limit):
+            headers = self.conditional_headers(key, headers)
+        return headers
+
+    def can_revalidate(self, key, matcher=None, limit=None):
+        """上次的結果足以回應這次查詢時才送出驗證標頭"""
+        with self._validator_lock:
+            entry = self._validators.get(key)
+        if entry is None or entry.get('complete', True):
+            return True
+        if limit is None:
+            return False
+        matches = sum(
+            1 for item in entry['result'] if matcher is None or matcher.matches(item['title'])
+        )
+        return matches >= limit
+
+    def is_complete(self, source):
+        """上次是否讀完整個 feed"""
+        with self._validator_lock:
+            entry = self._validators.get(source.url)
+        return entry is not None and entry.get('complete', True)
+
+    def parse_entries(self, content):
+        """以 feedparser 解析完整的 RSS 內容（lxml 無法解析時的備援），只保留標題、連結與發布時間"""
+        import feedparser
+
+        feed = feedparser.parse(content)
+        return [
+            {
+                'title': entry.title,
+                'link': entry.link,
+                'published': parse_timestamp(
+                    entry.get('published_parsed') or entry.get('updated_parsed')
+                ),
+            }
+            for entry in feed.entries if 'title' in entry and 'link' in entry
+        ]
+
+    def select_entries(self, entries, source, keywords=None, filter_at_source=True):
+        """依關鍵字篩選已解析的項目，最多回傳 source.max_entries 則"""
+        if filter_at_source and keywords:
+            matcher = get_matcher(keywords)
+            filtered_entries = [entry for entry in entries if matcher.matches(entry['title'])]
+            entries_to_process = filtered_entries[:source.max_entries]
+        else:
+            entries_to_process = entries[:source.max_entries]
+
+        return [
+            NewsItem(entry['title'], entry['link'], source.name, published=entry.get('published'))
+            for entry in entries_to_process
+        ]
+
+    def recent_entries(self, source):
+        """回傳該來源上次解析的所有項目（不經關鍵字篩選與數量限制），供搜尋索引使用；提早停止時只有已讀取的部分"""
+        entries = self.last_result(source.url) or []
+        return [
+            NewsItem(entry['title'], entry['link'], source.name, published=entry.get('published'))
+            for entry in entries
+        ]
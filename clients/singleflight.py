@@ -0,0 +1,58 @@
+"""
+請求合併（single-flight）
+相同鍵的並發呼叫只執行一次，其他呼叫者等待並共享同一個結果
+"""
+
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合併相同鍵的並發呼叫，並統計被合併的次數"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """執行 fn，若相同鍵已有進行中的呼叫則等待其結果"""
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executions'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
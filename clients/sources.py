@@ -0,0 +1,147 @@
+"""
+新聞來源設定
+從 sources.json 載入每個來源的類型、網址、每主機並發上限、超時、重試次數與最多項目數，新增來源不需要修改程式
+"""
+
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+# 常量定義
+SOURCES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sources.json'
+)
+SOURCE_TYPES = ('rss', 'wordpress', 'coveo')
+DEFAULT_HOST_LIMIT = 4
+DEFAULT_TIMEOUT = 15
+DEFAULT_RETRIES = 2
+DEFAULT_MAX_ENTRIES = 5
+ARTICLE_TIMEOUT = 15
+ARTICLE_RETRIES = 1
+
+
+class Source:
+    """單一新聞來源的設定"""
+
+    def __init__(self, name, source_type, url, host_limit=DEFAULT_HOST_LIMIT,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, max_entries=DEFAULT_MAX_ENTRIES,
+                 article_timeout=ARTICLE_TIMEOUT, article_retries=ARTICLE_RETRIES,
+                 article_hosts=None, options=None):
+        if source_type not in SOURCE_TYPES:
+            raise ValueError(f"Unsupported source type: {source_type}")
+        self.name = name
+        self.type = source_type
+        self.url = url
+        self.host = urlparse(url).netloc
+        self.host_limit = host_limit
+        self.timeout = timeout
+        self.retries = retries
+        self.max_entries = max_entries
+        self.article_timeout = article_timeout
+        self.article_retries = article_retries
+        # 文章所在的網域（例如 AMD 的搜尋 API 與新聞稿不在同一個主機），預設與來源相同
+        self.article_hosts = article_hosts or [self.host]
+        self.options = options or {}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        return cls(data.pop('name'), data.pop('type'), data.pop('url'), **data)
+
+    def matches_host(self, host):
+        """主機屬於此來源的文章網域（含子網域）時回傳 True"""
+        return any(
+            host == article_host or host.endswith('.' + article_host)
+            for article_host in self.article_hosts
+        )
+
+    def __repr__(self):
+        return f"Source(name={self.name!r}, type={self.type!r}, url={self.url!r})"
+
+
+class SourceRegistry:
+    """所有新聞來源的設定，並提供每個主機的並發限制"""
+
+    def __init__(self, sources):
+        self._sources = list(sources)
+        self._by_name = {}
+        for source in self._sources:
+            if source.name in self._by_name:
+                raise ValueError(f"Duplicate source name: {source.name}")
+            self._by_name[source.name] = source
+        self._lock = threading.Lock()
+        self._host_semaphores = {}
+
+    @classmethod
+    def load(cls, path=SOURCES_PATH):
+        """從 JSON 設定檔載入來源"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(Source.from_dict(entry) for entry in data['sources'])
+
+    def __iter__(self):
+        return iter(self._sources)
+
+    def __len__(self):
+        return len(self._sources)
+
+    def names(self):
+        return [source.name for source in self._sources]
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def of_type(self, source_type):
+        return [source for source in self._sources if source.type == source_type]
+
+    def source_for_url(self, url):
+        """依網址主機找出所屬來源，找不到時回傳 None"""
+        host = urlparse(url).netloc
+        for source in self._sources:
+            if source.matches_host(host):
+                return source
+        return None
+
+    def article_policy(self, url):
+        """回傳文章的 (請求超時, 重試次數)"""
+        source = self.source_for_url(url)
+        if source is None:
+            return ARTICLE_TIMEOUT, ARTICLE_RETRIES
+        return source.article_timeout, source.article_retries
+
+    def host_limit(self, url, default=DEFAULT_HOST_LIMIT):
+        """回傳網址所屬主機的並發上限"""
+        source = self.source_for_url(url)
+        return source.host_limit if source is not None else default
+
+    def limit(self, url):
+        """回傳該主機共用的 semaphore，以 with 語法限制同時進行的請求數"""
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.host_limit(url))
+                self._host_semaphores[host] = semaphore
+        return semaphore
+
+    def host_pool_sizes(self):
+        """各來源主機的連線池大小，供 create_session 使用"""
+        return {source.host: source.host_limit for source in self._sources}
+
+    def host_retries(self):
+        """各來源主機的重試次數，供 create_session 使用"""
+        return {source.host: source.retries for source in self._sources}
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry():
+    """取得由 SOURCES_PATH 環境變數（預設專案根目錄的 sources.json）載入的來源設定"""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = SourceRegistry.load(os.getenv('SOURCES_PATH') or SOURCES_PATH)
+        return _default_registry
@@ -3,35 +3,124 @@
 展示如何使用自定義的 API 客戶端實例
 """
 
-from clients import AMDAPIClient, NvidiaAPIClient, RSSClient, ArticleClient
-from processors import NewsProcessor
+import os
+from clients import (
+    AMDAPIClient, NvidiaAPIClient, RSSClient, ArticleClient, NewsItem, create_session, create_cache,
+    get_summarizer
+)
+from clients.sources import get_default_registry
+from clients.metrics import metrics
+from clients.cache import CACHE_PATH, REDIS_URL
+from clients.parse_pool import ParsePool
+from processors import NewsProcessor, GLOBAL_DEADLINE
+from prefetch import NewsPool, PrefetchScheduler
+from search_index import SearchIndex
+from jobs import JobWorkerPool, create_job_queue, JOB_QUEUE_MAXSIZE, JOB_WORKERS, JOB_QUEUE_PATH
+from subscriptions import SubscriptionStore, DigestBroadcaster, SUBSCRIPTIONS_PATH, DIGEST_INTERVAL
+from startup import Warmup, WARMUP_DELAY
 
 class MockAMDClient(AMDAPIClient):
     """模擬 AMD 客戶端，用於測試"""
-    def get_news(self):
+    def get_news(self, source=None, keywords=None):
         return [
-            {'title': 'Mock AMD News', 'url': 'https://example.com/amd', 'source': 'AMD'}
+            NewsItem('Mock AMD News', 'https://example.com/amd', 'AMD')
         ]
 
 class NewsBotContainer:
     """新聞機器人依賴注入容器"""
 
     def __init__(self):
+        # 熱路徑指標：METRICS_ENABLED=false 時 span 不做任何事；設定 METRICS_TRACE_PATH 時每次查詢寫入一行 JSON 追蹤
+        metrics.configure(
+            enabled=os.getenv('METRICS_ENABLED', 'true').lower() == 'true',
+            trace_path=os.getenv('METRICS_TRACE_PATH') or None
+        )
+        # 新聞來源設定：預設讀取專案根目錄的 sources.json，可用 SOURCES_PATH 指定其他檔案
+        self.sources = get_default_registry()
+        # 所有客戶端共用同一個連線池 Session，來源主機依設定使用各自的連線池大小與重試次數
+        self.session = create_session(
+            pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', 10)),
+            max_retries=int(os.getenv('HTTP_MAX_RETRIES', 2)),
+            backoff_factor=float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5)),
+            host_pool_sizes=self.sources.host_pool_sizes(),
+            host_retries=self.sources.host_retries()
+        )
+
         # 可以根據環境配置不同的客戶端
-        self.amd_client = AMDAPIClient()  # 或 MockAMDClient() 用於測試
-        self.nvidia_client = NvidiaAPIClient()
-        self.rss_client = RSSClient()
-        self.article_client = ArticleClient()
-
-    def create_news_processor(self):
-        """創建配置好的新聞處理器"""
-        return NewsProcessor(
+        self.amd_client = AMDAPIClient(session=self.session)  # 或 MockAMDClient() 用於測試
+        self.nvidia_client = NvidiaAPIClient(session=self.session)
+        self.rss_client = RSSClient(session=self.session)
+        # 文章摘要緩存：memory（預設）、sqlite（重啟後保留）或 redis（多個 worker 共用）
+        self.article_cache = create_cache(
+            os.getenv('ARTICLE_CACHE_BACKEND', 'memory'),
+            path=os.getenv('ARTICLE_CACHE_PATH', CACHE_PATH),
+            redis_url=os.getenv('REDIS_URL', REDIS_URL)
+        )
+        # 摘要引擎：textrank（預設）、lead（首段擷取）或 tfidf（NumPy 向量化）
+        self.summarizer = get_summarizer(os.getenv('SUMMARIZER_ENGINE', 'textrank'))
+        # 解析/摘要行程池：PARSE_WORKERS > 0 時啟用，worker 在建立時啟動並各自完成匯入
+        self.parse_pool = None
+        parse_workers = int(os.getenv('PARSE_WORKERS', 0))
+        if parse_workers > 0:
+            self.parse_pool = ParsePool(workers=parse_workers, summarizer_name=self.summarizer.name)
+        self.article_client = ArticleClient(
+            session=self.session,
+            cache=self.article_cache,
+            summarizer=self.summarizer,
+            parse_pool=self.parse_pool,
+            sources=self.sources
+        )
+        self.news_pool = NewsPool()
+        # 搜尋索引：設定 SEARCH_INDEX_PATH 時保存到 JSON 檔案，重啟後不必重新抓取
+        self.search_index = SearchIndex(path=os.getenv('SEARCH_INDEX_PATH') or None)
+
+    def create_news_processor(self, engine=None):
+        """創建配置好的新聞處理器，engine 可選 'threaded'（預設）或 'async'"""
+        engine = engine or os.getenv('NEWS_ENGINE', 'threaded')
+        if engine == 'async':
+            # 只有使用 async 引擎時才匯入 aiohttp
+            from async_processor import AsyncNewsProcessor
+            processor_class = AsyncNewsProcessor
+        elif engine == 'threaded':
+            processor_class = NewsProcessor
+        else:
+            raise ValueError(f"Unsupported news engine: {engine}")
+        return processor_class(
             amd_client=self.amd_client,
             nvidia_client=self.nvidia_client,
             rss_client=self.rss_client,
-            article_client=self.article_client
+            article_client=self.article_client,
+            news_pool=self.news_pool,
+            search_index=self.search_index,
+            sources=self.sources,
+            # 整個查詢的延遲預算，到期時未完成的文章只送出標題和連結
+            deadline=float(os.getenv('NEWS_DEADLINE', GLOBAL_DEADLINE))
         )
 
+    def create_prefetch_scheduler(self, news_processor, interval=None):
+        """創建共用同一新聞池的背景預取排程器"""
+        if interval is None:
+            return PrefetchScheduler(news_processor, self.news_pool)
+        return PrefetchScheduler(news_processor, self.news_pool, interval=interval)
+
+    def create_job_pool(self, handler, backend='memory', maxsize=JOB_QUEUE_MAXSIZE,
+                        workers=JOB_WORKERS, path=JOB_QUEUE_PATH):
+        """創建 webhook 工作佇列與 worker 池"""
+        job_queue = create_job_queue(backend, maxsize=maxsize, path=path)
+        return JobWorkerPool(job_queue, handler, workers=workers)
+
+    def create_subscription_store(self, path=SUBSCRIPTIONS_PATH):
+        """創建本地 SQLite 訂閱者儲存"""
+        return SubscriptionStore(path=path)
+
+    def create_digest_broadcaster(self, news_processor, delivery, store, interval=DIGEST_INTERVAL):
+        """創建依關鍵字組合建立摘要並批次推播給訂閱者的排程器"""
+        return DigestBroadcaster(news_processor, delivery, store, interval=interval)
+
+    def create_warmup(self, snapshot_path=None, delay=WARMUP_DELAY):
+        """創建啟動預熱：背景匯入重量級模組並從快照還原文章緩存"""
+        return Warmup(self, snapshot_path=snapshot_path, delay=delay)
+
 # 使用示例
 if __name__ == "__main__":
     container = NewsBotContainer()
@@ -0,0 +1,244 @@
+"""
+LINE 推播層
+每次 push 最多打包5則訊息，可選擇以 Flex carousel 精簡呈現；多位使用者同時查詢相同的 news 結果時合併為 multicast，
+遇到 429 與 5xx 時依 Retry-After 退避重試
+"""
+
+import threading
+import time
+import uuid
+
+from linebot.exceptions import LineBotApiError
+from linebot.models import (
+    TextSendMessage, FlexSendMessage, CarouselContainer, BubbleContainer, BoxComponent,
+    TextComponent, ButtonComponent, URIAction
+)
+
+from clients.metrics import metrics
+
+# 常量定義
+MAX_MESSAGES_PER_PUSH = 5  # LINE push / multicast 每次最多5則訊息
+MAX_MULTICAST_RECIPIENTS = 500  # multicast 每次最多500位使用者
+MAX_CAROUSEL_BUBBLES = 12
+MAX_SEND_RETRIES = 3
+RETRY_BACKOFF = 1.0
+MAX_RETRY_AFTER = 30
+MULTICAST_WINDOW = 0  # 預設不額外等待，只合併在查詢進行中加入的使用者
+FLEX_SUMMARY_CHARS = 300
+ERROR_TEXT = "取得新聞時發生錯誤，請稍後再試"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def format_news_item(news_item):
+    """把 NewsItem 轉成 LINE 文字訊息，沒有摘要時只顯示標題和連結"""
+    text = f"📰 標題: {news_item.title} (來源: {news_item.source})\n🔗 連結: {news_item.link}\n"
+    if news_item.summary is None:
+        return text + "\n"
+    return text + f"📑 新聞摘要: {news_item.summary}\n"
+
+
+def news_bubble(news_item):
+    """單則新聞的 Flex bubble：標題、來源、摘要與閱讀全文按鈕"""
+    contents = [
+        TextComponent(text=news_item.title, weight='bold', size='md', wrap=True, max_lines=3),
+        TextComponent(text=news_item.source, size='xs', color='#888888'),
+    ]
+    if news_item.summary:
+        contents.append(TextComponent(
+            text=news_item.summary[:FLEX_SUMMARY_CHARS], size='sm', wrap=True, max_lines=8
+        ))
+    return BubbleContainer(
+        size='kilo',
+        body=BoxComponent(layout='vertical', spacing='sm', contents=contents),
+        footer=BoxComponent(layout='vertical', contents=[
+            ButtonComponent(
+                action=URIAction(label='閱讀全文', uri=news_item.link), style='link', height='sm'
+            )
+        ]),
+    )
+
+
+def chunked(values, size):
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+class _SharedDelivery:
+    """一次共享查詢的收件者名單，查詢完成前加入的使用者都會收到同一份結果"""
+
+    def __init__(self, user_id):
+        self.user_ids = [user_id]
+        self.open = True
+
+
+class ProgressiveSender:
+    """第一則新聞就緒時立即推播，其餘新聞累積後以最少的 push 次數送出
+
+    flush 之後才加入的新聞（查詢期限後仍在背景推播的項目）直接單獨送出
+    """
+
+    def __init__(self, delivery, user_id):
+        self.delivery = delivery
+        self.user_id = user_id
+        self.sent = 0
+        self._buffer = []
+        self._flushed = False
+        self._lock = threading.Lock()
+
+    def add(self, news_item):
+        with self._lock:
+            first = self.sent == 0 and not self._buffer
+            if not first and not self._flushed:
+                self._buffer.append(news_item)
+                return
+            self.sent += 1
+        self.delivery.push(self.user_id, self.delivery.build_messages([news_item]))
+
+    def flush(self):
+        """送出累積的新聞，回傳總共送出的新聞數"""
+        with self._lock:
+            news_items, self._buffer = self._buffer, []
+            self.sent += len(news_items)
+            self._flushed = True
+        if news_items:
+            self.delivery.push(self.user_id, self.delivery.build_messages(news_items))
+        return self.sent
+
+
+class LineDelivery:
+    """批次推播新聞到 LINE，並統計 API 呼叫、重試與合併次數"""
+
+    def __init__(self, line_bot_api, use_flex=False, max_retries=MAX_SEND_RETRIES,
+                 multicast_window=MULTICAST_WINDOW):
+        self.line_bot_api = line_bot_api
+        self.use_flex = use_flex
+        self.max_retries = max_retries
+        self.multicast_window = multicast_window
+        self._lock = threading.Lock()
+        self._shared = {}  # 查詢鍵 -> 進行中的 _SharedDelivery
+        self._stats = {
+            'pushes': 0, 'multicasts': 0, 'api_calls': 0, 'messages': 0, 'retries': 0,
+            'failures': 0, 'coalesced_users': 0,
+        }
+
+    def build_messages(self, news_items):
+        """文字模式每則新聞一則訊息；Flex 模式每12則新聞合成一個 carousel"""
+        if not self.use_flex:
+            return [TextSendMessage(text=format_news_item(news_item)) for news_item in news_items]
+        return [
+            FlexSendMessage(
+                alt_text=f"📰 {len(group)} 則科技新聞：{group[0].title}"[:400],
+                contents=CarouselContainer(contents=[news_bubble(news_item) for news_item in group])
+            )
+            for group in chunked(news_items, MAX_CAROUSEL_BUBBLES)
+        ]
+
+    def push(self, user_id, messages):
+        """推播給單一使用者，每次 API 呼叫最多5則訊息"""
+        for batch in chunked(messages, MAX_MESSAGES_PER_PUSH):
+            self._send(self.line_bot_api.push_message, user_id, batch)
+            self._count('pushes', len(batch))
+
+    def multicast(self, user_ids, messages):
+        """推播相同訊息給多位使用者，每次 API 呼叫最多500位使用者、5則訊息"""
+        for recipients in chunked(list(user_ids), MAX_MULTICAST_RECIPIENTS):
+            for batch in chunked(messages, MAX_MESSAGES_PER_PUSH):
+                self._send(self.line_bot_api.multicast, recipients, batch)
+                self._count('multicasts', len(batch) * len(recipients))
+
+    def send(self, user_ids, messages):
+        """只有一位使用者時使用 push，否則使用 multicast"""
+        if len(user_ids) == 1:
+            self.push(user_ids[0], messages)
+        else:
+            self.multicast(user_ids, messages)
+
+    def progressive(self, user_id):
+        return ProgressiveSender(self, user_id)
+
+    def deliver_shared(self, key, user_id, produce, empty_text, error_text=ERROR_TEXT):
+        """相同查詢鍵的結果對所有使用者都一樣：查詢進行中加入的使用者不再重複查詢，完成後以 multicast 一起送出
+
+        回傳 False 表示已加入其他使用者進行中的查詢，由該查詢負責推播；produce 失敗時通知所有等待的使用者後重新拋出例外
+        """
+        with self._lock:
+            shared = self._shared.get(key)
+            if shared is not None and shared.open:
+                shared.user_ids.append(user_id)
+                self._stats['coalesced_users'] += 1
+                return False
+            shared = _SharedDelivery(user_id)
+            self._shared[key] = shared
+
+        try:
+            if self.multicast_window:
+                time.sleep(self.multicast_window)
+            news_items = produce()
+        except Exception:
+            self._close_shared(key, shared)
+            print(f"共享查詢 {key} 失敗，通知 {len(shared.user_ids)} 位等待的使用者")
+            try:
+                self.send(shared.user_ids, [TextSendMessage(text=error_text)])
+            except LineBotApiError as e:
+                print(f"無法送出錯誤訊息: {e}")
+            raise
+        self._close_shared(key, shared)
+        if news_items:
+            messages = self.build_messages(news_items)
+        else:
+            messages = [TextSendMessage(text=empty_text)]
+        self.send(shared.user_ids, messages)
+        return True
+
+    def _close_shared(self, key, shared):
+        """停止接受新的使用者加入，之後的相同查詢會重新執行"""
+        with self._lock:
+            shared.open = False
+            del self._shared[key]
+
+    def _count(self, kind, messages):
+        with self._lock:
+            self._stats[kind] += 1
+            self._stats['messages'] += messages
+
+    def _send(self, method, to, messages):
+        """送出單次 API 呼叫；429 與 5xx 依 Retry-After（或指數退避）重試，重試使用相同的 retry key 避免重複送達"""
+        retry_key = str(uuid.uuid4())
+        for attempt in range(self.max_retries + 1):
+            with self._lock:
+                self._stats['api_calls'] += 1
+            try:
+                with metrics.span('line_push', api=method.__name__):
+                    method(to, messages, retry_key=retry_key)
+                return
+            except LineBotApiError as e:
+                if e.status_code == 409 and attempt > 0:
+                    # 先前的重試其實已被接受
+                    return
+                if e.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    with self._lock:
+                        self._stats['failures'] += 1
+                    raise
+                delay = self._retry_after(e.headers) if e.status_code == 429 else None
+                if delay is None:
+                    delay = RETRY_BACKOFF * 2 ** attempt
+                print(f"LINE API 回應 {e.status_code}，{delay:.1f} 秒後重試 "
+                      f"{attempt + 1}/{self.max_retries}")
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(delay)
+
+    @staticmethod
+    def _retry_after(headers):
+        for name, value in (headers or {}).items():
+            if name.lower() == 'retry-after':
+                try:
+                    return min(MAX_RETRY_AFTER, max(0.0, float(value)))
+                except ValueError:
+                    return None
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['shared_in_flight'] = len(self._shared)
+        return stats
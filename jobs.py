@@ -0,0 +1,219 @@
+"""
+Webhook 工作佇列
+/callback 只負責驗證簽章並排入工作，由背景 worker 執行新聞抓取與推播
+"""
+
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# 常量定義
+JOB_QUEUE_MAXSIZE = 100
+JOB_WORKERS = 4
+JOB_QUEUE_PATH = 'jobs.db'
+POLL_INTERVAL = 0.5
+METRICS_WINDOW = 500  # 保留最近500筆等待/執行時間用於計算百分位數
+
+
+class JobQueueFull(Exception):
+    """工作佇列已滿"""
+
+
+class MemoryJobQueue:
+    """有界的行程內工作佇列"""
+
+    def __init__(self, maxsize=JOB_QUEUE_MAXSIZE):
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, payload):
+        """排入工作，佇列已滿時拋出 JobQueueFull"""
+        try:
+            self._queue.put_nowait((time.time(), payload))
+        except queue.Full:
+            raise JobQueueFull(f"job queue is full ({self.maxsize})")
+
+    def get(self, timeout=None):
+        """取出 (排入時間, payload)，逾時回傳 None"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class SQLiteJobQueue:
+    """以本地 SQLite 保存的有界工作佇列，行程重啟後未執行的工作仍會保留"""
+
+    def __init__(self, path=JOB_QUEUE_PATH, maxsize=JOB_QUEUE_MAXSIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, enqueued_at REAL, payload TEXT)"
+        )
+
+    def put(self, payload):
+        """排入工作，payload 必須可序列化為 JSON"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+                if count >= self.maxsize:
+                    raise JobQueueFull(f"job queue is full ({self.maxsize})")
+                self._conn.execute(
+                    "INSERT INTO jobs (enqueued_at, payload) VALUES (?, ?)",
+                    (time.time(), json.dumps(payload, ensure_ascii=False))
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _pop(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, enqueued_at, payload FROM jobs ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM jobs WHERE id = ?", (row[0],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row:
+            return row[1], json.loads(row[2])
+        return None
+
+    def get(self, timeout=None):
+        """輪詢取出 (排入時間, payload)，逾時回傳 None"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            item = self._pop()
+            if item is not None:
+                return item
+            if deadline is not None and time.time() >= deadline:
+                return None
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                wait = min(POLL_INTERVAL, max(0, deadline - time.time()))
+            time.sleep(wait)
+
+    def qsize(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return count
+
+
+def create_job_queue(backend='memory', maxsize=JOB_QUEUE_MAXSIZE, path=JOB_QUEUE_PATH):
+    """依設定建立工作佇列"""
+    if backend == 'memory':
+        return MemoryJobQueue(maxsize=maxsize)
+    if backend == 'sqlite':
+        return SQLiteJobQueue(path=path, maxsize=maxsize)
+    raise ValueError(f"Unsupported job queue backend: {backend}")
+
+
+def summarize_durations(samples):
+    """計算耗時樣本的平均值與百分位數"""
+    values = sorted(samples)
+    if not values:
+        return {'count': 0, 'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+
+    def percentile(p):
+        return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+    return {
+        'count': len(values),
+        'avg': sum(values) / len(values),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': values[-1],
+    }
+
+
+class JobWorkerPool:
+    """從工作佇列取出工作並交給 handler 執行的背景 worker 池"""
+
+    def __init__(self, job_queue, handler, workers=JOB_WORKERS):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._wait_times = deque(maxlen=METRICS_WINDOW)
+        self._durations = deque(maxlen=METRICS_WINDOW)
+        self._counters = {'enqueued': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self._active = 0
+
+    def start(self):
+        """啟動 worker 執行緒"""
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"news-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"工作佇列已啟動，worker 數量: {self.workers}")
+
+    def stop(self, timeout=None):
+        """停止所有 worker（不會中斷正在執行的工作）"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, payload):
+        """排入工作，佇列已滿時拋出 JobQueueFull"""
+        try:
+            self.job_queue.put(payload)
+        except JobQueueFull:
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise
+        with self._lock:
+            self._counters['enqueued'] += 1
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            item = self.job_queue.get(timeout=POLL_INTERVAL)
+            if item is None:
+                continue
+            enqueued_at, payload = item
+            started = time.time()
+            with self._lock:
+                self._wait_times.append(started - enqueued_at)
+                self._active += 1
+            try:
+                self.handler(payload)
+                outcome = 'completed'
+            except Exception as e:
+                print(f"執行工作失敗: {e}")
+                outcome = 'failed'
+            with self._lock:
+                self._durations.append(time.time() - started)
+                self._counters[outcome] += 1
+                self._active -= 1
+
+    def get_stats(self):
+        """回傳佇列深度、等待時間與工作執行時間統計"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['active'] = self._active
+            stats['wait_time'] = summarize_durations(self._wait_times)
+            stats['job_duration'] = summarize_durations(self._durations)
+        stats['queue_depth'] = self.job_queue.qsize()
+        stats['max_size'] = self.job_queue.maxsize
+        stats['workers'] = self.workers
+        return stats
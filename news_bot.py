@@ -1,11 +1,17 @@
-from flask import Flask, request, abort
+from flask import Flask, Response, request, abort, jsonify
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage
 from dotenv import load_dotenv
+import atexit
 import os
-from processors import NewsProcessor
+from processors import NewsProcessor, get_memory_usage
+from clients.metrics import metrics
 from container import NewsBotContainer
+from delivery import LineDelivery, MULTICAST_WINDOW
+from jobs import JobQueueFull, JOB_QUEUE_MAXSIZE, JOB_WORKERS, JOB_QUEUE_PATH
+from subscriptions import SUBSCRIPTIONS_PATH, DIGEST_INTERVAL
+from startup import WARMUP_DELAY
 
 # 常量定義
 DEFAULT_USER_AGENT = 'Mozilla/5.0'
@@ -13,6 +19,10 @@ FULL_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/5
 DEFAULT_KEYWORDS = ["gpu", "電腦", "ai", "workstation", "顯卡"]
 REQUEST_TIMEOUT = 15
 RSS_TIMEOUT = 10
+PREFETCH_INTERVAL = 600
+SUBSCRIBE_COMMANDS = ('subscribe', '訂閱')
+UNSUBSCRIBE_COMMANDS = ('unsubscribe', '取消訂閱')
+LINE_API_ENDPOINT = 'https://api.line.me'
 
 def create_app():
     """創建並配置 Flask 應用"""
@@ -25,13 +35,45 @@ def create_app():
     CHANNEL_ACCESS_TOKEN = os.getenv('CHANNEL_ACCESS_TOKEN')
     CHANNEL_SECRET = os.getenv('CHANNEL_SECRET')
 
-    line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
+    # LINE_API_ENDPOINT 可指向本地的 LINE API 模擬伺服器進行測試
+    line_bot_api = LineBotApi(
+        CHANNEL_ACCESS_TOKEN, endpoint=os.getenv('LINE_API_ENDPOINT') or LINE_API_ENDPOINT
+    )
     handler = WebhookHandler(CHANNEL_SECRET)
+    delivery = LineDelivery(
+        line_bot_api,
+        use_flex=os.getenv('LINE_FLEX_MESSAGES', 'false').lower() == 'true',
+        multicast_window=float(os.getenv('MULTICAST_WINDOW', MULTICAST_WINDOW))
+    )
 
     # 創建新聞處理器實例
     container = NewsBotContainer()
     news_processor = container.create_news_processor()
 
+    # 背景預取排程器，預先抓取新聞並生成摘要
+    prefetch_scheduler = container.create_prefetch_scheduler(
+        news_processor,
+        interval=int(os.getenv('PREFETCH_INTERVAL', PREFETCH_INTERVAL))
+    )
+    if os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true':
+        prefetch_scheduler.start()
+
+    # 冷啟動預熱：重量級模組延遲匯入，app 建立後在背景預熱並從快照還原文章緩存，結束時再寫回快照
+    snapshot_path = os.getenv('CACHE_SNAPSHOT_PATH') or None
+    warmup = container.create_warmup(
+        snapshot_path, delay=float(os.getenv('WARMUP_DELAY', WARMUP_DELAY))
+    )
+    if snapshot_path:
+        atexit.register(warmup.save_snapshot)
+
+    @app.route("/startup/status", methods=['GET'])
+    def startup_status():
+        return jsonify(warmup.get_status())
+
+    @app.route("/prefetch/status", methods=['GET'])
+    def prefetch_status():
+        return jsonify(prefetch_scheduler.get_status())
+
     @app.route("/callback", methods=['POST'])
     def callback():
         signature = request.headers['X-Line-Signature']
@@ -42,51 +84,192 @@ def create_app():
             abort(400)
         return 'OK'
 
+    def run_news_job(job):
+        """在背景 worker 中執行新聞抓取並推播給使用者"""
+        if not job.get('keyword'):
+            # 預設的 news 查詢對所有使用者結果相同，查詢進行中加入的使用者合併為一次 multicast
+            delivery.deliver_shared(
+                'news', job['user_id'],
+                lambda: news_processor.get_intel_news(
+                    keywords=job['keywords'], filter_at_source=True
+                ),
+                empty_text="目前沒有找到包含關鍵字的新聞"
+            )
+            return
+
+        # 第一則新聞就緒時立即推播，其餘新聞完成後打包成一次 push
+        sender = delivery.progressive(job['user_id'])
+        final_news = news_processor.get_intel_news(
+            keywords=job['keywords'], filter_at_source=True, on_item=sender.add
+        )
+        sender.flush()
+        if not final_news:
+            delivery.push(job['user_id'], [
+                TextSendMessage(text=f"目前沒有找到包含關鍵字「{job['keyword']}」的新聞")
+            ])
+
+    # 工作佇列：/callback 只排入工作並立即返回，由 worker 執行抓取與推播
+    job_pool = container.create_job_pool(
+        run_news_job,
+        backend=os.getenv('JOB_QUEUE_BACKEND', 'memory'),
+        maxsize=int(os.getenv('JOB_QUEUE_MAXSIZE', JOB_QUEUE_MAXSIZE)),
+        workers=int(os.getenv('JOB_WORKERS', JOB_WORKERS)),
+        path=os.getenv('JOB_QUEUE_PATH', JOB_QUEUE_PATH)
+    )
+    job_pool.start()
+
+    def collect_metrics():
+        """輸出 /metrics 時才計算的緩存命中率、佇列深度與記憶體用量"""
+        cache_stats = container.article_client.get_cache_stats()
+        job_stats = job_pool.get_stats()
+        samples = [
+            ('process_resident_memory_bytes', {}, int(get_memory_usage() * 1024 * 1024)),
+            ('cache_hits_total', {'cache': 'article'}, cache_stats['hits']),
+            ('cache_misses_total', {'cache': 'article'}, cache_stats['misses']),
+            ('cache_hit_ratio', {'cache': 'article'}, cache_stats['hit_rate']),
+            ('job_queue_depth', {}, job_stats['queue_depth']),
+            ('job_workers_active', {}, job_stats['active']),
+            ('jobs_rejected_total', {}, job_stats['rejected']),
+        ]
+        feed_stats = container.rss_client.get_conditional_stats()
+        feed_stats.update(container.nvidia_client.get_conditional_stats())
+        for feed, stats in feed_stats.items():
+            samples.append(('feed_parses_avoided_total', {'feed': feed}, stats['parses_avoided']))
+        for host, stats in container.article_client.get_breaker_stats().items():
+            samples.append(('circuit_open', {'host': host}, int(stats['state'] != 'closed')))
+        return samples
+
+    metrics.register_collector('app', collect_metrics)
+
+    @app.route("/metrics", methods=['GET'])
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route("/http/status", methods=['GET'])
+    def http_status():
+        return jsonify(container.article_client.get_connection_stats())
+
+    # 訂閱摘要：依關鍵字組合各建立一次摘要，以 multicast 推播給所有訂閱者
+    subscription_store = container.create_subscription_store(
+        os.getenv('SUBSCRIPTIONS_PATH') or SUBSCRIPTIONS_PATH
+    )
+    digest_broadcaster = container.create_digest_broadcaster(
+        news_processor, delivery, subscription_store,
+        interval=int(os.getenv('DIGEST_INTERVAL', DIGEST_INTERVAL))
+    )
+    if os.getenv('DIGEST_ENABLED', 'false').lower() == 'true':
+        digest_broadcaster.start()
+
+    @app.route("/digest/status", methods=['GET'])
+    def digest_status():
+        return jsonify(digest_broadcaster.get_status())
+
+    @app.route("/digest/dry-run", methods=['GET'])
+    def digest_dry_run():
+        # 只估算下一次推播需要的上游抓取、摘要與 LINE API 呼叫數，不會實際抓取或推播
+        return jsonify(digest_broadcaster.broadcast_once(dry_run=True))
+
+    @app.route("/delivery/status", methods=['GET'])
+    def delivery_status():
+        return jsonify(delivery.get_stats())
+
+    @app.route("/breakers/status", methods=['GET'])
+    def breakers_status():
+        return jsonify(container.article_client.get_breaker_stats())
+
+    @app.route("/feeds/status", methods=['GET'])
+    def feeds_status():
+        stats = container.rss_client.get_conditional_stats()
+        stats.update(container.nvidia_client.get_conditional_stats())
+        return jsonify(stats)
+
+    @app.route("/coalescing/status", methods=['GET'])
+    def coalescing_status():
+        return jsonify(news_processor.get_coalescing_stats())
+
+    @app.route("/cache/status", methods=['GET'])
+    def cache_status():
+        return jsonify(container.article_client.get_cache_stats())
+
+    @app.route("/index/status", methods=['GET'])
+    def index_status():
+        return jsonify(container.search_index.stats())
+
+    @app.route("/ranking", methods=['GET'])
+    def ranking_status():
+        # 例如 /ranking?keywords=gpu,顯卡，只使用新聞池與搜尋索引中已有的項目
+        keywords = [
+            keyword for keyword in request.args.get('keywords', '').split(',') if keyword.strip()
+        ]
+        return jsonify(news_processor.explain_ranking(keywords or None))
+
+    @app.route("/jobs/status", methods=['GET'])
+    def jobs_status():
+        return jsonify(job_pool.get_stats())
+
+    def enqueue_news_job(event, keywords, waiting_text, keyword=None):
+        """排入新聞工作並回覆等待訊息，佇列已滿時回覆忙碌訊息"""
+        try:
+            job_pool.submit({
+                'user_id': event.source.user_id, 'keywords': keywords, 'keyword': keyword
+            })
+        except JobQueueFull:
+            line_bot_api.reply_message(
+                event.reply_token,
+                TextSendMessage(text="目前查詢人數較多，請稍後再試")
+            )
+            return
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=waiting_text))
+
+    def handle_subscription(event, command, keywords):
+        """處理訂閱與取消訂閱指令"""
+        user_id = event.source.user_id
+        if command in UNSUBSCRIBE_COMMANDS:
+            if subscription_store.unsubscribe(user_id):
+                text = "已取消訂閱新聞摘要"
+            else:
+                text = "您目前沒有訂閱新聞摘要"
+        else:
+            keywords = subscription_store.subscribe(user_id, keywords)
+            hours = digest_broadcaster.interval / 3600
+            text = f"已訂閱關鍵字：{', '.join(keywords)}，每 {hours:g} 小時推播一次新聞摘要。發送「取消訂閱」即可停止"
+        line_bot_api.reply_message(event.reply_token, TextSendMessage(text=text))
+
     @handler.add(MessageEvent, message=TextMessage)
     def handle_message(event):
         user_message = event.message.text.lower()
         default_keywords = DEFAULT_KEYWORDS
+        command, *arguments = user_message.split() or ['']
 
-        if user_message == "news":
-            # 先發送等待消息
-            line_bot_api.reply_message(
-                event.reply_token,
-                TextSendMessage(text="🔍 正在為您搜索最新的科技新聞，請稍等...")
-            )
+        if command in SUBSCRIBE_COMMANDS or command in UNSUBSCRIBE_COMMANDS:
+            # 例如「訂閱 gpu 顯卡」，沒有指定關鍵字時訂閱預設關鍵字
+            handle_subscription(event, command, arguments)
 
+        elif user_message == "news":
             # 獲取每個來源1則最符合預設關鍵字的新聞（總共最多4篇）
-            final_news = news_processor.get_intel_news(keywords=default_keywords, filter_at_source=True)
-
-            if final_news:
-                # 一篇一篇發送
-                for news_item in final_news:
-                    line_bot_api.push_message(event.source.user_id, TextSendMessage(text=news_item))
-            else:
-                line_bot_api.push_message(event.source.user_id, TextSendMessage(text="目前沒有找到包含關鍵字的新聞"))
+            enqueue_news_job(event, default_keywords, "🔍 正在為您搜索最新的科技新聞，請稍等...")
 
         else:
             # 檢查用戶輸入是否是一個關鍵字（單詞）
             user_keyword = user_message.strip()
             if user_keyword and len(user_keyword.split()) == 1:  # 確保是單一關鍵字
-                # 先發送等待消息
-                line_bot_api.reply_message(
-                    event.reply_token,
-                    TextSendMessage(text=f"🔍 正在搜索包含「{user_keyword}」的相關新聞，請稍等...")
-                )
-
                 # 根據用戶輸入的關鍵字查詢新聞，使用來源層級篩選
-                final_news = news_processor.get_intel_news(keywords=[user_keyword], filter_at_source=True)
-
-                if final_news:
-                    # 一篇一篇發送
-                    for news_item in final_news:
-                        line_bot_api.push_message(event.source.user_id, TextSendMessage(text=news_item))
-                else:
-                    line_bot_api.push_message(event.source.user_id, TextSendMessage(f"目前沒有找到包含關鍵字「{user_keyword}」的新聞"))
+                enqueue_news_job(
+                    event,
+                    [user_keyword],
+                    f"🔍 正在搜索包含「{user_keyword}」的相關新聞，請稍等...",
+                    keyword=user_keyword
+                )
             else:
                 line_bot_api.reply_message(
                     event.reply_token,
-                    TextSendMessage(text="請發送 'news' 來獲取每個來源1則最相關的新聞，或發送任何單一關鍵字來搜尋相關新聞")
+                    TextSendMessage(
+                        text="請發送 'news' 來獲取每個來源1則最相關的新聞，或發送任何單一關鍵字來搜尋相關新聞；"
+                             "發送「訂閱 關鍵字」可定時接收新聞摘要"
+                    )
                 )
 
-    return app
\ No newline at end of file
+    if os.getenv('STARTUP_WARMUP', 'true').lower() == 'true':
+        warmup.start()
+
+    return app
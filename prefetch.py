@@ -0,0 +1,188 @@
+"""
+新聞預取排程器
+在背景定期抓取所有來源並預先生成摘要，讓 webhook 直接從新聞池回應
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from processors import DEFAULT_KEYWORDS, matching_articles
+
+# 常量定義
+PREFETCH_INTERVAL = 600  # 每10分鐘刷新一次
+POOL_MAX_AGE = 1800  # 來源超過30分鐘未成功刷新視為過期
+PREFETCH_WORKERS = 4
+
+
+class NewsPool:
+    """執行緒安全的預取新聞池，保存各來源的文章列表與預先生成的摘要"""
+
+    def __init__(self, max_age=POOL_MAX_AGE, keywords=None):
+        self.max_age = max_age
+        self.keywords = list(keywords or DEFAULT_KEYWORDS)  # 預取時篩選來源使用的關鍵字
+        self._lock = threading.Lock()
+        self._entries = {}  # 來源名稱 -> 文章列表
+        self._refreshed_at = {}  # 來源名稱 -> 最後成功刷新時間
+        self._summaries = {}  # url -> 帶摘要的 NewsItem
+
+    def update_source(self, name, articles):
+        """更新單一來源的文章列表，並移除已不在任何來源中的摘要"""
+        with self._lock:
+            self._entries[name] = list(articles)
+            self._refreshed_at[name] = time.time()
+            live_urls = {article.url for entries in self._entries.values() for article in entries}
+            for url in [url for url in self._summaries if url not in live_urls]:
+                del self._summaries[url]
+
+    def put_summary(self, url, news_item):
+        with self._lock:
+            self._summaries[url] = news_item
+
+    def get_summary(self, url):
+        with self._lock:
+            return self._summaries.get(url)
+
+    def fresh_sources(self):
+        """回傳尚未過期的來源名稱"""
+        now = time.time()
+        with self._lock:
+            return [name for name, ts in self._refreshed_at.items() if now - ts < self.max_age]
+
+    def is_warm(self):
+        """至少有一個來源在有效期內即視為已預熱"""
+        return bool(self.fresh_sources())
+
+    def covers(self, keywords=None):
+        """池中只有符合預取關鍵字的文章，查詢的每個關鍵字都在預取關鍵字中時才能由新聞池回應"""
+        if not keywords:
+            return True
+        prefetched = {keyword.strip().casefold() for keyword in self.keywords}
+        return all(keyword.strip().casefold() in prefetched for keyword in keywords)
+
+    def select(self, keywords=None):
+        """回傳未過期來源中所有符合關鍵字的文章，由排序階段決定送出哪幾則"""
+        if not keywords:
+            keywords = DEFAULT_KEYWORDS
+        return matching_articles(self.articles(), keywords)
+
+    def articles(self):
+        """回傳所有未過期來源的文章"""
+        fresh = self.fresh_sources()
+        with self._lock:
+            return [article for name in fresh for article in self._entries.get(name, [])]
+
+    def staleness(self):
+        """回傳各來源距離上次成功刷新的秒數"""
+        now = time.time()
+        with self._lock:
+            return {name: now - ts for name, ts in self._refreshed_at.items()}
+
+    def summary_count(self):
+        with self._lock:
+            return len(self._summaries)
+
+
+class PrefetchScheduler:
+    """背景預取排程器，定期刷新所有來源並預先處理文章到新聞池"""
+
+    def __init__(self, news_processor, news_pool, interval=PREFETCH_INTERVAL, keywords=None):
+        self.news_processor = news_processor
+        self.news_pool = news_pool
+        self.interval = interval
+        self.keywords = keywords or news_pool.keywords
+        # 新聞池依此判斷哪些查詢可以直接回應
+        news_pool.keywords = list(self.keywords)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._source_stats = {}  # 來源名稱 -> 最近一次抓取的耗時、數量與錯誤
+        self._last_refresh = None
+        self._refresh_count = 0
+
+    def start(self):
+        """啟動背景刷新執行緒"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="news-prefetch", daemon=True)
+        self._thread.start()
+        print(f"預取排程器已啟動，刷新間隔: {self.interval} 秒")
+
+    def stop(self, timeout=None):
+        """停止背景刷新執行緒"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_once()
+            except Exception as e:
+                print(f"預取刷新失敗: {e}")
+            self._stop_event.wait(self.interval)
+
+    def refresh_once(self):
+        """刷新所有來源並為新文章預先生成摘要"""
+        started = time.time()
+        results = self.news_processor.fetch_all_sources(self.keywords)
+        for name, result in results.items():
+            self._source_stats[name] = {
+                'fetch_duration': result['duration'],
+                'count': len(result['articles']),
+                'error': result['error'],
+            }
+            # 客戶端會吞掉網路錯誤並回傳空列表，因此空結果不覆蓋上一次的有效資料
+            if result['error'] is None and result['articles']:
+                self.news_pool.update_source(name, result['articles'])
+        fetch_duration = time.time() - started
+
+        summarize_started = time.time()
+        pending = [
+            article for article in self.news_pool.articles()
+            if self.news_pool.get_summary(article.url) is None
+        ]
+        summarized = 0
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(pending))) as executor:
+                future_to_article = {
+                    executor.submit(self.news_processor.process_article, article): article
+                    for article in pending
+                }
+                for future in as_completed(future_to_article):
+                    try:
+                        news_item = future.result()
+                        # 只有標題和連結的項目（下載或解析失敗）不放進新聞池，下次刷新時重試
+                        if news_item is not None and news_item.summary is not None:
+                            self.news_pool.put_summary(news_item.url, news_item)
+                            if self.news_processor.search_index is not None:
+                                self.news_processor.search_index.add([news_item])
+                            summarized += 1
+                    except Exception as e:
+                        print(f"預取處理文章失敗: {e}")
+
+        self._refresh_count += 1
+        self._last_refresh = {
+            'started_at': started,
+            'fetch_duration': fetch_duration,
+            'summarize_duration': time.time() - summarize_started,
+            'total_duration': time.time() - started,
+            'articles_summarized': summarized,
+        }
+        print(f"預取完成，耗時 {self._last_refresh['total_duration']:.1f} 秒，新增 {summarized} 則摘要")
+        return self._last_refresh
+
+    def get_status(self):
+        """回傳刷新間隔、各來源過期時間與最近一次刷新耗時"""
+        staleness = self.news_pool.staleness()
+        sources = {}
+        for name, stats in self._source_stats.items():
+            sources[name] = dict(stats, staleness=staleness.get(name))
+        return {
+            'interval': self.interval,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'refresh_count': self._refresh_count,
+            'last_refresh': self._last_refresh,
+            'summaries': self.news_pool.summary_count(),
+            'sources': sources,
+        }
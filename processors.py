@@ -1,26 +1,53 @@
 from clients import AMDAPIClient, NvidiaAPIClient, RSSClient, ArticleClient
-import psutil
+from clients.matcher import get_matcher, normalize_text
+from clients.metrics import metrics
+from clients.singleflight import SingleFlight
+from clients.sources import get_default_registry
+from ranking import rank_news
 import os
+import time
 
 # 常量定義
 DEFAULT_KEYWORDS = ["gpu", "電腦", "ai", "workstation", "顯卡"]
 DEFAULT_USER_AGENT = 'Mozilla/5.0'
 REQUEST_TIMEOUT = 15
 RSS_TIMEOUT = 10
+MAX_NEWS_ITEMS = 4  # 每次查詢最多送出的新聞數（預設每個來源一則）
+MAX_SOURCE_WORKERS = 8  # 同時抓取的來源數上限，同一主機另受來源設定的 host_limit 限制
+MAX_ARTICLE_WORKERS = 6
+GLOBAL_DEADLINE = 25  # 整個查詢的延遲預算（秒），到期後未完成的文章只回傳標題和連結
 
 def get_memory_usage():
     """獲取當前內存使用情況"""
+    import psutil
     process = psutil.Process(os.getpid())
     return process.memory_info().rss / 1024 / 1024  # MB
 
+def remaining_time(deadline_at):
+    """回傳距離期限（time.monotonic() 時間）的剩餘秒數，沒有期限時回傳 None"""
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - time.monotonic())
+
+def matching_articles(articles, keywords):
+    """回傳所有標題包含任一關鍵字的文章"""
+    matcher = get_matcher(keywords)
+    return [article for article in articles if matcher.matches(article.title)]
+
 class NewsProcessor:
     """新聞處理器類別，負責所有新聞抓取和處理邏輯"""
 
-    def __init__(self, amd_client, nvidia_client, rss_client, article_client):
+    def __init__(self, amd_client, nvidia_client, rss_client, article_client, news_pool=None,
+                 search_index=None, sources=None, deadline=GLOBAL_DEADLINE):
         self.amd_client = amd_client
         self.nvidia_client = nvidia_client
         self.rss_client = rss_client
         self.article_client = article_client
+        self.news_pool = news_pool
+        self.search_index = search_index
+        self.sources = sources if sources is not None else get_default_registry()
+        self.deadline = deadline
+        self._news_flight = SingleFlight()
 
     def process_article(self, article):
         """處理單篇文章，生成摘要"""
@@ -34,193 +61,309 @@ class NewsProcessor:
         """使用 NVIDIA WordPress API 獲取新聞（帶關鍵字搜尋）"""
         return self.nvidia_client.get_news()
 
-    def get_intel_news(self, keywords=None, filter_at_source=True):
-        """獲取多來源新聞，為每個來源選擇1則最符合關鍵字且最新的新聞"""
-        print(f"開始獲取新聞，當前內存使用: {get_memory_usage():.1f} MB")
+    def source_names(self):
+        """回傳所有新聞來源名稱"""
+        return self.sources.names()
+
+    def fetch_source(self, source, keywords):
+        """依來源類型抓取單一來源：rss、wordpress（NVIDIA 部落格）或 coveo（AMD 新聞稿）"""
+        if source.type == 'rss':
+            # 有搜尋索引時讀完整個 feed，索引才能回應其他關鍵字的查詢
+            return self.rss_client.get_news([source], keywords, filter_at_source=True,
+                                            early_stop=self.search_index is None)
+        if source.type == 'wordpress':
+            return self.nvidia_client.get_news(source, keywords)
+        return self.amd_client.get_news(source, keywords)
+
+    def fetch_all_sources(self, keywords=None, sources=None, deadline_at=None):
+        """並發抓取所有來源（或 sources 指定的來源），回傳 {來源名稱: {'articles': 文章列表, 'duration': 耗時秒數, 'error': 錯誤訊息}}
 
+        設定 deadline_at（time.monotonic() 時間）時，期限到仍未回應的來源會被放棄並標記錯誤
+        """
         if not keywords:
             keywords = DEFAULT_KEYWORDS
 
-        selected_news = []
-
-        # 並發獲取所有來源的新聞
-        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from concurrent.futures import (
+            ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+        )
 
-        def fetch_rss_source(source):
-            """獲取單個RSS來源的新聞"""
+        def timed(source):
+            started = time.time()
             try:
-                rss_articles = self.rss_client.get_news([source], keywords, filter_at_source=True)
-                if rss_articles:
-                    return rss_articles[0]  # 取最新的1則
-                return None
+                # 同一主機的多個來源共用並發上限
+                with self.sources.limit(source.url):
+                    with metrics.span('source_fetch', source=source.name):
+                        articles = self.fetch_source(source, keywords)
+                return {'articles': articles, 'duration': time.time() - started, 'error': None}
             except Exception as e:
-                print(f"Error fetching from {source['name']}: {e}")
-                return None
+                return {'articles': [], 'duration': time.time() - started, 'error': str(e)}
+
+        selected = [source for source in self.sources if sources is None or source.name in sources]
+        if not selected:
+            return {}
+
+        results = {}
+        started = time.monotonic()
+        # 不使用 with：離開 with 區塊會等待所有工作完成，期限到時需要直接放棄仍在抓取的來源
+        executor = ThreadPoolExecutor(max_workers=min(MAX_SOURCE_WORKERS, len(selected)))
+        future_to_source = {
+            metrics.submit(executor, timed, source, pool='sources'): source.name
+            for source in selected
+        }
+        try:
+            for future in as_completed(future_to_source, timeout=remaining_time(deadline_at)):
+                source_name = future_to_source[future]
+                results[source_name] = future.result()
+                if results[source_name]['error']:
+                    print(f"Error fetching from {source_name}: {results[source_name]['error']}")
+                else:
+                    self.index_source(source_name, results[source_name]['articles'], keywords)
+        except FuturesTimeoutError:
+            abandoned = [name for name in future_to_source.values() if name not in results]
+            print(f"超過期限，放棄 {len(abandoned)} 個未回應的來源: {', '.join(abandoned)}")
+            for name in abandoned:
+                results[name] = {
+                    'articles': [], 'duration': time.monotonic() - started,
+                    'error': 'deadline exceeded',
+                }
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def index_source(self, name, articles, keywords=None):
+        """把來源本次抓取看到的所有項目加入搜尋索引，RSS 也包含未通過關鍵字篩選的項目；
+        搜尋 API 來源只把這次搜尋的關鍵字標記為最新
+        """
+        if self.search_index is None:
+            return
+        entries = articles
+        searched = None
+        source = self.sources.get(name)
+        if source is not None and source.type == 'rss':
+            entries = self.rss_client.recent_entries(source)
+        elif source is not None:
+            searched = self.searched_keywords(source, keywords or DEFAULT_KEYWORDS)
+        # 客戶端會吞掉網路錯誤並回傳空列表，空結果不把來源標記為最新
+        if entries:
+            self.search_index.update_source(name, entries, keywords=searched)
+
+    def searched_keywords(self, source, keywords):
+        """搜尋 API 來源（wordpress、coveo）實際送出的關鍵字，RSS 來源回傳 None"""
+        if source.type == 'wordpress':
+            return self.nvidia_client.search_keywords(source, keywords)
+        if source.type == 'coveo':
+            return self.amd_client.search_keywords(source, keywords)
+        return None
+
+    def candidates_from_index(self, keywords):
+        """從搜尋索引取出未過期來源中所有符合關鍵字的項目，回傳 (候選項目, 需要即時抓取的來源)
+
+        搜尋 API 來源只有在同一組關鍵字最近搜尋過時才從索引回應，其他關鍵字一律即時搜尋
+        """
+        if self.search_index is None:
+            return [], self.source_names()
+        searches = {}
+        for source in self.sources:
+            searched = self.searched_keywords(source, keywords or DEFAULT_KEYWORDS)
+            if searched is not None:
+                searches[source.name] = searched
+        fresh = set(self.search_index.fresh_sources(searches))
+        candidates = self.search_index.search(keywords, sources=fresh)
+        return candidates, [name for name in self.source_names() if name not in fresh]
+
+    def rank_candidates(self, candidates, keywords, k=MAX_NEWS_ITEMS):
+        """依關鍵字命中、新鮮度與來源均衡排序，只回傳要送出的前 k 則"""
+        ranked = rank_news(candidates, keywords, k)
+        for item, details in ranked:
+            print(f"  排序 {details['final_score']:.2f} ({item.source}): {item.title[:60]}")
+        return [item for item, _ in ranked]
+
+    def explain_ranking(self, keywords=None, k=MAX_NEWS_ITEMS):
+        """以新聞池與搜尋索引中的候選項目計算排序，回傳分數明細供除錯（不會即時抓取）"""
+        if not keywords:
+            keywords = DEFAULT_KEYWORDS
+        candidates = self.news_pool.select(keywords) if self.news_pool is not None else []
+        candidates += self.candidates_from_index(keywords)[0]
+        return [
+            dict(details, title=item.title, url=item.url, source=item.source,
+                 published=item.published)
+            for item, details in rank_news(candidates, keywords, k)
+        ]
 
-        def fetch_amd_news():
-            """獲取AMD新聞"""
-            try:
-                amd_articles = self.scrape_amd_news()
-                matching_amd = [
-                    article for article in amd_articles
-                    if any(keyword.lower() in article.get('title', '').lower() for keyword in keywords)
-                ]
-                if matching_amd:
-                    return {
-                        'title': matching_amd[0]['title'],
-                        'url': matching_amd[0]['url'],
-                        'source': 'AMD'
-                    }
-                return None
-            except Exception as e:
-                print(f"Error processing AMD articles: {e}")
-                return None
+    def store_summary(self, news_item):
+        """保存生成好的摘要到新聞池與搜尋索引；只有標題和連結的項目不保存，下次查詢會重試"""
+        if news_item.summary is None:
+            return
+        if self.news_pool is not None:
+            self.news_pool.put_summary(news_item.url, news_item)
+        if self.search_index is not None:
+            self.search_index.add([news_item])
+
+    def get_intel_news(self, keywords=None, filter_at_source=True, deadline=None, on_item=None):
+        """獲取多來源新聞，依關鍵字命中、新鮮度與來源均衡選出最多 MAX_NEWS_ITEMS 則
+
+        deadline 為整個查詢的延遲預算（秒，預設 self.deadline），到期時放棄未完成的來源與文章，
+        尚未生成摘要的文章只回傳標題和連結。on_item 會在每則新聞就緒時立即被呼叫，
+        讓呼叫端不必等全部文章完成就能先送出第一則。
+        相同關鍵字組合的並發請求會合併為一次計算並共享結果
+        """
+        if not keywords:
+            keywords = DEFAULT_KEYWORDS
+        deadline_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        executed = []
 
-        def fetch_nvidia_news():
-            """獲取NVIDIA新聞"""
+        def deliver(news_item):
+            if on_item is None:
+                return
+            # 計算可能與其他呼叫者共享，單一呼叫者的回呼失敗不能中斷查詢
             try:
-                nvidia_articles = self.scrape_nvidia_news()
-                matching_nvidia = [
-                    article for article in nvidia_articles
-                    if any(keyword.lower() in article.get('title', '').lower() for keyword in keywords)
-                ]
-                if matching_nvidia:
-                    return {
-                        'title': matching_nvidia[0]['title'],
-                        'url': matching_nvidia[0]['url'],
-                        'source': 'NVIDIA'
-                    }
-                return None
+                on_item(news_item)
             except Exception as e:
-                print(f"Error processing NVIDIA articles: {e}")
-                return None
-
-        # RSS feed 來源
-        rss_sources = [
-            {'name': 'Intel', 'url': 'https://newsroom.intel.com/zh-tw/feed/', 'type': 'rss'},
-            {'name': 'Tom\'s Hardware', 'url': 'https://www.tomshardware.com/feeds/all', 'type': 'rss'},
-        ]
-
-        # 並發執行所有來源的獲取任務
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            # 提交所有任務
-            future_to_source = {}
-
-            # RSS來源任務
-            for source in rss_sources:
-                future = executor.submit(fetch_rss_source, source)
-                future_to_source[future] = source['name']
-
-            # AMD任務
-            amd_future = executor.submit(fetch_amd_news)
-            future_to_source[amd_future] = 'AMD'
+                print(f"新聞回呼失敗: {e}")
+
+        def fetch(*args):
+            executed.append(True)
+            return self._fetch_intel_news(*args)
+
+        normalized = tuple(sorted({normalize_text(keyword.strip()) for keyword in keywords}))
+        flight_key = (normalized, filter_at_source)
+        with metrics.trace('news_request', keywords=list(keywords)):
+            news_list = list(self._news_flight.do(
+                flight_key, fetch, keywords, filter_at_source, deadline_at, deliver
+            ))
+            # 執行查詢的呼叫者已在處理過程中收到每一則（async 引擎期限後的推播仍在背景執行），
+            # 被合併的呼叫者在結果完成後補送
+            if not executed:
+                for news_item in news_list:
+                    deliver(news_item)
+        return news_list
 
-            # NVIDIA任務
-            nvidia_future = executor.submit(fetch_nvidia_news)
-            future_to_source[nvidia_future] = 'NVIDIA'
+    def get_coalescing_stats(self):
+        """回傳新聞查詢與文章處理被合併的次數"""
+        return {
+            'news': self._news_flight.stats(),
+            'articles': self.article_client.get_coalescing_stats(),
+        }
 
-            # 收集結果
-            for future in as_completed(future_to_source):
-                source_name = future_to_source[future]
-                try:
-                    result = future.result(timeout=15)  # 15秒超時
-                    if result:
-                        selected_news.append(result)
-                        print(f"{source_name}: 找到 1 則符合關鍵字的新聞")
-                except Exception as e:
-                    print(f"Error getting result from {source_name}: {e}")
+    def _fetch_intel_news(self, keywords, filter_at_source, deadline_at=None, on_item=None):
+        print(f"開始獲取新聞，當前內存使用: {get_memory_usage():.1f} MB")
 
-        print(f"各來源篩選完成，共 {len(selected_news)} 篇文章")
+        # 新聞池已預熱且涵蓋查詢的關鍵字時直接從池中選取，其他查詢走搜尋索引與即時抓取
+        if self.pool_covers(keywords):
+            candidates = self.news_pool.select(keywords)
+            if candidates:
+                print(f"使用預取新聞池，共 {len(candidates)} 篇候選文章")
+                selected = self.rank_candidates(candidates, keywords)
+                return self.process_selected(selected, deadline_at, on_item)
+
+        # 搜尋索引涵蓋的來源直接回應，只有過期的來源才即時抓取補齊
+        candidates, stale_sources = self.candidates_from_index(keywords)
+        if candidates:
+            print(f"從搜尋索引找到 {len(candidates)} 篇候選文章")
+        if stale_sources:
+            results = self.fetch_all_sources(keywords, stale_sources, deadline_at)
+            for source_name, result in results.items():
+                matches = matching_articles(result['articles'], keywords)
+                if matches:
+                    candidates.extend(matches)
+                    print(f"{source_name}: 找到 {len(matches)} 則符合關鍵字的新聞")
+
+        print(f"各來源篩選完成，共 {len(candidates)} 篇候選文章")
 
         # 如果沒有文章，返回空列表
-        if not selected_news:
+        if not candidates:
             print("沒有找到符合條件的新聞")
             return []
 
-        # 並行處理選定的文章 - 增加並發數並減少超時時間
-        news_list = []
+        # 只下載與摘要排序後真正會送出的文章
+        selected = self.rank_candidates(candidates, keywords)
+        return self.process_selected(selected, deadline_at, on_item)
 
-        # 增加並發數，減少超時時間以提升響應速度
-        max_workers = min(6, len(selected_news))  # 增加到6個並發線程
+    def pool_covers(self, keywords):
+        """新聞池已預熱且只以預取關鍵字篩選過，自訂關鍵字（例如 radeon）的結果不在池中"""
+        if self.news_pool is None:
+            return False
+        return self.news_pool.is_warm() and self.news_pool.covers(keywords)
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.process_article, article) for article in selected_news]
-            for future in as_completed(futures):
-                try:
-                    news_item = future.result(timeout=20)  # 減少到20秒超時
-                    if news_item and news_item.strip():
-                        news_list.append(news_item)
-                except Exception as e:
-                    print(f"Error processing article: {e}")
-                    continue
+    def process_selected(self, selected_news, deadline_at=None, on_item=None):
+        """並行處理選定的文章，優先使用新聞池中預先生成的摘要，依輸入（排序）順序回傳 NewsItem 列表
 
+        每則新聞完成時呼叫 on_item；超過 deadline_at 仍未完成的文章改以標題和連結回傳（同樣呼叫 on_item），
+        背景執行緒完成後的摘要仍會寫入文章緩存供下次查詢使用
+        """
+        from concurrent.futures import (
+            ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+        )
+
+        results = {}
+        pending = []
+        for article in selected_news:
+            cached = self.news_pool.get_summary(article.url) if self.news_pool is not None else None
+            metrics.inc('summary_lookups_total',
+                        result='pool_hit' if cached is not None else 'pool_miss')
+            if cached is not None:
+                results[article.url] = cached
+                if on_item is not None:
+                    on_item(cached)
+            else:
+                pending.append(article)
+
+        if pending:
+            executor = ThreadPoolExecutor(max_workers=min(MAX_ARTICLE_WORKERS, len(pending)))
+            future_to_article = {
+                metrics.submit(executor, self.process_article, article, pool='articles'): article
+                for article in pending
+            }
+            try:
+                # as_completed 只會產出已完成的 future，期限需要加在 as_completed 本身
+                for future in as_completed(future_to_article, timeout=remaining_time(deadline_at)):
+                    try:
+                        news_item = future.result()
+                    except Exception as e:
+                        print(f"Error processing article: {e}")
+                        continue
+                    if news_item is not None:
+                        results[future_to_article[future].url] = news_item
+                        self.store_summary(news_item)
+                        if on_item is not None:
+                            on_item(news_item)
+            except FuturesTimeoutError:
+                unfinished = [article for article in pending if article.url not in results]
+                print(f"超過期限，{len(unfinished)} 篇文章尚未完成摘要，只回傳標題和連結")
+                for article in unfinished:
+                    results[article.url] = article.with_summary(None)
+                    if on_item is not None:
+                        on_item(results[article.url])
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        news_list = [results[article.url] for article in selected_news if article.url in results]
         print(f"處理完成，生成 {len(news_list)} 條新聞，內存使用: {get_memory_usage():.1f} MB")
         return news_list
 
-    def get_keyword_filtered_news(self, news_list, keywords, target_count=5, already_filtered=False):
-        """篩選包含關鍵字的新聞，確保每個來源至少一篇，然後隨機補充到指定數量
+    def get_keyword_filtered_news(self, news_list, keywords, target_count=5,
+                                  already_filtered=False):
+        """篩選包含關鍵字的新聞，依關鍵字命中、新鮮度與來源均衡排序後取前 target_count 則
 
         Args:
-            news_list: 新聞列表
+            news_list: NewsItem 列表
             keywords: 關鍵字列表
             target_count: 目標數量
             already_filtered: 是否已經在來源層級進行過關鍵字篩選
         """
-        import random
-
         print(f"開始關鍵字過濾，共 {len(news_list)} 條新聞，關鍵字: {keywords}")
 
-        # 按來源分組新聞
-        source_groups = {}
+        candidates = []
+        matcher = get_matcher(keywords)
         for news_item in news_list:
-            if news_item.strip() and not news_item.startswith("Error"):
-                # 如果已經在來源層級篩選過，就不需要再次檢查關鍵字
-                if already_filtered or any(keyword.lower() in news_item.lower() for keyword in keywords):
-                    # 從新聞中提取來源
-                    source_start = news_item.find("(來源: ") + 5
-                    source_end = news_item.find(")", source_start)
-                    if source_start > 4 and source_end > source_start:
-                        source = news_item[source_start:source_end]
-                        if source not in source_groups:
-                            source_groups[source] = []
-                        source_groups[source].append(news_item.strip())
-                        print(f"  添加 {source} 新聞到組")
-                    else:
-                        print(f"  無法提取來源: {news_item[:100]}...")
-                else:
-                    print(f"  跳過不包含關鍵字的新聞: {news_item[:100]}...")
+            if news_item is None or not news_item.source:
+                print(f"  跳過無效新聞: {news_item!r}")
+                continue
+            # 如果已經在來源層級篩選過，就不需要再次檢查關鍵字；否則只比對標題與摘要欄位
+            if already_filtered or matcher.matches(news_item.title, news_item.summary):
+                candidates.append(news_item)
             else:
-                print(f"  跳過無效新聞: {news_item[:50]}...")
-
-        print(f"來源分組結果: {dict((k, len(v)) for k, v in source_groups.items())}")
-
-        # 確保每個來源至少有一篇
-        selected_news = []
-        available_sources = list(source_groups.keys())
-
-        # 第一輪：每個來源選一篇
-        for source in available_sources:
-            if source_groups[source]:
-                # 隨機選一篇
-                selected = random.choice(source_groups[source])
-                selected_news.append(selected)
-                source_groups[source].remove(selected)
-
-        # 如果來源數量超過目標數量，隨機選擇需要的來源
-        if len(selected_news) > target_count:
-            selected_news = random.sample(selected_news, target_count)
-        elif len(selected_news) < target_count:
-            # 需要補充的新聞數量
-            remaining_slots = target_count - len(selected_news)
-
-            # 收集所有剩餘的新聞
-            remaining_news = []
-            for source in available_sources:
-                remaining_news.extend(source_groups[source])
-
-            # 隨機選擇補充的新聞
-            if remaining_news:
-                additional_news = random.sample(remaining_news, min(remaining_slots, len(remaining_news)))
-                selected_news.extend(additional_news)
-
-        return selected_news
\ No newline at end of file
+                print(f"  跳過不包含關鍵字的新聞: {news_item.title[:100]}")
+
+        # 來源均衡懲罰讓每個來源先各選一篇，再依分數補充到指定數量
+        return self.rank_candidates(candidates, keywords, k=target_count)
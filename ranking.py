@@ -0,0 +1,76 @@
+"""
+新聞排序
+依關鍵字命中、發布時間與來源均衡為候選新聞計分，以 heap 選出前 k 則，只摘要真正會送出的文章
+"""
+
+import heapq
+import time
+
+from clients.matcher import get_matcher
+
+# 常量定義
+TITLE_HIT_WEIGHT = 2.0  # 標題每命中一個關鍵字的分數
+SUMMARY_HIT_WEIGHT = 0.5  # 只出現在摘要中的關鍵字
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE = 3 * 24 * 3600  # 發布3天後新鮮度分數減半
+UNKNOWN_RECENCY = 0.25  # 沒有發布時間的項目視為中等新鮮
+SOURCE_PENALTY = 3.0  # 同一來源每多選一則扣的分數，確保先輪過每個來源
+
+
+def score_item(item, matcher, now=None):
+    """回傳單則新聞不含來源均衡的分數明細"""
+    now = now or time.time()
+    title_hits = matcher.find(item.title)
+    summary_hits = [keyword for keyword in matcher.find(item.summary) if keyword not in title_hits]
+    keyword_score = TITLE_HIT_WEIGHT * len(title_hits) + SUMMARY_HIT_WEIGHT * len(summary_hits)
+    if item.published:
+        recency = 0.5 ** (max(0.0, now - item.published) / RECENCY_HALF_LIFE)
+    else:
+        recency = UNKNOWN_RECENCY
+    return {
+        'keywords': title_hits + summary_hits,
+        'keyword_score': keyword_score,
+        'recency_score': RECENCY_WEIGHT * recency,
+        'score': keyword_score + RECENCY_WEIGHT * recency,
+    }
+
+
+def rank_news(items, keywords, k, now=None, source_penalty=SOURCE_PENALTY):
+    """選出前 k 則新聞，回傳 [(NewsItem, 分數明細)]
+
+    每個來源各自維護一個 heap，全域 heap 只放各來源目前最好的一則；
+    選出某來源的項目後，該來源下一則的分數扣除 source_penalty 再放回全域 heap
+    """
+    matcher = get_matcher(keywords)
+    now = now or time.time()
+    by_source = {}
+    seen_urls = set()
+    for item in items:
+        if item.url in seen_urls:
+            continue
+        seen_urls.add(item.url)
+        details = score_item(item, matcher, now)
+        # 分數相同時以網址排序，讓結果穩定可重現
+        by_source.setdefault(item.source, []).append((-details['score'], item.url, item, details))
+    for heap in by_source.values():
+        heapq.heapify(heap)
+
+    frontier = []
+    for source, heap in by_source.items():
+        negative_score, url, _, _ = heap[0]
+        heapq.heappush(frontier, (negative_score, url, source))
+
+    ranked = []
+    picked = {}
+    while frontier and len(ranked) < k:
+        _, _, source = heapq.heappop(frontier)
+        _, _, item, details = heapq.heappop(by_source[source])
+        penalty = source_penalty * picked.get(source, 0)
+        details = dict(details, source_penalty=penalty, final_score=details['score'] - penalty)
+        ranked.append((item, details))
+        picked[source] = picked.get(source, 0) + 1
+        if by_source[source]:
+            negative_score, url, _, _ = by_source[source][0]
+            next_score = negative_score + source_penalty * picked[source]
+            heapq.heappush(frontier, (next_score, url, source))
+    return ranked
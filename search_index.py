@@ -0,0 +1,238 @@
+"""
+本地新聞倒排索引
+保存各來源抓取過的所有項目（標題、摘要、發布時間、來源），關鍵字查詢直接從索引回應，只有過期的來源才需要即時抓取
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+from clients.matcher import get_matcher, normalize_text
+from clients.models import NewsItem
+
+# 常量定義
+INDEX_MAX_AGE = 900  # 來源超過15分鐘未成功更新時需要即時抓取補齊
+MAX_DOCUMENTS = 2000
+EVICT_BATCH = 200  # 超過上限時一次淘汰最舊的200則，避免每次新增都排序
+SAVE_INTERVAL = 60  # 持久化時最多每60秒寫入一次
+INDEX_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿㐀-䶿]+')
+CJK_PATTERN = re.compile(r'[一-鿿㐀-䶿]')
+
+
+def index_tokens(text):
+    """英文以單字（並加入去掉複數 s 的形式）、中文以單字與雙字（bigram）建立索引詞"""
+    tokens = set()
+    for run in INDEX_TOKEN_PATTERN.findall(normalize_text(text or '')):
+        if CJK_PATTERN.match(run):
+            tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+            if len(run) > 3 and run.endswith('s'):
+                tokens.add(run[:-1])
+    return tokens
+
+
+def query_tokens(keyword):
+    """查詢詞：中文超過一個字時只用雙字，英文使用完整單字"""
+    tokens = set()
+    for run in INDEX_TOKEN_PATTERN.findall(normalize_text(keyword)):
+        if CJK_PATTERN.match(run) and len(run) > 1:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.add(run)
+    return tokens
+
+
+def keyword_scope(keywords):
+    """關鍵字組合的正規化鍵（全形半形、大小寫、順序），作為搜尋 API 來源的新鮮度單位"""
+    normalized = {normalize_text(keyword.strip()) for keyword in keywords if keyword.strip()}
+    return '\n'.join(sorted(normalized))
+
+
+class SearchIndex:
+    """執行緒安全、可增量更新的倒排索引，可選擇保存到 JSON 檔案"""
+
+    def __init__(self, path=None, max_documents=MAX_DOCUMENTS, max_age=INDEX_MAX_AGE):
+        self.path = path
+        self.max_documents = max_documents
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._documents = {}  # url -> NewsItem
+        self._tokens = {}  # url -> 該文件的索引詞
+        self._postings = {}  # 索引詞 -> url 集合
+        self._indexed_at = {}  # url -> 加入索引的時間
+        self._refreshed_at = {}  # 來源名稱 -> 最後成功更新時間
+        self._searched_at = {}  # 搜尋 API 來源名稱 -> {關鍵字組合: 最後成功搜尋時間}
+        self._last_saved = 0
+        self._stats = {'queries': 0, 'updates': 0, 'evictions': 0}
+        if path and os.path.exists(path):
+            self.load()
+
+    def _index(self, item):
+        """加入或更新單則文件，呼叫端需持有鎖"""
+        existing = self._documents.get(item.url)
+        if existing is not None and item.summary is None and existing.summary is not None:
+            # 來源重新抓取時不會帶摘要，保留之前生成的摘要
+            item = item.with_summary(existing.summary, existing.resolved_url, existing.timings)
+        tokens = index_tokens(item.title) | index_tokens(item.summary)
+        for token in self._tokens.get(item.url, set()) - tokens:
+            self._postings[token].discard(item.url)
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(item.url)
+        self._documents[item.url] = item
+        self._tokens[item.url] = tokens
+        self._indexed_at.setdefault(item.url, time.time())
+
+    def _remove(self, url):
+        for token in self._tokens.pop(url, ()):
+            urls = self._postings[token]
+            urls.discard(url)
+            if not urls:
+                del self._postings[token]
+        del self._documents[url]
+        del self._indexed_at[url]
+
+    def _evict(self):
+        """超過上限時淘汰發布時間（沒有時使用加入時間）最舊的文件"""
+        if len(self._documents) <= self.max_documents:
+            return
+        oldest = sorted(
+            self._documents, key=lambda url: self._documents[url].published or self._indexed_at[url]
+        )
+        for url in oldest[:len(self._documents) - self.max_documents + EVICT_BATCH]:
+            self._remove(url)
+            self._stats['evictions'] += 1
+
+    def add(self, items):
+        """加入或更新文件（例如剛生成摘要的 NewsItem）"""
+        with self._lock:
+            for item in items:
+                self._index(item)
+            self._evict()
+        self._maybe_save()
+
+    def update_source(self, name, items, keywords=None):
+        """加入單一來源剛抓取的所有項目並標記該來源為最新
+
+        搜尋 API 來源只回傳與搜尋關鍵字相關的結果，傳入 keywords 時只標記這組關鍵字為最新
+        """
+        with self._lock:
+            for item in items:
+                self._index(item)
+            self._evict()
+            now = time.time()
+            if keywords is None:
+                self._refreshed_at[name] = now
+            else:
+                searched = self._searched_at.setdefault(name, {})
+                for scope in [scope for scope, ts in searched.items() if now - ts >= self.max_age]:
+                    del searched[scope]
+                searched[keyword_scope(keywords)] = now
+            self._stats['updates'] += 1
+        self._maybe_save()
+
+    def fresh_sources(self, searches=None):
+        """回傳尚未過期的來源名稱
+
+        searches 為 {搜尋 API 來源名稱: 查詢會送出的關鍵字}，這些來源只有在同一組關鍵字
+        期限內搜尋過時才算最新，其他關鍵字需要即時搜尋
+        """
+        searches = searches or {}
+        now = time.time()
+        with self._lock:
+            fresh = [
+                name for name, ts in self._refreshed_at.items()
+                if name not in searches and now - ts < self.max_age
+            ]
+            for name, keywords in searches.items():
+                searched_at = self._searched_at.get(name, {}).get(keyword_scope(keywords))
+                if searched_at is not None and now - searched_at < self.max_age:
+                    fresh.append(name)
+        return fresh
+
+    def search(self, keywords, sources=None):
+        """回傳標題或摘要包含任一關鍵字的文件，依發布時間由新到舊排序"""
+        matcher = get_matcher(keywords)
+        with self._lock:
+            self._stats['queries'] += 1
+            matched = set()
+            unverified = {}  # 多個查詢詞的關鍵字 -> 候選 url，需再確認詞序
+            for keyword in matcher.keywords:
+                tokens = query_tokens(keyword)
+                if not tokens:
+                    unverified[keyword] = set(self._documents)
+                    continue
+                postings = sorted((self._postings.get(token, set()) for token in tokens), key=len)
+                urls = set.intersection(*postings)
+                if len(tokens) == 1:
+                    matched.update(urls)
+                else:
+                    unverified[keyword] = urls
+            for keyword, urls in unverified.items():
+                keyword_matcher = get_matcher([keyword])
+                matched.update(
+                    url for url in urls - matched
+                    if keyword_matcher.matches(
+                        self._documents[url].title, self._documents[url].summary
+                    )
+                )
+            results = [
+                self._documents[url] for url in matched
+                if sources is None or self._documents[url].source in sources
+            ]
+        results.sort(key=lambda item: item.published or 0, reverse=True)
+        return results
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                documents=len(self._documents),
+                tokens=len(self._postings),
+                staleness={name: now - ts for name, ts in self._refreshed_at.items()},
+                searched_scopes={name: len(scopes) for name, scopes in self._searched_at.items()},
+                path=self.path,
+            )
+        return stats
+
+    def _maybe_save(self):
+        if self.path and time.time() - self._last_saved >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """寫入暫存檔後再取代，避免程式中斷時留下不完整的索引檔"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                'documents': [item.to_dict() for item in self._documents.values()],
+                'refreshed_at': dict(self._refreshed_at),
+                'searched_at': {name: dict(scopes) for name, scopes in self._searched_at.items()},
+            }
+            self._last_saved = time.time()
+        with self._save_lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def load(self):
+        """從索引檔重建倒排索引，檔案損毀時從空索引開始"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"無法載入搜尋索引 {self.path}: {e}")
+            return
+        with self._lock:
+            for document in data.get('documents', []):
+                self._index(NewsItem.from_dict(document))
+            self._refreshed_at.update(data.get('refreshed_at', {}))
+            for name, scopes in data.get('searched_at', {}).items():
+                self._searched_at.setdefault(name, {}).update(scopes)
+        print(f"已載入搜尋索引，共 {len(self._documents)} 則")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+冷啟動最佳化
+newspaper、lxml、feedparser、psutil 與 aiohttp 延遲到第一次使用才匯入；服務開始接受請求後由背景執行緒預熱
+（匯入重量級模組、載入 jieba 詞典與摘要引擎、從快照還原文章緩存），並提供匯入耗時報告追蹤冷啟動回歸
+
+使用方式: python -m startup --top 15 --max-ms 1500
+"""
+
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from clients.article_client import warm_up
+
+# 常量定義
+WARMUP_MODULES = ('feedparser', 'lxml.html', 'nltk', 'newspaper', 'psutil')
+WARMUP_DELAY = 0  # 預熱開始前等待的秒數
+SNAPSHOT_MAX_ENTRIES = 500
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+REPORT_TOP = 15
+REPORT_ERROR_LINES = 20
+CREATE_APP_SCRIPT = (
+    "import json, time; started = time.perf_counter(); from news_bot import create_app; "
+    "imported = time.perf_counter(); create_app(); "
+    "print(json.dumps({'import': imported - started, "
+    "'create_app': time.perf_counter() - imported}))"
+)
+
+
+def save_cache_snapshot(cache, path, max_entries=SNAPSHOT_MAX_ENTRIES):
+    """把記憶體緩存中最近使用的項目寫成 JSON 快照，回傳寫入筆數；sqlite 與 redis 後端本身就會保留，不需要快照"""
+    if not hasattr(cache, 'dump'):
+        return 0
+    entries = cache.dump()[-max_entries:]
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'saved_at': time.time(), 'entries': entries}, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return len(entries)
+
+
+def load_cache_snapshot(cache, path):
+    """從快照還原文章緩存，回傳還原筆數"""
+    if not hasattr(cache, 'load') or not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return cache.load(data.get('entries', []))
+
+
+class Warmup:
+    """在背景預熱重量級模組並還原文章緩存，讓第一個使用者不必負擔初始化成本"""
+
+    def __init__(self, container, snapshot_path=None, modules=WARMUP_MODULES, delay=WARMUP_DELAY):
+        self.container = container
+        self.snapshot_path = snapshot_path
+        self.modules = modules
+        self.delay = delay
+        self.steps = {}  # 步驟 -> 耗時（秒）
+        self.errors = {}
+        self.restored = 0
+        self.saved = 0
+        self.duration = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """啟動背景預熱執行緒"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._thread = threading.Thread(target=self.run, name="startup-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def run(self):
+        if self.delay:
+            time.sleep(self.delay)
+        started = time.perf_counter()
+        for module in self.modules:
+            self._step(f"import {module}", importlib.import_module, module)
+        if self.container.parse_pool is None:
+            # 解析行程池的 worker 啟動時已各自預熱
+            self._step('parse warm-up', warm_up, self.container.summarizer)
+        if self.snapshot_path:
+            self.restored = self._step('restore cache snapshot', load_cache_snapshot,
+                                       self.container.article_cache, self.snapshot_path) or 0
+        self.duration = time.perf_counter() - started
+        self._done.set()
+        print(f"啟動預熱完成，耗時 {self.duration:.2f} 秒，從快照還原 {self.restored} 篇文章摘要")
+
+    def _step(self, name, fn, *args):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"啟動預熱步驟失敗 {name}: {e}")
+        self.steps[name] = round(time.perf_counter() - started, 4)
+        return result
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def save_snapshot(self):
+        """結束時把文章緩存寫入快照，下次冷啟動時還原"""
+        if not self.snapshot_path:
+            return 0
+        try:
+            self.saved = save_cache_snapshot(self.container.article_cache, self.snapshot_path)
+            print(f"已將 {self.saved} 篇文章摘要寫入快照 {self.snapshot_path}")
+        except (OSError, TypeError, ValueError) as e:
+            print(f"無法寫入緩存快照 {self.snapshot_path}: {e}")
+        return self.saved
+
+    def get_status(self):
+        return {
+            'started': self._thread is not None,
+            'done': self._done.is_set(),
+            'duration': self.duration,
+            'steps': dict(self.steps),
+            'errors': dict(self.errors),
+            'restored': self.restored,
+            'snapshot_path': self.snapshot_path,
+            'deferred_modules': [module for module in self.modules if module not in sys.modules],
+        }
+
+
+def parse_importtime(output):
+    """解析 python -X importtime 的輸出，回傳 [(模組, 自身微秒, 累計微秒, 深度)]"""
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def import_report(module='news_bot'):
+    """在新的直譯器中匯入模組並建立 app，回傳匯入耗時報告"""
+    env = dict(os.environ, PREFETCH_ENABLED='false', DIGEST_ENABLED='false', STARTUP_WARMUP='false')
+    root = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=root, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {'module': module, 'error': failure_output(result.stderr)}
+    modules = parse_importtime(result.stderr)
+    total = next((cumulative for name, _, cumulative, _ in reversed(modules) if name == module), 0)
+    report = {
+        'module': module,
+        'total_ms': total / 1000,
+        'direct': sorted(
+            ((name, cumulative / 1000) for name, _, cumulative, depth in modules if depth == 1),
+            key=lambda item: item[1], reverse=True
+        ),
+        'self': sorted(
+            ((name, self_us / 1000) for name, self_us, _, _ in modules),
+            key=lambda item: item[1], reverse=True
+        ),
+        'heavy_loaded': [
+            name for name in WARMUP_MODULES + ('aiohttp',) if any(m[0] == name for m in modules)
+        ],
+    }
+    if module == 'news_bot':
+        timing = subprocess.run(
+            [sys.executable, '-c', CREATE_APP_SCRIPT], cwd=root, env=env, capture_output=True,
+            text=True
+        )
+        if timing.returncode != 0:
+            report['error'] = failure_output(timing.stderr)
+            return report
+        timings = json.loads(timing.stdout.splitlines()[-1])
+        report.update({f"{key}_ms": value * 1000 for key, value in timings.items()})
+    return report
+
+
+def failure_output(stderr):
+    """子行程失敗時的錯誤輸出，略過 -X importtime 的逐行紀錄"""
+    lines = [line for line in stderr.splitlines() if not line.startswith('import time:')]
+    return '\n'.join(lines[-REPORT_ERROR_LINES:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷啟動匯入耗時報告")
+    parser.add_argument('--module', default='news_bot', help="要量測的模組")
+    parser.add_argument('--top', type=int, default=REPORT_TOP, help="列出最耗時的模組數")
+    parser.add_argument('--max-ms', type=float, help="匯入總耗時超過此毫秒數時以結束碼 1 離開")
+    parser.add_argument('--json', action='store_true', help="以 JSON 輸出")
+    args = parser.parse_args()
+
+    report = import_report(args.module)
+    if 'error' in report and not args.json:
+        print(f"✗ 無法在子行程中匯入 {report['module']}（例如未設定 CHANNEL_ACCESS_TOKEN / CHANNEL_SECRET）:")
+        print(report['error'])
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"匯入 {report['module']}: {report['total_ms']:.0f} ms")
+        if 'create_app_ms' in report:
+            print(f"create_app(): {report['create_app_ms']:.0f} ms")
+        print(f"啟動時已匯入的重量級模組: {', '.join(report['heavy_loaded']) or '無'}")
+        print(f"\n{'直接匯入（累計）':<40}{'ms':>8}")
+        for name, duration in report['direct'][:args.top]:
+            print(f"{name:<40}{duration:>8.1f}")
+        print(f"\n{'最耗時的模組（自身）':<40}{'ms':>8}")
+        for name, duration in report['self'][:args.top]:
+            print(f"{name:<40}{duration:>8.1f}")
+
+    if 'error' in report:
+        sys.exit(1)
+    if args.max_ms is not None and report['total_ms'] > args.max_ms:
+        print(f"\n✗ 匯入耗時 {report['total_ms']:.0f} ms 超過 {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
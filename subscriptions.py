@@ -0,0 +1,236 @@
+"""
+訂閱與定時摘要推播
+使用者訂閱關鍵字後，由排程器依不同的關鍵字組合各建立一次摘要，再以 multicast 批次送給訂閱者，
+成本隨關鍵字組合數而非使用者數成長
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from clients.matcher import normalize_text
+from processors import DEFAULT_KEYWORDS, MAX_NEWS_ITEMS
+from ranking import rank_news
+from delivery import MAX_MESSAGES_PER_PUSH, MAX_MULTICAST_RECIPIENTS
+
+# 常量定義
+SUBSCRIPTIONS_PATH = 'subscriptions.db'
+DIGEST_INTERVAL = 86400  # 每天推播一次摘要
+MAX_SUBSCRIPTION_KEYWORDS = 10
+
+
+def normalize_keywords(keywords):
+    """正規化並排序關鍵字，讓相同的組合不論輸入順序與大小寫都對應到同一份摘要"""
+    normalized = {normalize_text(keyword.strip()) for keyword in keywords}
+    return sorted(keyword for keyword in normalized if keyword)[:MAX_SUBSCRIPTION_KEYWORDS]
+
+
+def ceil_div(a, b):
+    return -(-a // b)
+
+
+class SubscriptionStore:
+    """以本地 SQLite 保存的訂閱者與其關鍵字"""
+
+    def __init__(self, path=SUBSCRIPTIONS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS subscribers "
+            "(user_id TEXT PRIMARY KEY, keywords TEXT, subscribed_at REAL, updated_at REAL)"
+        )
+
+    def subscribe(self, user_id, keywords=None):
+        """新增或更新訂閱，回傳正規化後的關鍵字"""
+        keywords = (normalize_keywords(keywords or DEFAULT_KEYWORDS)
+                    or normalize_keywords(DEFAULT_KEYWORDS))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO subscribers (user_id, keywords, subscribed_at, updated_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET "
+                "keywords = excluded.keywords, updated_at = excluded.updated_at",
+                (user_id, json.dumps(keywords, ensure_ascii=False), now, now)
+            )
+        return keywords
+
+    def unsubscribe(self, user_id):
+        """取消訂閱，使用者原本有訂閱時回傳 True"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM subscribers WHERE user_id = ?", (user_id,))
+        return cursor.rowcount > 0
+
+    def get(self, user_id):
+        """回傳使用者訂閱的關鍵字，未訂閱時回傳 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT keywords FROM subscribers WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def groups(self):
+        """依關鍵字組合分組，回傳 {關鍵字 tuple: [user_id]}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, keywords FROM subscribers ORDER BY subscribed_at"
+            ).fetchall()
+        groups = {}
+        for user_id, keywords in rows:
+            groups.setdefault(tuple(json.loads(keywords)), []).append(user_id)
+        return groups
+
+    def count(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM subscribers").fetchone()
+        return count
+
+
+class DigestBroadcaster:
+    """定時為每個關鍵字組合建立一次摘要並批次推播給所有訂閱者"""
+
+    def __init__(self, news_processor, delivery, store, interval=DIGEST_INTERVAL):
+        self.news_processor = news_processor
+        self.delivery = delivery
+        self.store = store
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._broadcast_lock = threading.Lock()
+        self._last_broadcast = None
+        self._broadcast_count = 0
+
+    def start(self):
+        """啟動背景推播執行緒，第一次推播在一個間隔之後，避免重新啟動時重複推播"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="digest-broadcast", daemon=True)
+        self._thread.start()
+        print(f"摘要推播排程器已啟動，推播間隔: {self.interval} 秒")
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.broadcast_once()
+            except Exception as e:
+                print(f"摘要推播失敗: {e}")
+
+    def plan(self, groups=None):
+        """不抓取、不摘要也不推播，估算一次推播週期需要的上游請求數、摘要數與 LINE API 呼叫數"""
+        groups = self.store.groups() if groups is None else groups
+        processor = self.news_processor
+        news_pool = processor.news_pool
+        fetched_sources = set()
+        upstream_fetches = 0
+        upstream_requests = 0
+        summaries = set()
+        line_api_calls = 0
+        sets = []
+        for keywords, user_ids in groups.items():
+            keywords = list(keywords)
+            # 與 get_intel_news 相同的候選來源：已預熱的新聞池優先，其次是搜尋索引，過期的來源需要即時抓取
+            candidates = news_pool.select(keywords) if processor.pool_covers(keywords) else []
+            stale_sources = []
+            if not candidates:
+                candidates, stale_sources = processor.candidates_from_index(keywords)
+            if processor.search_index is None:
+                # 沒有搜尋索引時每個關鍵字組合都要重新抓取
+                to_fetch = stale_sources
+            else:
+                # 第一次抓取的結果會寫入索引，同一週期內的其他組合直接使用
+                to_fetch = set(stale_sources) - fetched_sources
+            upstream_fetches += len(to_fetch)
+            upstream_requests += self._request_count(to_fetch, keywords)
+            fetched_sources.update(stale_sources)
+
+            selected = [item for item, _ in rank_news(candidates, keywords, MAX_NEWS_ITEMS)]
+            missing = [item.url for item in selected if not self._has_summary(item)]
+            summaries.update(missing)
+            messages = len(self.delivery.build_messages(selected)) if selected else 0
+            calls = (ceil_div(len(user_ids), MAX_MULTICAST_RECIPIENTS)
+                     * ceil_div(messages, MAX_MESSAGES_PER_PUSH))
+            line_api_calls += calls
+            sets.append({
+                'keywords': keywords,
+                'subscribers': len(user_ids),
+                'candidates': len(candidates),
+                'articles': len(selected),
+                'summaries': len(missing),
+                'stale_sources': stale_sources,
+                'line_api_calls': calls,
+            })
+        return {
+            'dry_run': True,
+            'subscribers': sum(len(user_ids) for user_ids in groups.values()),
+            'keyword_sets': len(groups),
+            'upstream_fetches': upstream_fetches,
+            'upstream_requests': upstream_requests,
+            'summaries': len(summaries),
+            'line_api_calls': line_api_calls,
+            # 過期來源抓取後才知道的文章不在估算內
+            'estimate_complete': not fetched_sources,
+            'sets': sets,
+        }
+
+    def _has_summary(self, item):
+        news_pool = self.news_processor.news_pool
+        if news_pool is not None and news_pool.get_summary(item.url) is not None:
+            return True
+        return self.news_processor.article_client.is_cached(item.url)
+
+    def _request_count(self, source_names, keywords):
+        """抓取這些來源需要的上游請求數：WordPress 來源以訂閱的關鍵字搜尋，每個關鍵字各一次"""
+        count = 0
+        for name in source_names:
+            source = self.news_processor.sources.get(name)
+            if source is not None and source.type == 'wordpress':
+                count += len(self.news_processor.nvidia_client.search_keywords(source, keywords))
+            else:
+                count += 1
+        return count
+
+    def broadcast_once(self, dry_run=False):
+        """執行一次推播週期，dry_run 時只回傳成本估算"""
+        groups = self.store.groups()
+        if dry_run:
+            return self.plan(groups)
+
+        with self._broadcast_lock:
+            started = time.time()
+            stats = {'subscribers': 0, 'keyword_sets': len(groups), 'digests': 0, 'failed_sets': 0}
+            for keywords, user_ids in groups.items():
+                try:
+                    news_list = self.news_processor.get_intel_news(
+                        keywords=list(keywords), filter_at_source=True
+                    )
+                    if news_list:
+                        self.delivery.send(user_ids, self.delivery.build_messages(news_list))
+                        stats['digests'] += 1
+                        stats['subscribers'] += len(user_ids)
+                except Exception as e:
+                    stats['failed_sets'] += 1
+                    print(f"關鍵字 {', '.join(keywords)} 的摘要推播失敗: {e}")
+            stats.update(started_at=started, duration=time.time() - started)
+            self._last_broadcast = stats
+            self._broadcast_count += 1
+        print(f"摘要推播完成，{stats['keyword_sets']} 組關鍵字送給 {stats['subscribers']} 位訂閱者，"
+              f"耗時 {stats['duration']:.1f} 秒")
+        return stats
+
+    def get_status(self):
+        return {
+            'interval': self.interval,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'subscribers': self.store.count(),
+            'keyword_sets': len(self.store.groups()),
+            'broadcast_count': self._broadcast_count,
+            'last_broadcast': self._last_broadcast,
+        }
@@ -7,10 +7,50 @@ News Bot 測試腳本
 
 import sys
 import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # 添加專案根目錄到 Python 路徑
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+class _LocalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.reply(b'')
+
+    def do_POST(self):
+        self.reply(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def reply(self, body):
+        status, headers, payload = self.server.respond(self, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except OSError:
+            pass  # 用戶端提早關閉連線（例如 feed 串流解析提早停止）
+
+    def log_message(self, *args):
+        pass
+
+@contextmanager
+def local_server(respond):
+    """啟動本地 HTTP 測試伺服器並產出基底網址；respond(handler, body) 回傳 (狀態碼, 標頭, 內容位元組)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _LocalHandler)
+    server.daemon_threads = True
+    server.respond = respond
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
 def test_imports():
     """測試模塊導入"""
     try:
@@ -23,14 +63,31 @@ def test_imports():
 
 def test_app_creation():
     """測試應用創建"""
+    # 與 startup.import_report 相同：不啟動預取與摘要排程，測試不送出真實的網路請求
+    saved = {name: os.environ.get(name) for name in ('PREFETCH_ENABLED', 'DIGEST_ENABLED')}
+    os.environ.update(PREFETCH_ENABLED='false', DIGEST_ENABLED='false')
     try:
+        import time
         from news_bot import create_app
         app = create_app()
+        # 等背景預熱完成，之後的測試（例如解析行程池 fork）才不會與預熱中的匯入同時進行
+        client = app.test_client()
+        deadline = time.time() + 60
+        status = client.get('/startup/status').get_json()
+        while status['started'] and not status['done'] and time.time() < deadline:
+            time.sleep(0.1)
+            status = client.get('/startup/status').get_json()
         print("✓ Flask 應用創建成功")
         return True
     except Exception as e:
         print(f"✗ Flask 應用創建失敗: {e}")
         return False
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
 
 def test_news_processor():
     """測試新聞處理器"""
@@ -44,6 +101,1119 @@ def test_news_processor():
         print(f"✗ NewsProcessor 創建失敗: {e}")
         return False
 
+def test_news_pool():
+    """測試預取新聞池的選取與摘要保存"""
+    try:
+        from clients import NewsItem
+        from prefetch import NewsPool
+        from processors import NewsProcessor
+        pool = NewsPool()
+        assert not pool.is_warm()
+        pool.update_source('AMD', [
+            NewsItem('Ryzen CPU launch', 'https://example.com/cpu', 'AMD'),
+            NewsItem('Radeon GPU launch', 'https://example.com/gpu', 'AMD'),
+        ])
+        pool.put_summary('https://example.com/gpu', 'summary')
+        assert pool.is_warm()
+        assert [a.url for a in pool.select(['gpu'])] == ['https://example.com/gpu']
+        # 池中只有預取關鍵字篩選過的文章，自訂關鍵字的查詢不能由池回應
+        assert pool.covers(['GPU']) and pool.covers(None) and not pool.covers(['radeon'])
+        processor = NewsProcessor(None, None, None, None, news_pool=pool)
+        assert processor.pool_covers(['gpu']) and not processor.pool_covers(['radeon'])
+        # 只有標題的備援項目不能當成摘要保存，否則永遠不會重試
+        processor.store_summary(NewsItem('Ryzen CPU launch', 'https://example.com/cpu', 'AMD'))
+        assert pool.get_summary('https://example.com/cpu') is None
+        assert pool.get_summary('https://example.com/gpu') == 'summary'
+        pool.update_source('AMD', [])
+        assert pool.get_summary('https://example.com/gpu') is None
+        print("✓ NewsPool 選取與摘要保存正常")
+    except Exception as e:
+        print(f"✗ NewsPool 測試失敗: {e!r}")
+        raise
+
+def test_job_queue():
+    """測試工作佇列的排入、執行與統計"""
+    try:
+        import tempfile
+        import threading
+        from jobs import JobWorkerPool, JobQueueFull, create_job_queue
+        for backend in ('memory', 'sqlite'):
+            with tempfile.TemporaryDirectory() as tmp:
+                done = threading.Event()
+                handled = []
+
+                def handler(payload):
+                    handled.append(payload)
+                    if len(handled) == 2:
+                        done.set()
+
+                job_queue = create_job_queue(backend, maxsize=2, path=os.path.join(tmp, 'jobs.db'))
+                pool = JobWorkerPool(job_queue, handler, workers=1)
+                pool.submit({'user_id': 'u1', 'keywords': ['gpu']})
+                pool.submit({'user_id': 'u2', 'keywords': ['ai']})
+                try:
+                    pool.submit({'user_id': 'u3', 'keywords': ['cpu']})
+                    raise AssertionError("queue should be full")
+                except JobQueueFull:
+                    pass
+                pool.start()
+                assert done.wait(5)
+                pool.stop()
+                stats = pool.get_stats()
+                assert [p['user_id'] for p in handled] == ['u1', 'u2']
+                assert stats['rejected'] == 1 and stats['completed'] == 2
+                assert stats['wait_time']['count'] == 2
+        print("✓ 工作佇列排入與執行正常")
+    except Exception as e:
+        print(f"✗ 工作佇列測試失敗: {e!r}")
+        raise
+
+def test_connection_reuse():
+    """測試共用 Session 會重用 keep-alive 連線"""
+    try:
+        from clients import BaseAPIClient, create_session
+
+        with local_server(lambda handler, body: (200, {}, b'ok')) as base:
+            client = BaseAPIClient(session=create_session())
+            url = f"{base}/feed"
+            before = client.get_connection_stats()['hosts'].get(
+                '127.0.0.1', {'requests': 0, 'new_connections': 0}
+            )
+            for _ in range(3):
+                assert client._make_request(url).text == 'ok'
+            after = client.get_connection_stats()['hosts']['127.0.0.1']
+            assert after['new_connections'] - before['new_connections'] == 1
+            assert after['requests'] - before['requests'] == 3
+
+            # 讀取超時與 POST 不由 urllib3 重試
+            retry = client.session.get_adapter(url).max_retries
+            assert retry.read is False and 'POST' not in retry.allowed_methods
+        print("✓ 連線池重用 keep-alive 連線")
+    except Exception as e:
+        print(f"✗ 連線池測試失敗: {e!r}")
+        raise
+
+def test_article_single_download():
+    """測試文章只下載一次並記錄各階段耗時"""
+    try:
+        from clients import ArticleClient, NewsItem, create_session
+
+        hits = []
+        paragraphs = "".join(
+            f"<p>Sentence {i} explains how the new graphics card improves rendering speed "
+            f"in benchmark {i}.</p>"
+            for i in range(20)
+        )
+        html = (
+            f"<html><head><title>GPU</title></head>"
+            f"<body><article>{paragraphs}</article></body></html>"
+        ).encode()
+
+        def respond(handler, body):
+            hits.append(handler.path)
+            return 200, {'Content-Type': 'text/html; charset=utf-8'}, html
+
+        with local_server(respond) as base:
+            client = ArticleClient(session=create_session())
+            url = f"{base}/article"
+            news_item = client.process_article(NewsItem('GPU', url, 'Test'))
+            assert news_item.summary is not None and news_item.timings['download'] > 0
+            assert hits == ['/article']
+            stats = client.get_timing_stats()
+            assert stats['articles'] == 1 and stats['download'] > 0
+        print("✓ 文章只下載一次並記錄耗時")
+    except Exception as e:
+        print(f"✗ 文章下載測試失敗: {e!r}")
+        raise
+
+def test_article_cache():
+    """測試緩存鍵穩定性、LRU 淘汰與 SQLite 持久化"""
+    try:
+        import tempfile
+        import time
+        from clients.cache import MemoryCache, SQLiteCache, cache_key
+
+        assert (cache_key('HTTPS://Example.com/a/?utm_source=x&b=2&a=1#top')
+                == cache_key('https://example.com/a?a=1&b=2'))
+
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        assert cache.get('a') == 'A'
+        cache.set('c', 'C')  # 淘汰最久未使用的 b
+        assert cache.get('b') is None and cache.get('c') == 'C'
+        cache.set('d', 'D', ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get('d') is None
+        stats = cache.stats()
+        assert stats['evictions'] >= 1 and stats['expirations'] == 1 and stats['hits'] == 2
+        # ttl=0 表示立即過期，不能被當成「使用預設 TTL」
+        cache.set('e', 'E', ttl=0)
+        assert cache.get('e') is None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.db')
+            SQLiteCache(path).set('k', {'summary': '摘要'})
+            assert SQLiteCache(path).get('k') == {'summary': '摘要'}
+            SQLiteCache(path).set('z', {'summary': '摘要'}, ttl=0)
+            assert SQLiteCache(path).get('z') is None
+        print("✓ 文章緩存淘汰與持久化正常")
+    except Exception as e:
+        print(f"✗ 文章緩存測試失敗: {e!r}")
+        raise
+
+def test_conditional_feed_request():
+    """測試 feed 未變時回傳 304 並重用上次解析結果"""
+    try:
+        from clients import RSSClient, Source, create_session
+
+        feed = (
+            '<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>'
+            '<item><title>New GPU</title><link>https://example.com/gpu</link></item>'
+            '</channel></rss>'
+        ).encode()
+
+        def respond(handler, body):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {}, b''
+            return 200, {'ETag': '"v1"'}, feed
+
+        with local_server(respond) as base:
+            client = RSSClient(session=create_session())
+            source = Source('Test', 'rss', f"{base}/feed")
+            first = client.get_news([source], ['gpu'])
+            second = client.get_news([source], ['gpu'])
+            assert first == second and first[0].url == 'https://example.com/gpu'
+            stats = client.get_conditional_stats()[source.url]
+            assert stats['parses'] == 1 and stats['not_modified'] == 1
+            assert stats['bytes_saved'] == len(feed)
+        print("✓ 條件式請求重用未變更的 feed")
+    except Exception as e:
+        print(f"✗ 條件式請求測試失敗: {e!r}")
+        raise
+
+def test_feed_streaming():
+    """測試 feed 串流解析在找到足夠的項目後停止讀取，且不會以 304 重用不完整的結果"""
+    try:
+        from clients import RSSClient, Source, create_session
+        from clients.rss_client import FeedStream
+
+        items = ''.join(
+            f'<item><title>{"GPU" if i < 3 else "CPU"} news {i} &nbsp;&amp; more</title>'
+            f'<link>https://example.com/{i}?a=1&amp;b=2</link>'
+            f'<pubDate>Mon, 06 Oct 2025 08:00:00 +0800</pubDate></item>'
+            for i in range(400)
+        )
+        items += '<item><title>Late Arc news</title><link>https://example.com/arc</link></item>'
+        feed = (
+            f'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>'
+            f'{items}</channel></rss>'
+        ).encode()
+        conditional = []
+
+        def respond(handler, body):
+            conditional.append(handler.headers.get('If-None-Match') is not None)
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {}, b''
+            return 200, {'ETag': '"v1"'}, feed
+
+        # 區塊邊界切在實體參照中間也要正確解析，結果與 feedparser 相同
+        client = RSSClient(session=create_session())
+        stream = FeedStream(fallback=client.parse_entries)
+        for i in range(0, len(feed), 7):
+            stream.feed(feed[i:i + 7])
+        assert stream.close() == client.parse_entries(feed)
+        assert stream.entries[0]['title'] == 'GPU news 0 \xa0& more'
+        assert stream.entries[0]['link'].endswith('?a=1&b=2')
+
+        with local_server(respond) as base:
+            source = Source('Test', 'rss', f"{base}/feed", max_entries=2)
+            gpu = client.get_news([source], ['gpu'])
+            assert [item.title.split()[2] for item in gpu] == ['0', '1']
+            stats = client.get_conditional_stats()[source.url]
+            assert stats['early_stops'] == 1 and stats['bytes_downloaded'] < len(feed) / 2
+            assert not client.is_complete(source)
+
+            # 不完整的結果仍足以回應相同的查詢，可以送出驗證標頭
+            assert client.get_news([source], ['gpu']) == gpu and conditional == [False, True]
+            # 其他關鍵字的結果可能在還沒讀到的部分，不能以 304 重用
+            arc = client.get_news([source], ['arc'], early_stop=False)
+            assert [item.url for item in arc] == ['https://example.com/arc']
+            assert conditional[-1] is False
+            assert client.is_complete(source) and len(client.recent_entries(source)) == 401
+            assert client.get_news([source], ['arc']) == arc and conditional[-1] is True
+        print("✓ feed 串流解析與提早停止正常")
+    except Exception as e:
+        print(f"✗ feed 串流解析測試失敗: {e!r}")
+        raise
+
+def test_nvidia_search():
+    """測試 NVIDIA 以呼叫端關鍵字並發搜尋、翻頁、增量更新、解析發布時間並合併去重"""
+    try:
+        import json
+        from benchmarks.upstream import UpstreamStub
+        from clients import NvidiaAPIClient, Source, create_session
+        from clients.models import parse_timestamp
+
+        stub = UpstreamStub().start()
+        try:
+            url = stub.sources_config()['sources'][-1]['url']
+            source = Source('NVIDIA', 'wordpress', url, max_entries=2,
+                            options={'keywords': ['GPU', 'AI'], 'max_pages': 3})
+            client = NvidiaAPIClient(session=create_session())
+
+            params = client.build_search_params('ai', source)
+            assert '_embed' not in params and params['_fields'] == 'link,title,date,date_gmt'
+            assert client.search_keywords(source, ['nvidia', 'NVIDIA ', 'ai']) == ['nvidia', 'ai']
+            assert client.conditional_key(source, 'ai') == 'NVIDIA:AI'
+            assert client.conditional_key(source, 'nvidia') is None
+            assert client.conditional_key(source, 'ai', page=2) is None
+
+            news = client.get_news(source, ['nvidia', 'ai'])
+            assert len(news) == 2 and len({item.url for item in news}) == 2
+            assert news[0].published >= news[1].published and 'RTX 50' in news[0].title
+
+            # 結果填滿一頁時繼續翻頁，最多 max_pages 頁
+            assert len(client.search(source, 'nvidia')) == 6
+
+            # 指定 after：只取之後發布的文章，翻頁直到 WordPress 回應 400
+            after = parse_timestamp('2025-10-07T00:00:00Z')
+            params = client.build_search_params('ai', source, after=after)
+            assert params['after'] == '2025-10-07T00:00:00Z'
+            assert client.conditional_key(source, 'ai', after=after) is None
+            newer = client.get_news(source, ['nvidia'], after=after)
+            assert len(newer) == 4 and all(item.published > after for item in newer)
+            assert [item.published for item in newer] == sorted(
+                (item.published for item in newer), reverse=True
+            )
+
+            # 同一組關鍵字再次查詢時只搜尋上次最新發布時間之後的文章，並與上次的結果合併
+            assert client.search_state(source, ['AI', 'nvidia'])[1] == news[0].published
+            upstream = stub.upstreams['NVIDIA']
+            fixture = json.loads(upstream.fixture)
+            fixture.insert(0, dict(
+                fixture[0], link=fixture[0]['link'] + '-new', title={'rendered': 'NVIDIA 新品發表'},
+                date='2025-10-20T16:00:00', date_gmt='2025-10-20T08:00:00'
+            ))
+            upstream.fixture = json.dumps(fixture, ensure_ascii=False)
+            requests_before = upstream.stats['requests']
+            refreshed = client.get_news(source, ['nvidia', 'ai'])
+            assert [item.title for item in refreshed] == ['NVIDIA 新品發表', news[0].title]
+            assert upstream.stats['requests'] - requests_before == 2
+
+            # 沒有 date_gmt 時，date 以部落格所在時區解讀而不是 UTC
+            posts = [
+                {'link': 'https://example.com/a', 'title': {'rendered': 'A'},
+                 'date': '2025-10-09T16:00:00'},
+                {'link': 'https://example.com/b', 'title': {'rendered': 'B'},
+                 'date': '2025-10-09T16:00:00', 'date_gmt': '2025-10-09T08:00:00'},
+            ]
+            local, gmt = client.parse_posts(posts, set(), source)
+            assert local.published == gmt.published == parse_timestamp('2025-10-09T08:00:00Z')
+        finally:
+            stub.stop()
+        print("✓ NVIDIA 搜尋並發、翻頁、增量更新與發布時間解析正常")
+    except Exception as e:
+        print(f"✗ NVIDIA 搜尋測試失敗: {e!r}")
+        raise
+
+def test_amd_search():
+    """測試 AMD 以使用者關鍵字查詢、逐頁取回與增量更新"""
+    try:
+        import json
+        from benchmarks.upstream import UpstreamStub
+        from clients import AMDAPIClient, Source, create_session
+
+        stub = UpstreamStub().start()
+        try:
+            upstream = stub.upstreams['AMD']
+            url = stub.sources_config()['sources'][2]['url']
+            source = Source('AMD', 'coveo', url, max_entries=3,
+                            options={'keywords': ['AMD'], 'page_size': 2})
+            client = AMDAPIClient(session=create_session())
+
+            _, _, data = client.build_search_request(source, ['ai', '顯"卡'])
+            assert data['q'] == '"ai" OR "顯 卡"' and 'aq' not in data
+            assert data['fieldsToInclude'] == ['amd_release_date']
+
+            # 生成器在找到足夠的結果後就不再請求下一頁
+            news = client.get_news(source)
+            assert [item.published for item in news] == [1760000000.0, 1759913600.0, 1759827200.0]
+            assert upstream.stats['requests'] == 2
+
+            radeon = client.get_news(source, ['Radeon'])
+            assert len(radeon) == 2 and all('Radeon' in item.title for item in radeon)
+
+            # 第二次只查詢最新發布時間之後的新聞，並與上次的結果合併
+            assert client.search_state(source)[1] == 1760000000.0
+            fixture = json.loads(upstream.fixture)
+            fixture['results'].insert(0, dict(
+                fixture['results'][0], title='AMD 新品發表', clickUri='{base}/articles/amd-new',
+                raw={'amd_release_date': 1760100000000}
+            ))
+            upstream.fixture = json.dumps(fixture, ensure_ascii=False)
+            refreshed = client.get_news(source)
+            assert [item.title for item in refreshed][:1] == ['AMD 新品發表']
+            assert refreshed[1:] == news[:2]
+        finally:
+            stub.stop()
+        print("✓ AMD 關鍵字查詢、分頁與增量更新正常")
+    except Exception as e:
+        print(f"✗ AMD 搜尋測試失敗: {e!r}")
+        raise
+
+def test_single_flight():
+    """測試相同鍵的並發呼叫只執行一次"""
+    try:
+        import threading
+        import time
+        from clients.singleflight import SingleFlight
+
+        flight = SingleFlight()
+        executions = []
+        results = []
+
+        def slow_fetch():
+            executions.append(1)
+            time.sleep(0.2)
+            return ['news']
+
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do('gpu', slow_fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = flight.stats()
+        assert len(executions) == 1 and results == [['news']] * 5
+        assert stats['coalesced'] == 4 and stats['in_flight'] == 0
+        print("✓ 並發請求合併為一次執行")
+    except Exception as e:
+        print(f"✗ 請求合併測試失敗: {e!r}")
+        raise
+
+def test_deadline_partial_results():
+    """測試延遲預算到期時先回傳已完成的摘要，其餘只回傳標題和連結"""
+    try:
+        import time
+        from clients import NewsItem
+        from processors import NewsProcessor
+
+        now = time.time()
+        items = [
+            NewsItem('Fast GPU news', 'https://example.com/fast', 'Intel', published=now),
+            NewsItem('Slow GPU news', 'https://example.com/slow', 'AMD', published=now),
+        ]
+
+        class SlowArticleClient:
+            def process_article(self, article):
+                if 'slow' in article.url:
+                    time.sleep(2)
+                return article.with_summary('summary')
+
+        class WarmPool:
+            def is_warm(self):
+                return True
+
+            def covers(self, keywords):
+                return True
+
+            def select(self, keywords):
+                return list(items)
+
+            def get_summary(self, url):
+                return None
+
+            def put_summary(self, url, news_item):
+                pass
+
+        processor = NewsProcessor(None, None, None, SlowArticleClient(), news_pool=WarmPool())
+        delivered = []
+        started = time.monotonic()
+        news_list = processor.get_intel_news(['gpu'], deadline=0.5, on_item=delivered.append)
+        assert time.monotonic() - started < 1.5
+        assert [item.url for item in news_list] == [item.url for item in items]
+        assert news_list[0].summary == 'summary' and news_list[1].summary is None
+        assert [item.url for item in delivered] == [item.url for item in items]
+        print("✓ 延遲預算到期時回傳部分結果")
+    except Exception as e:
+        print(f"✗ 延遲預算測試失敗: {e!r}")
+        raise
+
+def test_async_processor():
+    """測試 async 引擎對本地模擬主機串流產出摘要、遵守每主機並發上限，期限到時只回傳標題和連結"""
+    try:
+        import asyncio
+        import time
+        from async_processor import AsyncNewsProcessor
+        from benchmarks.upstream import UpstreamStub
+        from clients import (
+            AMDAPIClient, ArticleClient, NewsItem, NvidiaAPIClient, RSSClient, Source,
+            create_session
+        )
+        from clients.sources import SourceRegistry
+
+        def create_processor(stub, news_pool=None, deadline=10):
+            sources = SourceRegistry(
+                Source.from_dict(dict(entry, host_limit=1))
+                for entry in stub.sources_config()['sources']
+            )
+            session = create_session()
+            return AsyncNewsProcessor(
+                AMDAPIClient(session=session), NvidiaAPIClient(session=session),
+                RSSClient(session=session), ArticleClient(session=session, sources=sources),
+                news_pool=news_pool, sources=sources, deadline=deadline
+            )
+
+        async def collect(processor, keywords):
+            return [item async for item in processor.stream_intel_news(keywords)]
+
+        stub = UpstreamStub(latency=0.02).start()
+        try:
+            news = asyncio.run(collect(create_processor(stub), ['gpu']))
+            stats = stub.get_stats()
+        finally:
+            stub.stop()
+        assert news and len({item.url for item in news}) == len(news)
+        assert all(item.summary and 'gpu' in item.title.lower() for item in news)
+        # 每個模擬主機的 host_limit 為 1：來源列表與文章下載不會同時打到同一主機
+        assert all(
+            upstream['peak_concurrency'] == 1 for upstream in stats.values() if upstream['requests']
+        )
+
+        # 文章下載超過期限：取消未完成的下載，依排序產出標題和連結
+        stub = UpstreamStub(latency=1.0).start()
+        try:
+            upstream = stub.upstreams['Intel']
+            now = time.time()
+            items = [
+                NewsItem(title, upstream.base + path, 'Intel', published=now - index)
+                for index, (path, title) in enumerate(list(upstream.titles.items())[:3])
+            ]
+
+            class WarmPool:
+                def is_warm(self):
+                    return True
+
+                def covers(self, keywords):
+                    return True
+
+                def select(self, keywords):
+                    return list(items)
+
+                def get_summary(self, url):
+                    return None
+
+                def put_summary(self, url, news_item):
+                    pass
+
+            started = time.monotonic()
+            partial = asyncio.run(collect(create_processor(stub, WarmPool(), deadline=0.3), None))
+            assert time.monotonic() - started < 1.0
+        finally:
+            stub.stop()
+        assert sorted(item.url for item in partial) == sorted(item.url for item in items)
+        assert all(item.summary is None and item.title for item in partial)
+
+        # 解析與推播超過期限：同步介面不等待仍在執行緒中執行的解析與推播
+        stub = UpstreamStub(latency=0.02).start()
+        try:
+            upstream = stub.upstreams['Intel']
+            items = [
+                NewsItem(title, upstream.base + path, 'Intel', published=now - index)
+                for index, (path, title) in enumerate(list(upstream.titles.items())[:3])
+            ]
+            processor = create_processor(stub, WarmPool(), deadline=0.5)
+            process_html = processor.article_client.process_html
+
+            def slow_process_html(*args):
+                time.sleep(2)
+                return process_html(*args)
+
+            processor.article_client.process_html = slow_process_html
+            started = time.monotonic()
+            slow = processor.get_intel_news(None, deadline=0.5, on_item=lambda _: time.sleep(1))
+            assert time.monotonic() - started < 1.5
+        finally:
+            stub.stop()
+        assert len(slow) == 3 and all(item.summary is None for item in slow)
+        print("✓ async 引擎串流產出、主機並發限制與期限正常")
+    except Exception as e:
+        print(f"✗ async 引擎測試失敗: {e!r}")
+        raise
+
+def test_summarizers():
+    """測試中文斷句與快速摘要引擎"""
+    try:
+        from clients.summarizers import get_summarizer, split_sentences
+
+        text = "NVIDIA 發表新一代 GPU。這款顯卡支援 AI 運算！價格約為 3.5 萬元？The card ships in Q4. It costs $1,999."
+        assert split_sentences(text) == [
+            "NVIDIA 發表新一代 GPU。", "這款顯卡支援 AI 運算！", "價格約為 3.5 萬元？",
+            "The card ships in Q4.", "It costs $1,999.",
+        ]
+        for name in ('lead', 'tfidf'):
+            summary = get_summarizer(name, max_chars=40).summarize(text)
+            assert summary and len(summary) <= 43, (name, summary)
+        batch = get_summarizer('tfidf').summarize_batch([text, "", "顯卡。"])
+        assert batch[1] == "" and batch[2] == "顯卡。"
+        print("✓ 摘要引擎支援中文斷句")
+    except Exception as e:
+        print(f"✗ 摘要引擎測試失敗: {e!r}")
+        raise
+
+def test_parse_pool():
+    """測試解析與摘要可交給 worker 行程執行"""
+    try:
+        from clients import ArticleClient, NewsItem, get_summarizer
+        from clients.parse_pool import ParsePool
+
+        pool = ParsePool(workers=1, summarizer_name='lead')
+        try:
+            pool.warm_up()
+            client = ArticleClient(summarizer=get_summarizer('lead'), parse_pool=pool)
+            html = "<html><body><article>" + "".join(
+                f"<p>Paragraph {i} describes how the new workstation GPU accelerates "
+                f"rendering jobs.</p>"
+                for i in range(10)
+            ) + "</article></body></html>"
+            article = NewsItem('GPU', 'https://example.com/parse-pool', 'Test')
+            news_item = client.process_html(article, article.url, html.encode('utf-8'), 'utf-8')
+            assert news_item.summary.startswith('Paragraph 0 describes')
+        finally:
+            pool.shutdown()
+        print("✓ 解析行程池生成摘要")
+    except Exception as e:
+        print(f"✗ 解析行程池測試失敗: {e!r}")
+        raise
+
+def test_news_item():
+    """測試 NewsItem 緩存往返、關鍵字篩選與 LINE 文字渲染"""
+    try:
+        import time
+        from clients import NewsItem
+        from clients.cache import MemoryCache
+        from clients.models import parse_timestamp
+        from delivery import format_news_item
+        from processors import NewsProcessor
+
+        assert parse_timestamp('2024-01-02T03:04:05') == parse_timestamp(1704164645000)
+        assert parse_timestamp(1704164645000) == 1704164645.0
+        assert parse_timestamp(time.gmtime(1704164645)) == 1704164645.0
+        assert parse_timestamp('not a date') is None
+
+        item = NewsItem('New GPU', 'https://example.com/gpu', 'AMD', published=1704164645.0)
+        summarized = item.with_summary('顯卡效能提升', resolved_url='https://example.com/gpu?ref=1',
+                                       timings={'parse': 0.1})
+        assert item.summary is None and summarized.link == 'https://example.com/gpu?ref=1'
+        cache = MemoryCache()
+        cache.set('k', summarized.to_dict())
+        assert NewsItem.from_dict(cache.get('k')) == summarized
+
+        processor = NewsProcessor(None, None, None, None)
+        filtered = processor.get_keyword_filtered_news(
+            [
+                summarized, NewsItem('Ryzen CPU', 'https://example.com/cpu', 'AMD'),
+                NewsItem('Arc', 'https://example.com/arc', 'Intel'),
+            ],
+            ['顯卡']
+        )
+        assert filtered == [summarized]
+
+        assert '📑 新聞摘要: 顯卡效能提升' in format_news_item(summarized)
+        assert '新聞摘要' not in format_news_item(item)
+        assert '🔗 連結: https://example.com/gpu' in format_news_item(item)
+        print("✓ NewsItem 緩存往返與渲染正常")
+    except Exception as e:
+        print(f"✗ NewsItem 測試失敗: {e!r}")
+        raise
+
+def test_keyword_matcher():
+    """測試關鍵字比對的正規化、字界判斷與命中關鍵字回報"""
+    try:
+        from clients.matcher import get_matcher
+
+        matcher = get_matcher(["gpu", "電腦", "ai", "workstation", "顯卡", "AI PC"])
+        assert matcher is get_matcher(["gpu", "電腦", "ai", "workstation", "顯卡", "AI PC"])
+        assert not matcher.matches("We maintain the drivers")
+        assert matcher.matches("ＮＶＩＤＩＡ 發表新款 ＧＰＵｓ") and matcher.matches("AI晶片出貨")
+        assert matcher.matches("New Workstations ship today")
+        assert matcher.find("Intel AI PC 筆記型電腦", "summary") == ["電腦", "ai", "AI PC"]
+        assert get_matcher([]).find("gpu") == [] and not get_matcher([]).matches("gpu")
+        print("✓ 關鍵字比對正規化與字界判斷正常")
+    except Exception as e:
+        print(f"✗ 關鍵字比對測試失敗: {e!r}")
+        raise
+
+def test_search_index():
+    """測試倒排索引的中文查詢、摘要保留、持久化與來源過期判斷"""
+    try:
+        import tempfile
+        from clients import AMDAPIClient, NewsItem, NvidiaAPIClient
+        from processors import NewsProcessor
+        from search_index import SearchIndex
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.json')
+            index = SearchIndex(path=path)
+            index.update_source('Intel', [
+                NewsItem('新款顯卡正式上市', 'https://example.com/1', 'Intel', published=100),
+                NewsItem('We maintain our roadmap', 'https://example.com/2', 'Intel',
+                         published=300),
+                NewsItem('Arc GPUs for AI PCs', 'https://example.com/3', 'Intel', published=200),
+            ])
+            assert [item.url for item in index.search(['顯卡'])] == ['https://example.com/1']
+            assert [item.url for item in index.search(['ai', '顯卡'])] == [
+                'https://example.com/3', 'https://example.com/1'
+            ]
+            assert index.search(['gpu'])[0].url == 'https://example.com/3' and index.search(['卡'])
+
+            roadmap = NewsItem('We maintain our roadmap', 'https://example.com/2', 'Intel')
+            index.add([roadmap.with_summary('新一代工作站')])
+            index.update_source('Intel', [roadmap])
+            assert [item.url for item in index.search(['工作站'])] == ['https://example.com/2']
+            index.save()
+
+            reloaded = SearchIndex(path=path)
+            assert reloaded.search(['工作站'])[0].summary == '新一代工作站'
+            processor = NewsProcessor(AMDAPIClient(), NvidiaAPIClient(), None, None,
+                                      search_index=reloaded)
+            candidates, stale = processor.candidates_from_index(['顯卡'])
+            assert [item.url for item in candidates] == ['https://example.com/1']
+            assert 'Intel' not in stale and 'AMD' in stale
+
+            # 搜尋 API 來源只有同一組關鍵字搜尋過才算最新，其他關鍵字仍需即時搜尋
+            processor.index_source('AMD', [NewsItem('AMD GPU', 'https://amd.com/1', 'AMD')],
+                                   ['GPU'])
+            processor.index_source('NVIDIA', [NewsItem('RTX', 'https://nvidia.com/1', 'NVIDIA')],
+                                   ['gpu', 'ai'])
+            stale = processor.candidates_from_index(['gpu'])[1]
+            assert 'AMD' not in stale and 'NVIDIA' in stale
+            assert 'NVIDIA' not in processor.candidates_from_index(['AI', 'gpu'])[1]
+            assert {'AMD', 'NVIDIA'} <= set(processor.candidates_from_index(['radeon'])[1])
+            reloaded.save()
+            assert 'AMD' not in SearchIndex(path=path).fresh_sources({'AMD': ['radeon']})
+            assert 'AMD' in SearchIndex(path=path).fresh_sources({'AMD': ['gpu']})
+        print("✓ 搜尋索引查詢與持久化正常")
+    except Exception as e:
+        print(f"✗ 搜尋索引測試失敗: {e!r}")
+        raise
+
+def test_ranking():
+    """測試依關鍵字命中、新鮮度與來源均衡排序"""
+    try:
+        from clients import NewsItem
+        from processors import NewsProcessor
+        from ranking import rank_news
+
+        now = 1_700_000_000
+        day = 24 * 3600
+        items = [
+            NewsItem('GPU roadmap', 'https://example.com/a1', 'AMD', published=now - 10 * day),
+            NewsItem('New GPU for AI workstations', 'https://example.com/a2', 'AMD',
+                     published=now - day),
+            NewsItem('AI GPU launch', 'https://example.com/a3', 'AMD', published=now - day),
+            NewsItem('Old GPU news', 'https://example.com/i1', 'Intel', published=now - 30 * day),
+            NewsItem('Driver update', 'https://example.com/n1', 'NVIDIA', summary='新的 GPU 驅動',
+                     published=now),
+        ]
+        keywords = ['gpu', 'ai', 'workstation']
+        ranked = rank_news(items, keywords, k=4, now=now)
+        assert [item.url for item, _ in ranked] == [
+            'https://example.com/a2', 'https://example.com/i1', 'https://example.com/a3',
+            'https://example.com/n1',
+        ]
+        top = ranked[0][1]
+        assert top['keywords'] == ['gpu', 'ai', 'workstation'] and top['source_penalty'] == 0
+        assert ranked[2][1]['source_penalty'] > 0 and ranked[3][1]['keywords'] == ['gpu']
+        assert rank_news(list(reversed(items)), keywords, k=4, now=now) == ranked
+
+        processor = NewsProcessor(None, None, None, None)
+        filtered = processor.get_keyword_filtered_news(items, ['gpu'], target_count=2)
+        assert len(filtered) == 2 and len({item.source for item in filtered}) == 2
+        print("✓ 新聞排序與來源均衡正常")
+    except Exception as e:
+        print(f"✗ 新聞排序測試失敗: {e!r}")
+        raise
+
+def test_source_registry():
+    """測試來源設定檔載入、文章超時政策與每主機並發限制"""
+    try:
+        from clients.sources import (
+            Source, SourceRegistry, SOURCES_PATH, ARTICLE_TIMEOUT, ARTICLE_RETRIES
+        )
+
+        registry = SourceRegistry.load(SOURCES_PATH)
+        assert {'Intel', 'AMD', 'NVIDIA'} <= set(registry.names())
+        assert registry.get('AMD').type == 'coveo' and registry.get('NVIDIA').type == 'wordpress'
+        assert registry.article_policy('https://www.amd.com/en/newsroom/x.html') == (20, 1)
+        assert registry.article_policy('https://example.com/x') == (
+            ARTICLE_TIMEOUT, ARTICLE_RETRIES
+        )
+
+        registry = SourceRegistry([
+            Source('Test', 'rss', 'https://feeds.example.com/rss', host_limit=2)
+        ])
+        semaphore = registry.limit('https://feeds.example.com/article')
+        assert semaphore is registry.limit('https://feeds.example.com/other')
+        assert semaphore.acquire(blocking=False) and semaphore.acquire(blocking=False)
+        assert not semaphore.acquire(blocking=False)
+        semaphore.release()
+        semaphore.release()
+        assert registry.host_pool_sizes() == {'feeds.example.com': 2}
+
+        try:
+            SourceRegistry([
+                Source('A', 'rss', 'https://a.com'), Source('A', 'rss', 'https://b.com')
+            ])
+            raise AssertionError("重複的來源名稱應該被拒絕")
+        except ValueError:
+            pass
+        try:
+            Source('X', 'atom', 'https://x.com')
+            raise AssertionError("不支援的來源類型應該被拒絕")
+        except ValueError:
+            pass
+        print("✓ 來源設定與每主機並發限制正常")
+    except Exception as e:
+        print(f"✗ 來源設定測試失敗: {e!r}")
+        raise
+
+def test_circuit_breaker():
+    """測試連續失敗後開啟熔斷、使用上次成功的結果，以及依 p95 延遲調整超時"""
+    try:
+        import time
+        from urllib.parse import urlparse
+        from clients import RSSClient, Source, CircuitBreakerRegistry, create_session
+        from clients.circuit_breaker import HostBreaker, MIN_TIMEOUT
+
+        feed = (
+            '<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>'
+            '<item><title>New GPU</title><link>https://example.com/gpu</link></item>'
+            '</channel></rss>'
+        ).encode()
+        state = {'down': False, 'hits': 0}
+
+        def respond(handler, body):
+            state['hits'] += 1
+            return (503, {}, b'') if state['down'] else (200, {}, feed)
+
+        with local_server(respond) as base:
+            breakers = CircuitBreakerRegistry(open_seconds=0.2)
+            client = RSSClient(session=create_session(max_retries=0), breakers=breakers)
+            source = Source('Test', 'rss', f"{base}/feed")
+            first = client.get_news([source], ['gpu'])
+            assert len(first) == 1
+
+            state['down'] = True
+            results = [client.get_news([source], ['gpu']) for _ in range(4)]
+            # 第3次失敗後熔斷並改用上次成功的結果，第4次不再送出請求
+            assert results == [[], [], first, first]
+            assert state['hits'] == 4 and breakers.is_open(source.url)
+
+            time.sleep(0.25)
+            state['down'] = False
+            assert client.get_news([source], ['gpu']) == first
+            stats = client.get_breaker_stats()[urlparse(base).netloc]
+            assert stats['state'] == 'closed' and stats['opened'] == 1 and stats['rejected'] == 1
+
+        breaker = HostBreaker('example.com')
+        assert breaker.timeout(15) == 15
+        for _ in range(10):
+            breaker.record_success(0.1)
+        assert breaker.timeout(15) == MIN_TIMEOUT
+        for _ in range(20):
+            breaker.record_success(3.0)
+        assert breaker.timeout(15) == 6.0 and breaker.timeout(5) == 5
+        print("✓ 熔斷器與自適應超時正常")
+    except Exception as e:
+        print(f"✗ 熔斷器測試失敗: {e!r}")
+        raise
+
+def test_line_delivery():
+    """測試批次推播、429 重試、Flex carousel 與 multicast 合併（使用本地 LINE API 模擬伺服器）"""
+    try:
+        import json
+        import time
+        from linebot import LineBotApi
+        from clients import NewsItem
+        from delivery import LineDelivery
+
+        calls = []
+        state = {'rate_limit_next': True}
+
+        def respond(handler, body):
+            calls.append((handler.path, json.loads(body), handler.headers.get('X-Line-Retry-Key')))
+            headers = {'Content-Type': 'application/json', 'Retry-After': '0'}
+            if state['rate_limit_next']:
+                state['rate_limit_next'] = False
+                return 429, headers, b'{"message": "rate limited"}'
+            return 200, headers, b'{}'
+
+        with local_server(respond) as base:
+            api = LineBotApi('token', endpoint=base)
+            items = [
+                NewsItem(f'GPU news {i}', f'https://example.com/{i}', 'Intel', summary='摘要')
+                for i in range(7)
+            ]
+
+            delivery = LineDelivery(api)
+            delivery.push('U1', delivery.build_messages(items))
+            # 7則訊息分成 5 + 2 兩次 push，第一次遇到 429 以相同的 retry key 重試
+            assert [len(body['messages']) for _, body, _ in calls] == [5, 5, 2]
+            assert calls[0][2] == calls[1][2] and calls[1][2] != calls[2][2]
+            assert delivery.get_stats()['retries'] == 1 and delivery.get_stats()['pushes'] == 2
+
+            calls.clear()
+            sender = delivery.progressive('U1')
+            for item in items[:4]:
+                sender.add(item)
+            assert sender.flush() == 4 and [len(body['messages']) for _, body, _ in calls] == [1, 3]
+            # 期限後才在背景送達的新聞不能留在已送出的緩衝區
+            sender.add(items[4])
+            assert sender.sent == 5 and [len(body['messages']) for _, body, _ in calls] == [1, 3, 1]
+
+            flex = LineDelivery(api, use_flex=True).build_messages(items)
+            carousel = flex[0].as_json_dict()['contents']
+            assert len(flex) == 1 and carousel['type'] == 'carousel'
+            assert len(carousel['contents']) == 7
+
+            calls.clear()
+            produced = []
+
+            def produce():
+                produced.append(1)
+                time.sleep(0.3)
+                return items[:2]
+
+            threads = [
+                threading.Thread(
+                    target=delivery.deliver_shared, args=('news', f'U{i}', produce, '沒有新聞')
+                )
+                for i in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.05)
+            for thread in threads:
+                thread.join()
+            assert len(produced) == 1 and len(calls) == 1
+            path, body, _ = calls[0]
+            assert path.endswith('/multicast') and sorted(body['to']) == ['U0', 'U1', 'U2']
+
+            # 共享查詢失敗時，所有加入的使用者都會收到錯誤訊息
+            calls.clear()
+            errors = []
+
+            def failing():
+                time.sleep(0.3)
+                raise RuntimeError('upstream down')
+
+            def join(user_id):
+                try:
+                    delivery.deliver_shared('news', user_id, failing, '沒有新聞')
+                except RuntimeError as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=join, args=(f'U{i}',)) for i in range(3)]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.05)
+            for thread in threads:
+                thread.join()
+            assert len(errors) == 1 and len(calls) == 1
+            path, body, _ = calls[0]
+            assert sorted(body['to']) == ['U0', 'U1', 'U2'] and '錯誤' in body['messages'][0]['text']
+            assert delivery.get_stats()['shared_in_flight'] == 0
+        print("✓ LINE 批次推播與 multicast 合併正常")
+    except Exception as e:
+        print(f"✗ LINE 推播測試失敗: {e!r}")
+        raise
+
+def test_subscriptions():
+    """測試訂閱者依關鍵字組合分組、dry-run 成本估算與批次推播"""
+    try:
+        import os
+        import tempfile
+        import time
+        from clients import NewsItem
+        from delivery import LineDelivery
+        from prefetch import NewsPool
+        from processors import NewsProcessor
+        from subscriptions import SubscriptionStore, DigestBroadcaster
+
+        class RecordingLineApi:
+            def __init__(self):
+                self.calls = []
+
+            def push_message(self, to, messages, retry_key=None):
+                self.calls.append(('push', to, len(messages)))
+
+            def multicast(self, to, messages, retry_key=None):
+                self.calls.append(('multicast', sorted(to), len(messages)))
+
+        class CountingArticleClient:
+            def __init__(self):
+                self.processed = []
+
+            def process_article(self, article):
+                self.processed.append(article.url)
+                return article.with_summary('摘要')
+
+            def is_cached(self, url):
+                return False
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = SubscriptionStore(os.path.join(directory, 'subscriptions.db'))
+            assert store.subscribe('U1', ['GPU', 'ai']) == ['ai', 'gpu']
+            store.subscribe('U2', ['ＡＩ', 'gpu', 'gpu'])
+            store.subscribe('U3', ['顯卡'])
+            store.subscribe('U4', ['cpu'])
+            assert store.unsubscribe('U4') and not store.unsubscribe('U4')
+            assert store.groups() == {('ai', 'gpu'): ['U1', 'U2'], ('顯卡',): ['U3']}
+            # 重新開啟後訂閱仍保留
+            store = SubscriptionStore(store.path)
+            assert store.count() == 3 and store.get('U3') == ['顯卡']
+
+            now = time.time()
+            gpu_item = NewsItem('New GPU launch', 'https://example.com/gpu', 'Intel', published=now)
+            card_item = NewsItem('新款顯卡上市', 'https://example.com/card', 'Intel', published=now)
+            pool = NewsPool()
+            pool.update_source('Intel', [gpu_item, card_item])
+            pool.put_summary(gpu_item.url, gpu_item.with_summary('已預先摘要'))
+
+            article_client = CountingArticleClient()
+            processor = NewsProcessor(None, None, None, article_client, news_pool=pool)
+            api = RecordingLineApi()
+            broadcaster = DigestBroadcaster(processor, LineDelivery(api), store)
+
+            plan = broadcaster.broadcast_once(dry_run=True)
+            assert plan['subscribers'] == 3 and plan['keyword_sets'] == 2
+            assert plan['upstream_fetches'] == 0 and plan['summaries'] == 1
+            assert plan['line_api_calls'] == 2
+            assert api.calls == [] and article_client.processed == []
+
+            stats = broadcaster.broadcast_once()
+            assert stats['digests'] == 2 and stats['subscribers'] == 3
+            assert sorted(api.calls) == [('multicast', ['U1', 'U2'], 1), ('push', 'U3', 1)]
+            assert article_client.processed == [card_item.url]
+        print("✓ 訂閱分組與摘要批次推播正常")
+    except Exception as e:
+        print(f"✗ 訂閱摘要測試失敗: {e!r}")
+        raise
+
+def test_metrics():
+    """測試停用時不記錄、階段直方圖輸出，以及跨執行緒池的查詢追蹤"""
+    try:
+        import json
+        import os
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from clients.metrics import Metrics
+
+        disabled = Metrics(enabled=False)
+        with disabled.span('source_fetch', source='Intel'):
+            pass
+        disabled.record('summarize', 0.2)
+        assert disabled.snapshot() == {}
+
+        with tempfile.TemporaryDirectory() as directory:
+            trace_path = os.path.join(directory, 'trace.jsonl')
+            metrics = Metrics(enabled=True, trace_path=trace_path)
+            metrics.register_collector('test', lambda: [('job_queue_depth', {}, 3)])
+
+            def fetch(name):
+                with metrics.span('source_fetch', source=name):
+                    pass
+                metrics.record('summarize', 0.2)
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                with metrics.trace('news_request', keywords=['gpu']):
+                    futures = [
+                        metrics.submit(executor, fetch, name, pool='sources')
+                        for name in ('Intel', 'AMD')
+                    ]
+                    for future in futures:
+                        future.result()
+
+            with open(trace_path, encoding='utf-8') as f:
+                traces = [json.loads(line) for line in f]
+            assert len(traces) == 1 and traces[0]['keywords'] == ['gpu']
+            stages = sorted((span['stage'], span.get('source')) for span in traces[0]['spans'])
+            assert stages == [
+                ('source_fetch', 'AMD'), ('source_fetch', 'Intel'),
+                ('summarize', None), ('summarize', None),
+            ]
+
+            text = metrics.render()
+            assert 'newsbot_stage_seconds_bucket{stage="summarize",le="0.25"} 2' in text
+            assert 'newsbot_stage_seconds_count{stage="source_fetch",source="Intel"} 1' in text
+            assert 'newsbot_stage_seconds_count{stage="news_request"} 1' in text
+            assert 'newsbot_executor_queued{pool="sources"} 0' in text
+            assert 'newsbot_job_queue_depth 3' in text
+        print("✓ 熱路徑指標與查詢追蹤正常")
+    except Exception as e:
+        print(f"✗ 指標測試失敗: {e!r}")
+        raise
+
+def test_startup():
+    """測試重量級模組延遲匯入、緩存快照還原與背景預熱"""
+    try:
+        import os
+        import subprocess
+        import sys
+        import tempfile
+        import time
+        from clients import MemoryCache
+        from startup import Warmup, save_cache_snapshot, load_cache_snapshot, parse_importtime
+
+        # 匯入 news_bot 時不應載入 newspaper、feedparser 與 aiohttp
+        result = subprocess.run(
+            [sys.executable, '-c', "import news_bot, sys; "
+             "print([m for m in ('newspaper', 'feedparser', 'aiohttp', 'psutil') "
+             "if m in sys.modules])"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+            check=True
+        )
+        assert result.stdout.strip() == '[]', result.stdout
+
+        cache = MemoryCache()
+        cache.set('a', {'title': 'A'})
+        cache.set('b', {'title': 'B'}, ttl=0.01)
+        cache.set('c', {'title': '新聞 C'})
+        time.sleep(0.02)
+
+        class FakeContainer:
+            parse_pool = object()  # 有行程池時不在主行程預熱解析
+            summarizer = None
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'snapshot.json')
+            assert save_cache_snapshot(cache, path) == 2
+            container = FakeContainer()
+            container.article_cache = MemoryCache()
+            warmup = Warmup(container, snapshot_path=path, modules=('json',)).start()
+            assert warmup.wait(5)
+            status = warmup.get_status()
+            assert status['done'] and status['restored'] == 2 and not status['errors']
+            assert container.article_cache.get('c') == {'title': '新聞 C'}
+            assert container.article_cache.get('b') is None
+            missing = os.path.join(directory, 'missing.json')
+            assert load_cache_snapshot(container.article_cache, missing) == 0
+
+        modules = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   feedparser\n"
+            "import time:       300 |        420 | news_bot\n"
+        )
+        assert modules == [('feedparser', 120, 120, 1), ('news_bot', 300, 420, 0)]
+        print("✓ 延遲匯入與啟動預熱正常")
+    except Exception as e:
+        print(f"✗ 啟動預熱測試失敗: {e!r}")
+        raise
+
 def main():
     """主測試函數"""
     print("News Bot 測試開始")
@@ -53,14 +1223,41 @@ def main():
         test_imports,
         test_app_creation,
         test_news_processor,
+        test_news_pool,
+        test_job_queue,
+        test_connection_reuse,
+        test_article_single_download,
+        test_article_cache,
+        test_conditional_feed_request,
+        test_feed_streaming,
+        test_nvidia_search,
+        test_amd_search,
+        test_single_flight,
+        test_deadline_partial_results,
+        test_async_processor,
+        test_summarizers,
+        test_parse_pool,
+        test_news_item,
+        test_keyword_matcher,
+        test_search_index,
+        test_ranking,
+        test_source_registry,
+        test_circuit_breaker,
+        test_line_delivery,
+        test_subscriptions,
+        test_metrics,
+        test_startup,
     ]
 
     passed = 0
     total = len(tests)
 
     for test in tests:
-        if test():
-            passed += 1
+        try:
+            if test() is not False:
+                passed += 1
+        except Exception:
+            pass  # 失敗原因已由測試印出
         print()
 
     print("=" * 40)